@@ -39,10 +39,16 @@ import serial
 import serial.tools.list_ports as list_ports
 import sys
 import time
-import math
 import os.path
+import threading
 from sys import exit
 
+from .svl_crc import crc16, Crc16
+from .svl_baud import SVL_BAUD_AUTO, adapter_key, candidate_bauds, next_lower_baud, get_baud_memory
+from .au_cancel import check_cancel
+from .au_events import EventBus, ConsoleProgress, UploadMetrics, PhaseEvent, ProgressEvent, RetryEvent, \
+    ResultEvent, PHASE_CONNECT, PHASE_SETUP, PHASE_BOOTLOAD
+
 
 _verbose = False
 
@@ -82,88 +88,227 @@ SVL_CMD_DONE = 0x06  # finished - all data sent
 
 barWidthInCharacters = 40  # Width of progress bar, ie [###### % complete
 
-crcTable = (
-    0x0000, 0x8005, 0x800F, 0x000A, 0x801B, 0x001E, 0x0014, 0x8011,
-    0x8033, 0x0036, 0x003C, 0x8039, 0x0028, 0x802D, 0x8027, 0x0022,
-    0x8063, 0x0066, 0x006C, 0x8069, 0x0078, 0x807D, 0x8077, 0x0072,
-    0x0050, 0x8055, 0x805F, 0x005A, 0x804B, 0x004E, 0x0044, 0x8041,
-    0x80C3, 0x00C6, 0x00CC, 0x80C9, 0x00D8, 0x80DD, 0x80D7, 0x00D2,
-    0x00F0, 0x80F5, 0x80FF, 0x00FA, 0x80EB, 0x00EE, 0x00E4, 0x80E1,
-    0x00A0, 0x80A5, 0x80AF, 0x00AA, 0x80BB, 0x00BE, 0x00B4, 0x80B1,
-    0x8093, 0x0096, 0x009C, 0x8099, 0x0088, 0x808D, 0x8087, 0x0082,
-    0x8183, 0x0186, 0x018C, 0x8189, 0x0198, 0x819D, 0x8197, 0x0192,
-    0x01B0, 0x81B5, 0x81BF, 0x01BA, 0x81AB, 0x01AE, 0x01A4, 0x81A1,
-    0x01E0, 0x81E5, 0x81EF, 0x01EA, 0x81FB, 0x01FE, 0x01F4, 0x81F1,
-    0x81D3, 0x01D6, 0x01DC, 0x81D9, 0x01C8, 0x81CD, 0x81C7, 0x01C2,
-    0x0140, 0x8145, 0x814F, 0x014A, 0x815B, 0x015E, 0x0154, 0x8151,
-    0x8173, 0x0176, 0x017C, 0x8179, 0x0168, 0x816D, 0x8167, 0x0162,
-    0x8123, 0x0126, 0x012C, 0x8129, 0x0138, 0x813D, 0x8137, 0x0132,
-    0x0110, 0x8115, 0x811F, 0x011A, 0x810B, 0x010E, 0x0104, 0x8101,
-    0x8303, 0x0306, 0x030C, 0x8309, 0x0318, 0x831D, 0x8317, 0x0312,
-    0x0330, 0x8335, 0x833F, 0x033A, 0x832B, 0x032E, 0x0324, 0x8321,
-    0x0360, 0x8365, 0x836F, 0x036A, 0x837B, 0x037E, 0x0374, 0x8371,
-    0x8353, 0x0356, 0x035C, 0x8359, 0x0348, 0x834D, 0x8347, 0x0342,
-    0x03C0, 0x83C5, 0x83CF, 0x03CA, 0x83DB, 0x03DE, 0x03D4, 0x83D1,
-    0x83F3, 0x03F6, 0x03FC, 0x83F9, 0x03E8, 0x83ED, 0x83E7, 0x03E2,
-    0x83A3, 0x03A6, 0x03AC, 0x83A9, 0x03B8, 0x83BD, 0x83B7, 0x03B2,
-    0x0390, 0x8395, 0x839F, 0x039A, 0x838B, 0x038E, 0x0384, 0x8381,
-    0x0280, 0x8285, 0x828F, 0x028A, 0x829B, 0x029E, 0x0294, 0x8291,
-    0x82B3, 0x02B6, 0x02BC, 0x82B9, 0x02A8, 0x82AD, 0x82A7, 0x02A2,
-    0x82E3, 0x02E6, 0x02EC, 0x82E9, 0x02F8, 0x82FD, 0x82F7, 0x02F2,
-    0x02D0, 0x82D5, 0x82DF, 0x02DA, 0x82CB, 0x02CE, 0x02C4, 0x82C1,
-    0x8243, 0x0246, 0x024C, 0x8249, 0x0258, 0x825D, 0x8257, 0x0252,
-    0x0270, 0x8275, 0x827F, 0x027A, 0x826B, 0x026E, 0x0264, 0x8261,
-    0x0220, 0x8225, 0x822F, 0x022A, 0x823B, 0x023E, 0x0234, 0x8231,
-    0x8213, 0x0216, 0x021C, 0x8219, 0x0208, 0x820D, 0x8207, 0x0202)
 # ***********************************************************************************
 #
 # Compute CRC on a byte array
 #
+# The table driven implementation lives in svl_crc - see that file for details
+#
 # ***********************************************************************************
 
 
 def get_crc16(data):
 
-    # Table and code ported from Artemis SVL bootloader
-    crc = 0x0000
-    data = bytearray(data)
-    for ch in data:
-        tableAddr = ch ^ (crc >> 8)
-        CRCH = (crcTable[tableAddr] >> 8) ^ (crc & 0xFF)
-        CRCL = crcTable[tableAddr] & 0x00FF
-        crc = CRCH << 8 | CRCL
-    return crc
+    return crc16(data)
 
 
 # ***********************************************************************************
 #
-# Wait for a packet
+# I/O statistics
+#
+# Counts the serial calls made and the payload bytes copied on the host during
+# an upload, so changes to the transport path can be measured.
 #
 # ***********************************************************************************
-def wait_for_packet(ser):
+class SvlIoStats(object):
 
-    packet = {'len': 0, 'cmd': 0, 'data': 0, 'crc': 1, 'timeout': 1}
+    __slots__ = ('writes', 'reads', 'bytes_written', 'bytes_read', 'bytes_copied', 'retries')
 
-    n = ser.read(2)  # get the number of bytes
-    if(len(n) < 2):
-        return packet
+    def __init__(self):
+        self.writes = 0
+        self.reads = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.bytes_copied = 0
+        self.retries = 0        # frames the Artemis asked to have re-sent
 
-    packet['len'] = int.from_bytes(n, byteorder='big', signed=False)    #
-    payload = ser.read(packet['len'])
+    def __str__(self):
+        return '{} writes ({} bytes), {} reads ({} bytes), {} bytes copied, {} retries'.format(
+            self.writes, self.bytes_written, self.reads, self.bytes_read, self.bytes_copied, self.retries)
 
-    if(len(payload) != packet['len']):
-        return packet
 
-    # all bytes received, so timeout is not true
-    packet['timeout'] = 0
-    # cmd is the first byte of the payload
-    packet['cmd'] = payload[0]
-    # the data is the part of the payload that is not cmd or crc
-    packet['data'] = payload[1:packet['len']-2]
-    # performing the crc on the whole payload should return 0
-    packet['crc'] = get_crc16(payload)
+def _serial_write(ser, data, stats):
+
+    stats.writes += 1
+    stats.bytes_written += len(data)
+
+    # pySerial passes bytes objects straight through, anything else is copied
+    if not isinstance(data, bytes):
+        stats.bytes_copied += len(data)
+
+    ser.write(data)
+
+
+def _serial_read(ser, size, stats):
+
+    data = ser.read(size)
+
+    stats.reads += 1
+    stats.bytes_read += len(data)
+
+    return data
+
+
+# ***********************************************************************************
+#
+# Received packet
+#
+# ***********************************************************************************
+class SvlPacket(object):
+
+    __slots__ = ('len', 'cmd', 'data', 'crc', 'timeout')
+
+    def __init__(self, length=0, cmd=0, data=b'', crc=1, timeout=True):
+        self.len = length
+        self.cmd = cmd
+        self.data = data
+        self.crc = crc          # CRC over the whole payload - 0 if the packet is intact
+        self.timeout = timeout
+
+    def __repr__(self):
+        return 'SvlPacket(len={}, cmd={}, data={!r}, crc={}, timeout={})'.format(
+            self.len, self.cmd, self.data, self.crc, self.timeout)
+
+
+_TIMEOUT_PACKET = SvlPacket()
+
+# Longest valid payload - a full frame plus the command and CRC bytes
+SVL_MAX_PAYLOAD = 512*4 + 3
+
+
+# ***********************************************************************************
+#
+# Buffered packet reader
+#
+# One reader is used per open port. Each read asks pySerial for the bytes still
+# needed to complete a packet, or for everything already waiting if that is
+# more, so a whole packet normally arrives in a single call. Leftover bytes stay
+# in the buffer for the next packet.
+#
+# With resync enabled, bytes that can't start a valid packet (bad length or
+# CRC) are dropped one at a time until a packet lines up. This skips the noise
+# a board can emit as it comes out of reset without another round trip.
+#
+# ***********************************************************************************
+class SvlPacketReader(object):
+
+    def __init__(self, ser, stats=None, drain=True):
+
+        self._ser = ser
+        self._stats = stats if stats is not None else SvlIoStats()
+        self._drain = drain     # read everything waiting, not just what is needed
+        self._buf = bytearray()
+        self._pos = 0
+
+        self.garbage_bytes = 0  # bytes discarded while resyncing
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buf) - self._pos
+
+    def reset(self):
+        self._buf.clear()
+        self._pos = 0
+
+    def discard(self):
+        # drop what is buffered, counted as line noise
+        self.garbage_bytes += self.buffered
+        self.reset()
+
+    def wait_for_data(self) -> bool:
+        # False if the port timed out before anything arrived
+        return self._fill(1)
+
+    def _fill(self, needed):
+
+        # Returns False if the port timed out before needed bytes arrived
+        while self.buffered < needed:
+
+            size = needed - self.buffered
+            if self._drain:
+                waiting = self._ser.in_waiting
+                if waiting > size:
+                    size = waiting
+
+            data = _serial_read(self._ser, size, self._stats)
+            if not data:
+                return False
+
+            # compact before growing, so the buffer doesn't creep
+            if self._pos:
+                del self._buf[:self._pos]
+                self._pos = 0
+            self._buf += data
+
+        return True
+
+    def _consume(self, count):
+
+        self._pos += count
+        if self._pos >= len(self._buf):
+            self._buf.clear()
+            self._pos = 0
+
+    def read_packet(self, resync=False) -> SvlPacket:
+
+        while True:
+
+            if not self._fill(2):
+                return _TIMEOUT_PACKET
+
+            start = self._pos
+            length = (self._buf[start] << 8) | self._buf[start + 1]
+
+            if length < 3 or length > SVL_MAX_PAYLOAD:
+                if resync:
+                    self._consume(1)
+                    self.garbage_bytes += 1
+                    continue
+                # nothing sensible can follow - treat like a bad CRC
+                self._consume(2)
+                return SvlPacket(length, 0, b'', 1, False)
+
+            if not self._fill(2 + length):
+                if resync and self.buffered > 2:
+                    # a bogus length - try the next byte
+                    self._consume(1)
+                    self.garbage_bytes += 1
+                    continue
+                return SvlPacket(length)
+
+            start = self._pos + 2
+            end = start + length
+            with memoryview(self._buf) as view:
+                crc = crc16(view[start:end])
+
+            if crc != 0 and resync:
+                self._consume(1)
+                self.garbage_bytes += 1
+                continue
+
+            packet = SvlPacket(length, self._buf[start], bytes(self._buf[start + 1:end - 2]), crc, False)
+            self._consume(2 + length)
+
+            return packet
 
-    return packet
+
+# ***********************************************************************************
+#
+# Encode a packet - length, command, data and CRC - into a single buffer
+#
+# The data is copied exactly once, into the returned bytes object, which
+# pySerial can then write without a further copy. The CRC is computed over the
+# command byte and the data in place.
+#
+# ***********************************************************************************
+def encode_packet(cmd, data):
+
+    header = (((3 + len(data)) << 8) | cmd).to_bytes(3, 'big')
+
+    crc = Crc16(header[2:])
+    crc.update(data)
+
+    return b''.join((header, data, crc.digest()))
 
 # ***********************************************************************************
 #
@@ -172,16 +317,240 @@ def wait_for_packet(ser):
 # ***********************************************************************************
 
 
-def send_packet(ser, cmd, data):
-    data = bytearray(data)
-    num_bytes = 3 + len(data)
-    payload = bytearray(cmd.to_bytes(1, 'big'))
-    payload.extend(data)
-    crc = get_crc16(payload)
-    payload.extend(bytearray(crc.to_bytes(2, 'big')))
+def send_packet(ser, cmd, data, stats=None):
+
+    if stats is None:
+        stats = SvlIoStats()
 
-    ser.write(num_bytes.to_bytes(2, 'big'))
-    ser.write(bytes(payload))
+    packet = encode_packet(cmd, data)
+    stats.bytes_copied += len(data)
+
+    # length, command, data and crc go out in a single write
+    _serial_write(ser, packet, stats)
+
+
+# ***********************************************************************************
+#
+# Frame plan
+#
+# Every packet needed to send an image, encoded once before the bootload phase
+# starts. The bootload loop then only writes a prebuilt buffer each time the
+# Artemis asks for the next frame.
+#
+# A plan is not modified once built, so it is reused across upload attempts and
+# shared between boards that receive the same file.
+#
+# ***********************************************************************************
+SVL_FRAME_SIZE = 512*4
+
+
+class SvlFramePlan(object):
+
+    def __init__(self, application, frame_size=SVL_FRAME_SIZE):
+
+        self.total_len = len(application)
+        self.frame_size = frame_size
+
+        image = memoryview(application)
+        self.frames = tuple(encode_packet(SVL_CMD_FRAME, image[start:start + frame_size])
+                            for start in range(0, self.total_len, frame_size))
+
+        self.done_packet = encode_packet(SVL_CMD_DONE, b'')
+
+        # each byte of the image is copied once, into its frame packet
+        self.bytes_copied = self.total_len
+
+    @property
+    def total_frames(self) -> int:
+        return len(self.frames)
+
+    def frame_length(self, frame_number) -> int:
+        # frame numbers start at 1, as requested by the Artemis
+        return len(self.frames[frame_number - 1]) - 5
+
+
+# Plans are cached by file name, size and modification time
+_FRAME_PLAN_CACHE_SIZE = 4
+_frame_plans = {}
+_frame_plans_lock = threading.Lock()
+
+
+def get_frame_plan(binfile, frame_size=SVL_FRAME_SIZE, stats=None):
+
+    info = os.stat(binfile)
+    key = (os.path.abspath(binfile), info.st_size, info.st_mtime_ns, frame_size)
+
+    with _frame_plans_lock:
+        plan = _frame_plans.get(key)
+
+    if plan is None:
+        with open(binfile, mode='rb') as f:
+            plan = SvlFramePlan(f.read(), frame_size)
+
+        if stats is not None:
+            stats.bytes_copied += plan.bytes_copied
+
+        with _frame_plans_lock:
+            if len(_frame_plans) >= _FRAME_PLAN_CACHE_SIZE:
+                _frame_plans.pop(next(iter(_frame_plans)))
+            _frame_plans[key] = plan
+
+    return plan
+
+
+# ***********************************************************************************
+#
+# Session cores - the protocol without the I/O
+#
+# The bootloader entry and the frame loop are written once, as generators that
+# yield I/O requests and are sent the replies:
+#
+#    (SVL_IO_WRITE, data)               send data - None
+#    (SVL_IO_READ, timeout, resync)     read a packet - the SvlPacket
+#    (SVL_IO_WAIT, timeout)             wait for any byte - True if one arrived
+#    (SVL_IO_DISCARD,)                  drop what arrived as line noise - None
+#
+# The cores return their result. run_session() carries the requests out on a
+# pySerial port, svl_async.run_session() on the asyncio transport, so both speak
+# the same protocol, publish the same events and honour the cancel token.
+#
+# ***********************************************************************************
+SVL_IO_WRITE = 0
+SVL_IO_READ = 1
+SVL_IO_WAIT = 2
+SVL_IO_DISCARD = 3
+
+SVL_RESEND_MAX = 4      # RETRYs in a row for one frame before giving up
+
+
+def run_session(ser, core, stats, reader):
+
+    saved_timeout = ser.timeout
+    reply = None
+    try:
+        while True:
+            try:
+                request = core.send(reply)
+            except StopIteration as result:
+                return result.value
+
+            io = request[0]
+            if io == SVL_IO_WRITE:
+                _serial_write(ser, request[1], stats)
+                reply = None
+            elif io == SVL_IO_READ:
+                ser.timeout = request[1]
+                reply = reader.read_packet(resync=request[2])
+            elif io == SVL_IO_WAIT:
+                ser.timeout = request[1]
+                reply = reader.wait_for_data()
+            else:
+                reader.discard()
+                reply = None
+    finally:
+        ser.timeout = saved_timeout
+
+
+# ***********************************************************************************
+#
+# Bootloader entry
+#
+# Opening the port resets the Artemis. Rather than sleeping for a fixed time and
+# sending a single baud detection character, the character is sent repeatedly on
+# a short cadence and the port is polled in between. Sending stops as soon as
+# anything comes back - the bootloader has locked onto the baud rate and any
+# further characters would reach it as packet data. What came back must then be
+# the version packet. Bytes that don't frame as one are line noise, and sending
+# resumes.
+#
+# The cadence must be longer than the time the bootloader takes to answer. By
+# default the whole window is the port timeout, counted from the reset.
+#
+# The measured reset to bootloader latency is recorded for each port.
+#
+# ***********************************************************************************
+SVL_ENTRY_CADENCE = 0.02    # seconds between baud detection characters
+
+_entry_latency = {}
+_entry_latency_lock = threading.Lock()
+
+
+def get_entry_latency(port):
+
+    # Last measured reset to bootloader latency for port, in seconds - or None
+    with _entry_latency_lock:
+        return _entry_latency.get(port)
+
+
+def entry_core(port, timeout, start_time, cadence=SVL_ENTRY_CADENCE, window=None, cancel=None):
+
+    deadline = start_time + (timeout if window is None else window)
+
+    packet = _TIMEOUT_PACKET
+    while True:
+
+        check_cancel(cancel)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+
+        yield (SVL_IO_WRITE, b'U')     # send the baud detection character
+
+        if not (yield (SVL_IO_WAIT, min(cadence, remaining))):
+            continue
+
+        # something came back - no more detection characters. The rest of
+        # the version packet follows within the cadence.
+        packet = yield (SVL_IO_READ, cadence, True)
+        if not packet.timeout and packet.crc == 0:
+            break
+
+        # anything that doesn't frame as a packet is noise
+        yield (SVL_IO_DISCARD,)
+
+    if(packet.timeout or packet.crc):
+        return None  # failed to enter bootloader
+
+    latency = time.monotonic() - start_time
+    with _entry_latency_lock:
+        _entry_latency[port] = latency
+
+    verboseprint('\tBootloader answered after ' + str(round(latency*1000, 1)) + ' ms')
+
+    return packet
+
+
+def enter_bootloader(ser, stats=None, reader=None, start_time=None,
+                     cadence=SVL_ENTRY_CADENCE, window=None, cancel=None):
+
+    if stats is None:
+        stats = SvlIoStats()
+    if reader is None:
+        reader = SvlPacketReader(ser, stats)
+    if start_time is None:
+        start_time = time.monotonic()
+
+    core = entry_core(ser.port, ser.timeout, start_time, cadence, window, cancel)
+    packet = run_session(ser, core, stats, reader)
+
+    if packet is not None and reader.garbage_bytes:
+        verboseprint('\tSkipped ' + str(reader.garbage_bytes) + ' bytes of line noise')
+
+    return packet
+
+
+# ***********************************************************************************
+#
+# Upload events - see au_events.py. Without an event bus, uploads draw the
+# progress bar on the console, unless verbose.
+#
+# ***********************************************************************************
+def console_events():
+
+    events = EventBus()
+    if not _verbose:
+        events.subscribe(ConsoleProgress(barWidthInCharacters))
+    return events
 
 
 # ***********************************************************************************
@@ -189,28 +558,35 @@ def send_packet(ser, cmd, data):
 # Setup: signal baud rate, get version, and command BL enter
 #
 # ***********************************************************************************
-def phase_setup(ser):
+def phase_setup(ser, stats=None, reader=None, start_time=None, cancel=None, events=None):
 
-    baud_detect_byte = b'U'
+    if events is not None:
+        events.publish(PhaseEvent(ser.port, PHASE_SETUP))
+
+    if stats is None:
+        stats = SvlIoStats()
+    if reader is None:
+        reader = SvlPacketReader(ser, stats)
+    if start_time is None:
+        start_time = time.monotonic()
 
     verboseprint('\nPhase:\tSetup')
 
     # Handle the serial startup blip
     ser.reset_input_buffer()
+    reader.reset()
     verboseprint('\tCleared startup blip')
 
-    ser.write(baud_detect_byte)             # send the baud detection character
-
-    packet = wait_for_packet(ser)
-    if(packet['timeout'] or packet['crc']):
+    packet = enter_bootloader(ser, stats, reader, start_time, cancel=cancel)
+    if packet is None:
         return False  # failed to enter bootloader
 
     verboseprint('\t')
-    print(' - Version: ' + str(int.from_bytes(packet['data'], 'big') ) )
+    print(' - Version: ' + str(int.from_bytes(packet.data, 'big') ) )
     print('')
     verboseprint('\tSending \'enter bootloader\' command')
 
-    send_packet(ser, SVL_CMD_BL, b'')
+    send_packet(ser, SVL_CMD_BL, b'', stats)
 
     return True
 
@@ -222,93 +598,116 @@ def phase_setup(ser):
 # Bootloader phase (Artemis is locked in)
 #
 # ***********************************************************************************
-def phase_bootload(ser, binfile):
+def bootload_core(port, plan, timeout, stats, events, cancel=None, resend_max=SVL_RESEND_MAX):
 
     startTime = time.time()
-    frame_size = 512*4
-
-    resend_max = 4
     resend_count = 0
 
-    verboseprint('\nPhase:\tBootload')
+    total_len = plan.total_len
+    total_frames = plan.total_frames
+    curr_frame = 0
+    bytes_sent = 0
+    retries_before = stats.retries
+
+    events.publish(PhaseEvent(port, PHASE_BOOTLOAD))
+
+    verboseprint('\thave ' + str(total_len) +
+                 ' bytes to send in ' + str(total_frames) + ' frames')
+
+    bl_done = False
+    bl_succeeded = True
+
+    while((bl_done == False) and (bl_succeeded == True)):
+
+        # between frames - a cancelled job stops here
+        check_cancel(cancel)
+
+        # wait for indication by Artemis
+        packet = yield (SVL_IO_READ, timeout, False)
+        if(packet.timeout or packet.crc):
+            verboseprint('\n\tError receiving packet')
+            verboseprint(packet)
+            verboseprint('\n')
+            bl_succeeded = False
+            bl_done = True
+
+        if(packet.cmd == SVL_CMD_NEXT):
+            # verboseprint('\tgot frame request')
+            curr_frame += 1
+            resend_count = 0
+        elif(packet.cmd == SVL_CMD_RETRY):
+            verboseprint('\t\tRetrying...')
+            resend_count += 1
+            stats.retries += 1
+            events.publish(RetryEvent(port, curr_frame, stats.retries - retries_before))
+            if(resend_count >= resend_max):
+                bl_succeeded = False
+                bl_done = True
+        else:
+            print('Timeout or unknown error')
+            bl_succeeded = False
+            bl_done = True
 
-    with open(binfile, mode='rb') as binfile:
-        application = binfile.read()
-        total_len = len(application)
+        if(bl_succeeded == False):
+            break
 
-        total_frames = math.ceil(total_len/frame_size)
-        curr_frame = 0
-        progressChars = 0
+        # a RETRY before the first NEXT - no frame has been sent, nothing to resend
+        if(curr_frame == 0):
+            continue
 
-        if (not _verbose):
-            print("[Uploading]   0%", end='')
+        if(curr_frame <= total_frames):
 
-        verboseprint('\thave ' + str(total_len) +
-                     ' bytes to send in ' + str(total_frames) + ' frames')
+            verboseprint('\tSending frame #'+str(curr_frame) +
+                         ', length: '+str(plan.frame_length(curr_frame)))
 
-        bl_done = False
-        bl_succeeded = True
+            if(resend_count == 0):
+                bytes_sent += plan.frame_length(curr_frame)
+                events.publish(ProgressEvent(port, curr_frame, total_frames, bytes_sent, total_len))
 
-        while((bl_done == False) and (bl_succeeded == True)):
+            yield (SVL_IO_WRITE, plan.frames[curr_frame - 1])
 
-            # wait for indication by Artemis
-            packet = wait_for_packet(ser)
-            if(packet['timeout'] or packet['crc']):
-                verboseprint('\n\tError receiving packet')
-                verboseprint(packet)
-                verboseprint('\n')
-                bl_succeeded = False
-                bl_done = True
+        else:
+            yield (SVL_IO_WRITE, plan.done_packet)
+            bl_done = True
 
-            if(packet['cmd'] == SVL_CMD_NEXT):
-                # verboseprint('\tgot frame request')
-                curr_frame += 1
-                resend_count = 0
-            elif(packet['cmd'] == SVL_CMD_RETRY):
-                verboseprint('\t\tRetrying...')
-                resend_count += 1
-                if(resend_count >= resend_max):
-                    bl_succeeded = False
-                    bl_done = True
-            else:
-                print('Timeout or unknown error')
-                bl_succeeded = False
-                bl_done = True
+    seconds = time.time() - startTime
+    bps = bytes_sent / seconds if seconds > 0 else 0.0
+    if(bl_succeeded == True):
+        verboseprint('\tNominal bootload bps: ' + str(round(bps, 2)))
 
-            if(curr_frame <= total_frames):
-                frame_data = application[(
-                    (curr_frame-1)*frame_size):((curr_frame-1+1)*frame_size)]
+    events.publish(ResultEvent(port, bl_succeeded, bytes_sent, seconds, bps, stats.retries - retries_before))
 
-                if _verbose:
+    return bl_succeeded
 
-                    verboseprint('\tSending frame #'+str(curr_frame) +
-                                 ', length: '+str(len(frame_data)))
-                else:
-                    percentComplete = curr_frame * 100 / total_frames
-                    percentCompleteInChars = math.floor(
-                        percentComplete / 100 * barWidthInCharacters)
-                    while(progressChars <= percentCompleteInChars):
-                        progressChars = progressChars + 1
-                        print(u'\b\b\b\b\u2588 {:2d}%'.format(int(percentComplete)), end='', flush=True) # bright block
 
-                send_packet(ser, SVL_CMD_FRAME, frame_data)
+def phase_bootload(ser, binfile, stats=None, reader=None, cancel=None, events=None):
 
-            else:
-                send_packet(ser, SVL_CMD_DONE, b'')
-                bl_done = True
+    if stats is None:
+        stats = SvlIoStats()
+    if events is None:
+        events = console_events()
+    if reader is None:
+        reader = SvlPacketReader(ser, stats)
 
-        print('\n')
-        if(bl_succeeded == True):
-            verboseprint('\n\t')
-            print('Upload Successful')
-            endTime = time.time()
-            bps = total_len / (endTime - startTime)
-            verboseprint('\n\tNominal bootload bps: ' + str(round(bps, 2)))
-        else:
-            verboseprint('\n\t')
-            print('Upload Failed')
+    verboseprint('\nPhase:\tBootload')
+
+    # binfile is either a file name or a prebuilt frame plan
+    if isinstance(binfile, SvlFramePlan):
+        plan = binfile
+    else:
+        plan = get_frame_plan(binfile, stats=stats)
+
+    core = bootload_core(ser.port, plan, ser.timeout, stats, events, cancel)
+    bl_succeeded = run_session(ser, core, stats, reader)
 
-        return bl_succeeded
+    print('\n')
+    verboseprint('\n\t')
+    if(bl_succeeded == True):
+        print('Upload Successful')
+    else:
+        print('Upload Failed')
+
+    return bl_succeeded
 
 
 # ***********************************************************************************
@@ -325,7 +724,7 @@ def phase_serial_port_help( port ):
         if(dev.device.upper() == port.upper()):
             print(dev.device + " is currently open. Please close any other terminal programs that may be using " +
                   dev.device + " and try again.")
-            exit()
+            exit(1)
 
     # otherwise, give user a list of possible com ports
     print(port.upper() +
@@ -346,56 +745,153 @@ def phase_serial_port_help( port ):
 
 # ***********************************************************************************
 #
-# Upload function
+# Upload attempts at one baud rate
 #
 # ***********************************************************************************
-def upload_firmware(binfile, port, baud, timeout=0.5):
-    try:
-        num_tries = 3
+def _upload_at_baud(plan, port, baud, timeout, stats, num_tries, stop_on_retries=False, cancel=None,
+                    events=None):
 
-        print('\nArtemis SVL Bootloader', end='')
+    if events is None:
+        events = console_events()
 
-        verboseprint("Script version " + SCRIPT_VERSION_MAJOR +
-                     "." + SCRIPT_VERSION_MINOR)
+    bl_success = False
+    entered_bootloader = False
+
+    for _ in range(num_tries):
+
+        check_cancel(cancel)
+        retries_before = stats.retries
+
+        events.publish(PhaseEvent(port, PHASE_CONNECT))
+
+        with serial.Serial(port, baud, timeout=timeout) as ser:
+
+            # Opening the port resets the Artemis - the bootloader is probed
+            # from here on, instead of waiting a fixed startup time
+            t_open = time.monotonic()
+
+            # one buffered reader per open port
+            reader = SvlPacketReader(ser, stats)
+
+            # Perform baud rate negotiation
+            entered_bootloader = phase_setup(ser, stats, reader, t_open, cancel, events)
+
+            if(entered_bootloader == True):
+                bl_success = phase_bootload(ser, plan, stats, reader, cancel, events)
+                if(bl_success == True):     # Bootload
+                    #print("Bootload complete!")
+                    break
+            else:
+                verboseprint("Failed to enter bootload phase")
+
+        if(bl_success == True):
+            break
+
+        # The link can't sustain this rate - no point trying it again
+        if(stop_on_retries and stats.retries > retries_before):
+            break
+
+    return entered_bootloader, bl_success
+
+
+# ***********************************************************************************
+#
+# Auto baud: start at the remembered (or highest) rate, fall back to a lower rate
+# when the bootloader doesn't answer or the link needs too many re-sends, and
+# remember the best rate that worked for this adapter.
+#
+# ***********************************************************************************
+SVL_AUTO_TRIES_PER_BAUD = 2
+
+# A successful upload that needed more than one re-send per this many frames
+# was marginal - the next session starts at a lower rate
+SVL_RETRY_STORM_FRAMES = 8
 
-        if not os.path.exists(binfile):
-            print("Bin file {} does not exist.".format(binfile))
-            exit()
 
-        bl_success = False
-        entered_bootloader = False
+def _upload_auto_baud(plan, port, timeout, stats, cancel=None, events=None):
 
-        for _ in range(num_tries):
+    memory = get_baud_memory()
+    key = adapter_key(port)
 
-            with serial.Serial(port, baud, timeout=timeout) as ser:
+    entered_any = False
 
-                # startup time for Artemis bootloader   (experimentally determined - 0.095 sec min delay)
-                t_su = 0.15
+    for baud in candidate_bauds(memory.get(key)):
 
-                time.sleep(t_su)        # Allow Artemis to come out of reset
+        print('\nTrying ' + str(baud) + ' baud', end='')
+        retries_before = stats.retries
 
-                # Perform baud rate negotiation
-                entered_bootloader = phase_setup(ser)
+        entered, success = _upload_at_baud(plan, port, baud, timeout, stats,
+                                           SVL_AUTO_TRIES_PER_BAUD, stop_on_retries=True, cancel=cancel,
+                                           events=events)
+        entered_any = entered_any or entered
 
-                if(entered_bootloader == True):
-                    bl_success = phase_bootload(ser, binfile)
-                    if(bl_success == True):     # Bootload
-                        #print("Bootload complete!")
-                        break
-                else:
-                    verboseprint("Failed to enter bootload phase")
+        if success:
+            retries = stats.retries - retries_before
+            best = baud
+            if retries > max(1, plan.total_frames // SVL_RETRY_STORM_FRAMES):
+                best = next_lower_baud(baud) or baud
+                verboseprint('\t' + str(retries) + ' re-sends at ' + str(baud) +
+                             ' baud - will start at ' + str(best) + ' next time')
+            memory.set(key, best)
+            return entered_any, True
 
+        verboseprint('\tNo reliable upload at ' + str(baud) + ' baud')
 
+    return entered_any, False
 
-            if(bl_success == True):
-                break
+
+# ***********************************************************************************
+#
+# Upload function
+#
+# Pass SVL_BAUD_AUTO as the baud rate to pick the rate automatically.
+#
+# cancel is an optional CancelToken (au_cancel.py) - a cancelled upload raises
+# JobCancelled.
+#
+# events is an optional EventBus (au_events.py) the upload publishes its
+# progress on. Without one the progress bar is drawn on the console.
+#
+# ***********************************************************************************
+def upload_firmware(binfile, port, baud, timeout=0.5, stats=None, cancel=None, events=None):
+
+    if stats is None:
+        stats = SvlIoStats()
+    if events is None:
+        events = console_events()
+
+    try:
+        num_tries = 3
+
+        print('\nArtemis SVL Bootloader', end='')
+
+        verboseprint("Script version " + SCRIPT_VERSION_MAJOR +
+                     "." + SCRIPT_VERSION_MINOR)
+
+        if not os.path.exists(binfile):
+            print("Bin file {} does not exist.".format(binfile))
+            exit(1)
+
+        # Encode every frame up front - the same plan is used for each attempt
+        plan = get_frame_plan(binfile, stats=stats)
+
+        if baud == SVL_BAUD_AUTO:
+            entered_bootloader, bl_success = _upload_auto_baud(plan, port, timeout, stats, cancel, events)
+        else:
+            entered_bootloader, bl_success = _upload_at_baud(plan, port, baud, timeout, stats, num_tries,
+                                                             cancel=cancel, events=events)
 
         if(entered_bootloader == False):
             print(
                 "Target failed to enter bootload mode. Verify the right COM port is selected and that your board has the SVL bootloader.")
 
+        verboseprint('\tHost I/O: ' + str(stats))
+
     except serial.SerialException:
         phase_serial_port_help(port)
+        return False
+
+    return bl_success
 
 
 # ******************************************************************************
@@ -410,8 +906,11 @@ if __name__ == '__main__':
 
     parser.add_argument('port', help='Serial COMx Port')
 
-    parser.add_argument('-b', dest='baud', default=115200, type=int,
-                        help='Baud Rate (default is 115200)')
+    def baud_arg(x):
+        return SVL_BAUD_AUTO if x.lower() == SVL_BAUD_AUTO else int(x)
+
+    parser.add_argument('-b', dest='baud', default=115200, type=baud_arg,
+                        help='Baud Rate, or \'auto\' to pick the fastest that works (default is 115200)')
 
     parser.add_argument('-f', dest='binfile', default='',
                         help='Binary file to program into the target device')
@@ -432,6 +931,13 @@ if __name__ == '__main__':
 
     set_verbose(args.verbose)
 
-    # call upload
+    # call upload - the progress bar, and the metrics reported at the end
+    metrics = UploadMetrics()
+    events = console_events()
+    events.subscribe(metrics)
+
+    upload_firmware(args.binfile, args.port, args.baud, args.timeout, events=events)
 
-    upload_firmware(args.binfile, args.port, args.baud, args.timeout)
+    summary = metrics.describe(args.port)
+    if summary is not None:
+        print(summary)
@@ -45,6 +45,9 @@ from .au_worker import AUxWorker
 from .au_act_artfrmw import AUxArtemisUploadFirmware
 from .au_act_artasb import AUxArtemisBurnBootloader
 from .au_action import AxJob
+from .au_events import PhaseEvent, ProgressEvent, RetryEvent, ResultEvent
+from .au_console import AUxConsole
+from .svl_baud import SVL_BAUD_AUTO
 import darkdetect
 import sys
 import os
@@ -55,8 +58,8 @@ from typing import Iterator, Tuple
 from PyQt5.QtCore import QSettings, pyqtSignal, pyqtSlot, Qt
 from PyQt5.QtWidgets import QWidget, QLabel, QComboBox, QGridLayout, \
     QPushButton, QApplication, QLineEdit, QFileDialog, QPlainTextEdit, \
-    QAction, QActionGroup, QMainWindow, QMessageBox
-from PyQt5.QtGui import QCloseEvent, QTextCursor, QIcon, QFont, QPixmap
+    QAction, QActionGroup, QMainWindow, QMessageBox, QProgressBar
+from PyQt5.QtGui import QCloseEvent, QIcon, QFont, QPixmap
 from PyQt5.QtSerialPort import QSerialPortInfo
 
 
@@ -161,12 +164,19 @@ class MainWindow(QMainWindow):
 
     sig_message = pyqtSignal(str)
     sig_finished = pyqtSignal(int, str, int)
+    sig_event = pyqtSignal(object, int)
 
     def __init__(self, parent: QMainWindow = None) -> None:
         super().__init__(parent)
 
         self.installed_bootloader = -1  # Use this to record the bootloader version
 
+        # ports with a job queued or running, by job id
+        self._port_jobs = {}
+
+        # upload progress of each port, in percent
+        self._port_progress = {}
+
         #
         self.appFile = 'artemis_svl.bin'    # --bin Bootloader binary file
         # --load-address-wired  dest=loadaddress_blob   default=0x60000
@@ -196,6 +206,7 @@ class MainWindow(QMainWindow):
         port_label.setBuddy(self.port_combobox)
         self.update_com_ports()
         self.port_combobox.popupAboutToBeShown.connect(self.on_port_combobox)
+        self.port_combobox.currentIndexChanged.connect(self.update_interface)
 
         # Baudrate Combobox
         baud_label = QLabel(self.tr('Baud Rate:'))
@@ -215,6 +226,11 @@ class MainWindow(QMainWindow):
         self.updateBootloader_btn.pressed.connect(
             self.on_update_bootloader_btn_pressed)
 
+        # Upload progress of the selected port
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+
         # Messages Bar
         messages_label = QLabel(self.tr('Status / Warnings:'))
 
@@ -271,6 +287,7 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.messages, 5, 0, 5, 3)
 
         layout.addWidget(self.upload_btn, 15, 2)
+        layout.addWidget(self.progress_bar, 15, 1)
         layout.addWidget(self.updateBootloader_btn, 15, 0)
 
         widget = QWidget()
@@ -283,6 +300,9 @@ class MainWindow(QMainWindow):
         self.messages.setReadOnly(True)
         self.messages.clear()  # Clear the message window
 
+        # Buffered, rate limited writes to the message window
+        self.console = AUxConsole(self.messages)
+
         self.setWindowTitle(_APP_NAME + " - " + _APP_VERSION)
 
         # Initial Status Bar
@@ -294,9 +314,10 @@ class MainWindow(QMainWindow):
         # methods/slots. This makes it thread safe
         self.sig_message.connect(self.log_message)
         self.sig_finished.connect(self.on_finished)
+        self.sig_event.connect(self.on_upload_event)
 
         # Create our background worker object, which also will do work in it's
-        # own thread.
+        # own threads - jobs for different ports run at the same time.
         self._worker = AUxWorker(self.on_worker_callback)
 
         # add the actions/commands for this app to the background processing thread.
@@ -328,6 +349,13 @@ class MainWindow(QMainWindow):
                 return;
 
             self.sig_finished.emit(args[1], args[2], args[3])
+        elif msg_type == AUxWorker.TYPE_EVENT:
+            # events take 3 args - the event and the job id
+            if len(args) < 3:
+                self.log_message("Invalid parameters from the uploader.");
+                return;
+
+            self.sig_event.emit(args[1], args[2])
 
     # --------------------------------------------------------------
     @pyqtSlot(str)
@@ -337,27 +365,35 @@ class MainWindow(QMainWindow):
         # The passed in text is inserted *raw* at the end of the console
         # text area. The insert method doesn't add any newlines. Most of the
         # text being recieved originates in a print() call, which adds newlines.
+        #
+        # The console batches the text - it shows up within a frame or so,
+        # see au_console.py. Upload progress arrives as events, see
+        # on_upload_event()
+        self.console.write(msg)
 
-        self.messages.moveCursor(QTextCursor.End)
-
-        # Backspace ("\b")??
-        tmp = msg
-        while len(tmp) > 2 and tmp.startswith('\b'):
+    # --------------------------------------------------------------
+    # on_upload_event()
+    #
+    #  Slot for the upload events (au_events.py) of the running jobs. The
+    #  progress bar follows the selected port.
+    @pyqtSlot(object, int)
+    def on_upload_event(self, event, job_id) -> None:
 
-            # remove the "\b" from the input string, and delete the
-            # previous character from the cursor in the text console
-            tmp = tmp[1:]
-            self.messages.textCursor().deletePreviousChar()
-            self.messages.moveCursor(QTextCursor.End)
+        if isinstance(event, ProgressEvent):
+            self._port_progress[event.port] = event.percent
+            if event.port == self.port:
+                self.progress_bar.setValue(event.percent)
 
-        # insert the new text at the end of the console
-        self.messages.insertPlainText(tmp)
+        elif isinstance(event, PhaseEvent):
+            self.statusBar().showMessage(event.port + ": " + event.phase, 2000)
 
-        # make sure cursor is at end of text and it's visible
-        self.messages.moveCursor(QTextCursor.End)
-        self.messages.ensureCursorVisible()
+        elif isinstance(event, RetryEvent):
+            self.statusBar().showMessage(event.port + ": retry " + str(event.retries), 2000)
 
-        self.repaint()  # Update/refresh the message window
+        elif isinstance(event, ResultEvent):
+            self._port_progress[event.port] = 100 if event.success else 0
+            if event.port == self.port:
+                self.progress_bar.setValue(self._port_progress[event.port])
 
     # --------------------------------------------------------------
     # on_finished()
@@ -368,10 +404,15 @@ class MainWindow(QMainWindow):
     @pyqtSlot(int, str, int)
     def on_finished(self, status, action_type, job_id) -> None:
 
-        # re-enable the UX
-        self.disable_interface(False)
+        # re-enable the UX for the job's port
+        self._port_jobs.pop(job_id, None)
+        self.update_interface()
 
         # update the status message
+        if status == AUxWorker.STATUS_CANCELLED:
+            self.statusBar().showMessage("The upload process was cancelled", 2000)
+            return
+
         msg = "successfully" if status == 0 else "with an error"
         self.statusBar().showMessage("The upload process finished " + msg, 2000)
 
@@ -495,6 +536,8 @@ class MainWindow(QMainWindow):
         self.baud_combobox.addItem("115200", 115200)
         self.baud_combobox.addItem("460800", 460800)
         self.baud_combobox.addItem("921600", 921600)
+        # Fastest rate that works, remembered per serial adapter
+        self.baud_combobox.addItem("Auto", SVL_BAUD_AUTO)
 
     # --------------------------------------------------------------
     @property
@@ -513,21 +556,27 @@ class MainWindow(QMainWindow):
         """Handle Close event of the Widget."""
         self._save_settings()
 
-        # shutdown the background worker/stop it so the app exits correctly
+        # shutdown the background worker/stop it so the app exits correctly -
+        # a running upload is cancelled at its next frame
         self._worker.shutdown()
 
         event.accept()
 
     # --------------------------------------------------------------
-    # disable_interface()
+    # update_interface()
     #
-    # Enable/Disable portions of the ux - often used when a job is running
+    # Enable/Disable portions of the ux - the upload buttons are disabled
+    # while the selected port has a job. Other ports can be used meanwhile.
     #
-    def disable_interface(self, bDisable=False):
+    def update_interface(self):
+
+        bDisable = self.port in self._port_jobs.values()
 
         self.upload_btn.setDisabled(bDisable)
         self.updateBootloader_btn.setDisabled(bDisable)
 
+        self.progress_bar.setValue(self._port_progress.get(self.port, 0))
+
     # --------------------------------------------------------------
     # on_upload_btn_pressed()
     #
@@ -555,7 +604,9 @@ class MainWindow(QMainWindow):
         # Send the job to the worker to process
         job_id = self._worker.add_job(theJob)
 
-        self.disable_interface(True)
+        self._port_jobs[job_id] = theJob.port
+        self._port_progress[theJob.port] = 0
+        self.update_interface()
 
     # --------------------------------------------------------------
     def on_update_bootloader_btn_pressed(self) -> None:
@@ -579,7 +630,9 @@ class MainWindow(QMainWindow):
         # Send the job to the worker to process
         job_id = self._worker.add_job(theJob)
 
-        self.disable_interface(True)
+        self._port_jobs[job_id] = theJob.port
+        self._port_progress[theJob.port] = 0
+        self.update_interface()
 
     # --------------------------------------------------------------
     def on_browse_btn_pressed(self) -> None:
@@ -1,5 +1,5 @@
-
 #
-# Make a package out of asb.py. Just export main() from asb.p
+# Make a package out of asb.py. Exports main() from asb.py, and the pieces
+# used to burn a bootloader without going through the command line.
 
-from .asb import main 
\ No newline at end of file
+from .asb import main, parse_arguments, make_wired_image, AsbSession
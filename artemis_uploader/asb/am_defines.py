@@ -6,9 +6,9 @@ from Crypto.Cipher import AES
 from Crypto.PublicKey import RSA 
 from Crypto.Signature import PKCS1_v1_5 
 from Crypto.Hash import SHA256 
-import array
 import hashlib
 import hmac
+import logging
 import os
 import binascii
 
@@ -392,9 +392,9 @@ def pad_to_block_size(text, block_size, bZeroPad):
 #
 #******************************************************************************
 def encrypt_app_aes(cleartext, encKey, iv):
-    key = array.array('B', encKey).tostring()
-    ivVal = array.array('B', iv).tostring()
-    plaintext = array.array('B', cleartext).tostring()
+    key = bytes(encKey)
+    ivVal = bytes(iv)
+    plaintext = bytes(cleartext)
 
     encryption_suite = AES.new(key, AES.MODE_CBC, ivVal)
     cipher_text = encryption_suite.encrypt(plaintext)
@@ -407,9 +407,9 @@ def encrypt_app_aes(cleartext, encKey, iv):
 #
 #******************************************************************************
 def encrypt_app_aes128(cleartext, encKey, iv):
-    key = array.array('B', encKey).tostring()
-    ivVal = array.array('B', iv).tostring()
-    plaintext = array.array('B', cleartext).tostring()
+    key = bytes(encKey)
+    ivVal = bytes(iv)
+    plaintext = bytes(cleartext)
 
     encryption_suite = AES.new(key, AES.MODE_CBC, ivVal)
     cipher_text = encryption_suite.encrypt(plaintext)
@@ -422,7 +422,7 @@ def encrypt_app_aes128(cleartext, encKey, iv):
 #
 #******************************************************************************
 def compute_hmac(key, data):
-    sig = hmac.new(array.array('B', key).tostring(), array.array('B', data).tostring(), hashlib.sha256).digest()
+    sig = hmac.new(bytes(key), data, hashlib.sha256).digest()
     return sig
 
 #******************************************************************************
@@ -502,6 +502,15 @@ def auto_int(x):
 #
 # User controllable Prints control
 #
+# The prints go through the standard logging module, to the logger
+# 'artemis_uploader.asb' - by default a handler prints them to the current
+# sys.stdout, as print() did. A GUI or CLI can route them elsewhere with
+# am_set_log_handler().
+#
+# Arguments are only formatted when the message will be emitted. am_print()
+# takes print() style arguments, any of which can be a callable returning the
+# value; am_log() takes a %-style format. am_hex() defers a list of hex values.
+#
 #******************************************************************************
 # Defined print levels
 AM_PRINT_LEVEL_MIN     = 0
@@ -517,11 +526,66 @@ AM_PRINT_VERBOSITY = AM_PRINT_LEVEL_INFO
 
 helpPrintLevel = 'Set Log Level (0: None), (1: Error), (2: INFO), (4: Verbose), (5: Debug) [Default = Info]'
 
+# logging level for each print level
+AM_LOG_VERBOSE = 15
+logging.addLevelName(AM_LOG_VERBOSE, 'VERBOSE')
+
+_AM_LOG_LEVELS = {
+    AM_PRINT_LEVEL_NONE:    logging.CRITICAL + 10,
+    AM_PRINT_LEVEL_ERROR:   logging.ERROR,
+    AM_PRINT_LEVEL_INFO:    logging.INFO,
+    3:                      logging.INFO,
+    AM_PRINT_LEVEL_VERBOSE: AM_LOG_VERBOSE,
+    AM_PRINT_LEVEL_DEBUG:   logging.DEBUG,
+}
+
+class _PrintHandler(logging.Handler):
+
+    # print() looks up sys.stdout each time - so redirected output follows
+    def emit(self, record):
+        try:
+            print(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+am_logger = logging.getLogger('artemis_uploader.asb')
+am_logger.setLevel(_AM_LOG_LEVELS[AM_PRINT_VERBOSITY])
+am_logger.propagate = False
+
+_am_handler = _PrintHandler()
+am_logger.addHandler(_am_handler)
+
+# Send the prints to handler instead - None prints them again
+def am_set_log_handler(handler=None):
+    global _am_handler
+    am_logger.removeHandler(_am_handler)
+    _am_handler = handler if handler is not None else _PrintHandler()
+    am_logger.addHandler(_am_handler)
+
 def am_set_print_level(level):
     global AM_PRINT_VERBOSITY
     AM_PRINT_VERBOSITY = level
+    am_logger.setLevel(_AM_LOG_LEVELS.get(level, logging.DEBUG))
 
-def am_print(*args, level=AM_PRINT_LEVEL_INFO, **kwargs):
-    global AM_PRINT_VERBOSITY
-    if (AM_PRINT_VERBOSITY >= level):
-        print(*args, **kwargs)
+class _Deferred(object):
+
+    __slots__ = ('func',)
+
+    def __init__(self, func):
+        self.func = func
+
+    def __str__(self):
+        return str(self.func())
+
+# [hex(n) for n in data], formatted only if it is emitted
+def am_hex(data):
+    return _Deferred(lambda: [hex(n) for n in data])
+
+def am_print(*args, level=AM_PRINT_LEVEL_INFO, sep=' ', logger=None):
+    logger = logger or am_logger
+    levelno = _AM_LOG_LEVELS.get(level, logging.DEBUG)
+    if logger.isEnabledFor(levelno):
+        logger.log(levelno, sep.join(str(arg() if callable(arg) else arg) for arg in args))
+
+def am_log(level, msg, *args, logger=None):
+    (logger or am_logger).log(_AM_LOG_LEVELS.get(level, logging.DEBUG), msg, *args)
@@ -10,9 +10,9 @@
 import argparse
 import sys
 from Crypto.Cipher import AES
-import array
 import hashlib
 import hmac
+import logging
 import os
 import binascii
 import serial
@@ -22,33 +22,139 @@ import time
 from sys import exit
 
 from .am_defines import *
+from .wire_codec import WireCodec, WireError, decode_status, decode_ack, message_type, write_parts, \
+    STATUS_SIZE, ACK_SIZE, MAX_DATA_CHUNK
+from .reset_sequencer import ResetSequencer, RESET_BOARDS, RESET_PROFILES, select_reset_profile
+from .image_cache import get_wired_image_cache, wired_image_key, wired_image_params
+from ..au_cancel import check_cancel
+from ..au_events import EventBus, UploadMetrics, PhaseEvent, ProgressEvent, RetryEvent, ResultEvent, \
+    PHASE_CONNECT, PHASE_SETUP, PHASE_BOOTLOAD
 from .keys_info import keyTblAes, keyTblHmac, minAesKeyIdx, maxAesKeyIdx, minHmacKeyIdx, maxHmacKeyIdx, INFO_KEY, FLASH_KEY
 
+
 #******************************************************************************
 #
-# Global Variables
+# Read a stage input - the bytes themselves, an open file or a file name
 #
 #******************************************************************************
-loadTries = 0 #If we fail, try again. Tracks the number of tries we've attempted
-loadSuccess = False
-blob2wiredfile = ''
-uploadbinfile = ''
+def read_input(source):
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytearray(source)
+
+    if hasattr(source, 'read'):
+        with source as f_app:
+            return bytearray(f_app.read())
+
+    with open(source, 'rb') as f_app:
+        return bytearray(f_app.read())
+
+#******************************************************************************
+#
+# Application input, streamed in chunks
+#
+# The application is read in BLOB_CHUNK_SIZE pieces - views of a buffer, or
+# reads into one reusable buffer from a file - with its padding after the last
+# piece. Every piece but the last is a multiple of the AES block size. It can
+# be streamed any number of times.
+#
+#******************************************************************************
+BLOB_CHUNK_SIZE = 64 * 1024
+
+class AppStream(object):
+
+    def __init__(self, source):
+
+        self._pad = b''
+        self._file = None
+        self._view = None
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._view = memoryview(source).cast('B')
+            self.length = len(self._view)
+        else:
+            # closed when done, like read_input()
+            self._file = source if hasattr(source, 'read') else open(source, 'rb')
+            self.length = self._file.seek(0, os.SEEK_END)
+
+    # Pad like pad_to_block_size()
+    def pad_to_block_size(self, block_size, bZeroPad):
+
+        amount_to_pad = block_size - (self.length % block_size)
+        if (amount_to_pad == block_size) and (bZeroPad == 0):
+            amount_to_pad = 0
+        self._pad = bytes((amount_to_pad,)) * amount_to_pad
+
+    @property
+    def padded_length(self):
+        return self.length + len(self._pad)
+
+    def _pieces(self):
+
+        if self._view is not None:
+            for offset in range(0, self.length, BLOB_CHUNK_SIZE):
+                yield self._view[offset:offset + BLOB_CHUNK_SIZE]
+            return
+
+        self._file.seek(0)
+        buffer = bytearray(BLOB_CHUNK_SIZE)
+        with memoryview(buffer) as view:
+            while True:
+                filled = 0
+                while filled < BLOB_CHUNK_SIZE:
+                    count = self._file.readinto(view[filled:])
+                    if not count:
+                        break
+                    filled += count
+                if not filled:
+                    return
+                yield view[:filled]
+                if filled < BLOB_CHUNK_SIZE:
+                    return
+
+    def chunks(self):
 
+        # the padding joins the last piece - the only small copy. File pieces
+        # share one buffer, so the last one is known by position
+        position = 0
+        for piece in self._pieces():
+            position += len(piece)
+            if self._pad and position == self.length and len(piece) < BLOB_CHUNK_SIZE:
+                yield bytes(piece) + self._pad
+                return
+            yield piece
+
+        if self._pad:
+            yield self._pad
+
+    def close(self):
+
+        if self._view is not None:
+            self._view.release()
+        else:
+            self._file.close()
 
 #******************************************************************************
 #
 # Generate the image blob as per command line parameters
 #
+# Returns the OTA blob, or None on a parameter error. The blob is also written
+# to <output>_OTA_blob.bin if output is given.
+#
+# The application is streamed - through the clear image HMAC, the AES-CBC
+# encryptor (or a plain copy) into the blob, and the CRC - so besides the blob
+# itself memory use doesn't grow with the image.
+#
 #******************************************************************************
 def bin2blob_process(loadaddress, appFile, magicNum, crcI, crcB, authI, authB, protection, authKeyIdx, output, encKeyIdx, version, erasePrev, child0, child1, authalgo, encalgo):
 
-    global blob2wiredfile
+    app = AppStream(appFile)
+    try:
+        return _bin2blob_stream(loadaddress, app, magicNum, crcI, crcB, authI, authB, protection, authKeyIdx, output, encKeyIdx, version, erasePrev, child0, child1, authalgo, encalgo)
+    finally:
+        app.close()
 
-    app_binarray = bytearray()
-    # Open the file, and read it into an array of integers.
-    with appFile as f_app:
-        app_binarray.extend(f_app.read())
-        f_app.close()
+def _bin2blob_stream(loadaddress, app, magicNum, crcI, crcB, authI, authB, protection, authKeyIdx, output, encKeyIdx, version, erasePrev, child0, child1, authalgo, encalgo):
 
     encVal = 0
     if (encalgo != 0):
@@ -80,7 +186,7 @@ def bin2blob_process(loadaddress, appFile, magicNum, crcI, crcB, authI, authB, p
     #generate mutable byte array for the header
     hdr_binarray = bytearray([0x00]*hdr_length);
 
-    orig_app_length  = (len(app_binarray))
+    orig_app_length  = app.length
     am_print("original app_size ",hex(orig_app_length), "(",orig_app_length,")")
 
     am_print("load_address ",hex(loadaddress), "(",loadaddress,")")
@@ -98,12 +204,12 @@ def bin2blob_process(loadaddress, appFile, magicNum, crcI, crcB, authI, authB, p
 
     if (encVal == 1):
         block_size = AM_SECBOOT_AESCBC_BLOCK_SIZE_BYTES
-        app_binarray = pad_to_block_size(app_binarray, block_size, 1)
+        app.pad_to_block_size(block_size, 1)
     else:
         # Add Padding
-        app_binarray = pad_to_block_size(app_binarray, 4, 0)
+        app.pad_to_block_size(4, 0)
     
-    app_length  = (len(app_binarray))
+    app_length  = app.padded_length
     am_print("app_size ",hex(app_length), "(",app_length,")")
 
     # Create Image blobs
@@ -146,17 +252,25 @@ def bin2blob_process(loadaddress, appFile, magicNum, crcI, crcB, authI, authB, p
     fill_word(hdr_binarray, AM_IMAGEHDR_OFFSET_CHILDPTR + 4, child1)
 
     authKeyIdx = authKeyIdx - minHmacKeyIdx
+    hmacKey = bytes(keyTblHmac[authKeyIdx*AM_SECBOOT_KEYIDX_BYTES:(authKeyIdx*AM_SECBOOT_KEYIDX_BYTES+AM_HMAC_SIG_SIZE)])
     if (authB != 0): # Authentication needed
         am_print("Boot Authentication Enabled")
 #        am_print("Key used for HMAC")
-#        am_print([hex(keyTblHmac[authKeyIdx*AM_SECBOOT_KEYIDX_BYTES + n]) for n in range (0, AM_HMAC_SIG_SIZE)])
-        # Initialize the clear image HMAC
-        sigClr = compute_hmac(keyTblHmac[authKeyIdx*AM_SECBOOT_KEYIDX_BYTES:(authKeyIdx*AM_SECBOOT_KEYIDX_BYTES+AM_HMAC_SIG_SIZE)], (hdr_binarray[AM_IMAGEHDR_START_HMAC:hdr_length] + app_binarray))
+#        am_print(am_hex(hmacKey))
+        # Initialize the clear image HMAC - over the header from the HMAC start, then the image
+        mac = hmac.new(hmacKey, hdr_binarray[AM_IMAGEHDR_START_HMAC:hdr_length], hashlib.sha256)
+        for chunk in app.chunks():
+            mac.update(chunk)
+        sigClr = mac.digest()
         am_print("HMAC Clear")
-        am_print([hex(n) for n in sigClr])
+        am_print(am_hex(sigClr))
         # Fill up the HMAC
-        for x in range(0, AM_HMAC_SIG_SIZE):
-            hdr_binarray[AM_IMAGEHDR_OFFSET_SIGCLR + x]  = sigClr[x]
+        hdr_binarray[AM_IMAGEHDR_OFFSET_SIGCLR:AM_IMAGEHDR_OFFSET_SIGCLR + AM_HMAC_SIG_SIZE] = sigClr
+
+    # The blob - the header up to the encrypted part, then the (encrypted) header rest and image
+    blob = bytearray(hdr_length + app_length)
+    body = memoryview(blob)[AM_IMAGEHDR_START_ENCRYPT:]
+    clear_hdr = hdr_binarray[AM_IMAGEHDR_START_ENCRYPT:hdr_length]
 
     # All the header fields part of the encryption are now final
     if (encVal == 1):
@@ -164,69 +278,83 @@ def bin2blob_process(loadaddress, appFile, magicNum, crcI, crcB, authI, authB, p
         encKeyIdx = encKeyIdx - minAesKeyIdx
         ivValAes = os.urandom(AM_SECBOOT_AESCBC_BLOCK_SIZE_BYTES)
         am_print("Initialization Vector")
-        am_print([hex(ivValAes[n]) for n in range (0, AM_SECBOOT_AESCBC_BLOCK_SIZE_BYTES)])
+        am_print(am_hex(ivValAes[0:AM_SECBOOT_AESCBC_BLOCK_SIZE_BYTES]))
         keyAes = os.urandom(keySize)
         am_print("AES Key used for encryption")
-        am_print([hex(keyAes[n]) for n in range (0, keySize)])
-        # Encrypted Part
+        am_print(am_hex(keyAes[0:keySize]))
+        # Encrypted Part - each chunk encrypted straight into the blob
         am_print("Encrypting blob of size " , (hdr_length - AM_IMAGEHDR_START_ENCRYPT + app_length))
-        enc_binarray = encrypt_app_aes((hdr_binarray[AM_IMAGEHDR_START_ENCRYPT:hdr_length] + app_binarray), keyAes, ivValAes)
+        encryption_suite = AES.new(keyAes, AES.MODE_CBC, ivValAes)
+        write = lambda chunk, dest: encryption_suite.encrypt(chunk, output=dest)
 #        am_print("Key used for encrypting AES Key")
 #        am_print([hex(keyTblAes[encKeyIdx*keySize + n]) for n in range (0, keySize)])
         # Encrypted Key
         enc_key = encrypt_app_aes(keyAes, keyTblAes[encKeyIdx*keySize:encKeyIdx*keySize + keySize], ivVal0)
         am_print("Encrypted Key")
-        am_print([hex(enc_key[n]) for n in range (0, keySize)])
+        am_print(am_hex(enc_key[0:keySize]))
         # Fill up the IV
-        for x in range(0, AM_SECBOOT_AESCBC_BLOCK_SIZE_BYTES):
-            hdr_binarray[AM_IMAGEHDR_OFFSET_IV + x]  = ivValAes[x]
+        hdr_binarray[AM_IMAGEHDR_OFFSET_IV:AM_IMAGEHDR_OFFSET_IV + AM_SECBOOT_AESCBC_BLOCK_SIZE_BYTES] = ivValAes
         # Fill up the Encrypted Key
-        for x in range(0, keySize):
-            hdr_binarray[AM_IMAGEHDR_OFFSET_KEK + x]  = enc_key[x]
+        hdr_binarray[AM_IMAGEHDR_OFFSET_KEK:AM_IMAGEHDR_OFFSET_KEK + keySize] = enc_key[0:keySize]
     else:
-        enc_binarray = hdr_binarray[AM_IMAGEHDR_START_ENCRYPT:hdr_length] + app_binarray
+        def write(chunk, dest):
+            dest[:] = chunk
 
+    pos = len(clear_hdr)
+    write(clear_hdr, body[:pos])
+    for chunk in app.chunks():
+        write(chunk, body[pos:pos + len(chunk)])
+        pos += len(chunk)
 
     if (authI != 0): # Install Authentication needed
         am_print("Install Authentication Enabled")
 #        am_print("Key used for HMAC")
-#        am_print([hex(keyTblHmac[authKeyIdx*AM_SECBOOT_KEYIDX_BYTES + n]) for n in range (0, AM_HMAC_SIG_SIZE)])
-        # Initialize the top level HMAC
-        sig = compute_hmac(keyTblHmac[authKeyIdx*AM_SECBOOT_KEYIDX_BYTES:(authKeyIdx*AM_SECBOOT_KEYIDX_BYTES+AM_HMAC_SIG_SIZE)], (hdr_binarray[AM_IMAGEHDR_START_HMAC_INST:AM_IMAGEHDR_START_ENCRYPT] + enc_binarray))
+#        am_print(am_hex(hmacKey))
+        # Initialize the top level HMAC - over the IV and key, then the encrypted part
+        sig = hmac.new(hmacKey, hdr_binarray[AM_IMAGEHDR_START_HMAC_INST:AM_IMAGEHDR_START_ENCRYPT], hashlib.sha256)
+        sig.update(body)
+        sig = sig.digest()
         am_print("Generated Signature")
-        am_print([hex(n) for n in sig])
+        am_print(am_hex(sig))
         # Fill up the HMAC
-        for x in range(0, AM_HMAC_SIG_SIZE):
-            hdr_binarray[AM_IMAGEHDR_OFFSET_SIG + x]  = sig[x]
+        hdr_binarray[AM_IMAGEHDR_OFFSET_SIG:AM_IMAGEHDR_OFFSET_SIG + AM_HMAC_SIG_SIZE] = sig
+
     # compute the CRC for the blob - this is done on a clear image
-    crc = crc32(hdr_binarray[AM_IMAGEHDR_START_CRC:hdr_length] + app_binarray)
+    crc = binascii.crc32(hdr_binarray[AM_IMAGEHDR_START_CRC:hdr_length])
+    if (encVal == 1):
+        for chunk in app.chunks():
+            crc = binascii.crc32(chunk, crc)
+    else:
+        # the blob holds the clear image
+        crc = binascii.crc32(body[len(clear_hdr):], crc)
+    body.release()
     am_print("crc =  ",hex(crc));
     w1 = crc
     fill_word(hdr_binarray, AM_IMAGEHDR_OFFSET_CRC, w1)
 
-    # now output all three binary arrays in the proper order
-    output = output + '_OTA_blob.bin'
-    blob2wiredfile = output # save the output of bin2blob for use by blob2wired
-    am_print("Writing to file ", output)
-    with open(output, mode = 'wb') as out:
-        out.write(hdr_binarray[0:AM_IMAGEHDR_START_ENCRYPT])
-        out.write(enc_binarray)
+    # now the header in front of the encrypted part
+    blob[0:AM_IMAGEHDR_START_ENCRYPT] = hdr_binarray[0:AM_IMAGEHDR_START_ENCRYPT]
+
+    if output:
+        output = output + '_OTA_blob.bin'
+        am_print("Writing to file ", output)
+        with open(output, mode = 'wb') as out:
+            out.write(blob)
+
+    return blob
 
 
 #******************************************************************************
 #
-# Generate the image blob as per command line parameters
+# Generate the wired update image from an OTA blob
+#
+# Returns the wired image, or None on a parameter error. The image is also
+# written to <output>_Wired_OTA_blob.bin if output is given.
 #
 #******************************************************************************
 def blob2wired_process(appFile, imagetype, loadaddress, authalgo, encalgo, authKeyIdx, encKeyIdx, optionsVal, maxSize, output):
-    global uploadbinfile
 
-    app_binarray = bytearray()
-    # Open the file, and read it into an array of integers.
-    print('testing: ' + appFile )
-    with open(appFile,'rb') as f_app:
-        app_binarray.extend(f_app.read())
-        f_app.close()
+    app_binarray = read_input(appFile)
 
     # Make sure it is page multiple
     if ((maxSize & (FLASH_PAGE_SIZE - 1)) != 0):
@@ -269,9 +397,7 @@ def blob2wired_process(appFile, imagetype, loadaddress, authalgo, encalgo, authK
 
     start = 0
     # now output all three binary arrays in the proper order
-    output = output + '_Wired_OTA_blob.bin'
-    uploadbinfile = output; # save the name of the output from blob2wired
-    out = open(output, mode = 'wb')
+    wired = bytearray()
 
     while (start < app_length):
         #generate mutable byte array for the header
@@ -311,10 +437,10 @@ def blob2wired_process(appFile, imagetype, loadaddress, authalgo, encalgo, authK
             keyIdx = encKeyIdx - minAesKeyIdx
             ivValAes = os.urandom(AM_SECBOOT_AESCBC_BLOCK_SIZE_BYTES)
             am_print("Initialization Vector")
-            am_print([hex(n) for n in ivValAes])
+            am_print(am_hex(ivValAes))
             keyAes = os.urandom(keySize)
             am_print("AES Key used for encryption")
-            am_print([hex(keyAes[n]) for n in range (0, keySize)])
+            am_print(am_hex(keyAes[0:keySize]))
             # Encrypted Part - after security header
             enc_binarray = encrypt_app_aes((hdr_binarray[AM_WU_IMAGEHDR_START_ENCRYPT:hdr_length] + app_binarray[start:end]), keyAes, ivValAes)
 #            am_print("Key used for encrypting AES Key")
@@ -322,7 +448,7 @@ def blob2wired_process(appFile, imagetype, loadaddress, authalgo, encalgo, authK
             # Encrypted Key
             enc_key = encrypt_app_aes(keyAes, keyTblAes[keyIdx*AM_SECBOOT_KEYIDX_BYTES:(keyIdx*AM_SECBOOT_KEYIDX_BYTES + keySize)], ivVal0)
             am_print("Encrypted Key")
-            am_print([hex(enc_key[n]) for n in range (0, keySize)])
+            am_print(am_hex(enc_key[0:keySize]))
             # Fill up the IV
             for x in range(0, AM_SECBOOT_AESCBC_BLOCK_SIZE_BYTES):
                 hdr_binarray[AM_WU_IMAGEHDR_OFFSET_IV + x]  = ivValAes[x]
@@ -340,33 +466,127 @@ def blob2wired_process(appFile, imagetype, loadaddress, authalgo, encalgo, authK
             # Initialize the HMAC - Sign is computed on image following the signature
             sig = compute_hmac(keyTblHmac[keyIdx*AM_SECBOOT_KEYIDX_BYTES:(keyIdx*AM_SECBOOT_KEYIDX_BYTES+AM_HMAC_SIG_SIZE)], hdr_binarray[AM_WU_IMAGEHDR_START_HMAC:AM_WU_IMAGEHDR_START_ENCRYPT] + enc_binarray)
             am_print("HMAC")
-            am_print([hex(n) for n in sig])
+            am_print(am_hex(sig))
             # Fill up the HMAC
             for x in range(0, AM_HMAC_SIG_SIZE):
                 hdr_binarray[AM_WU_IMAGEHDR_OFFSET_SIG + x]  = sig[x]
 
-        am_print("Writing to file ", output)
-        am_print("Image from ", str(hex(start)), " to ", str(hex(end)), " will be loaded at", str(hex(loadaddress))) 
-        out.write(hdr_binarray[0:AM_WU_IMAGEHDR_START_ENCRYPT])
-        out.write(enc_binarray)
+        am_log(AM_PRINT_LEVEL_INFO, "Image from  %#x  to  %#x  will be loaded at %#x", start, end, loadaddress)
+        wired += hdr_binarray[0:AM_WU_IMAGEHDR_START_ENCRYPT]
+        wired += enc_binarray
 
         # Reset start for next chunk
         start = end
         loadaddress = loadaddress + maxSize
 
+    wired = bytes(wired)
+
+    if output:
+        output = output + '_Wired_OTA_blob.bin'
+        am_print("Writing to file ", output)
+        with open(output, mode = 'wb') as out:
+            out.write(wired)
+
+    return wired
+
 
 #******************************************************************************
 #
-# Main function
+# Verbose output of the upload session (-v) - a child of the am_print logger,
+# with its own level, so it is routed with it but enabled separately
 #
 #******************************************************************************
-def upload(args, verboseprint):
+upload_logger = logging.getLogger('artemis_uploader.asb.upload')
+upload_logger.setLevel(logging.CRITICAL + 10)
 
-    global loadTries
-    global loadSuccess
+def verboselog(msg, *args):
+    upload_logger.log(AM_LOG_VERBOSE, msg, *args)
+
+
+#******************************************************************************
+#
+# Show a list of com ports and recommend one
+#
+#******************************************************************************
+def suggest_ports():
+
+    print("Detected Serial Ports:")
+    devices = list_ports.comports()
+    for dev in devices:
+        print(dev.description)
+        # The SparkFun BlackBoard has CH340 in the description
+        if 'CH340' in dev.description:
+            print("The port you selected was not found. But we did detect a CH340 on " + dev.device + " so you might try again on that port.")
+            break
+        elif 'FTDI' in dev.description:
+            print("The port you selected was not found. But we did detect an FTDI on " + dev.device + " so you might try again on that port.")
+            break
+        elif 'USB Serial Device' in dev.description:
+            print("The port you selected was not found. But we did detect a USB Serial Device on " + dev.device + " so you might try again on that port.")
+            break
+    else:
+        print("Com Port not found - Did you select the right one?")
+
+
+#******************************************************************************
+#
+# Automatic split - size the image blocks to the storage the device reports
+#
+# Each block of a wired image (header and image data) is held by the
+# bootloader until it is complete, so a block can be as large as the Max
+# Storage in the HELLO STATUS response. Larger blocks mean fewer UPDATE
+# round trips and fewer flash stalls.
+#
+#******************************************************************************
+SPLIT_AUTO = 'auto'
+
+def split_arg(x):
+    if x.lower() == SPLIT_AUTO:
+        return SPLIT_AUTO
+    return auto_int(x)
+
+# The largest page aligned split for a block to fit in max_storage, or None
+def auto_split(max_storage):
+
+    split = (max_storage - AM_WU_IMAGEHDR_SIZE) & ~(FLASH_PAGE_SIZE - 1)
+    if split < FLASH_PAGE_SIZE:
+        return None
+    return split
+
+# Number of blocks in a wired image of total_len bytes
+def wired_block_count(total_len, split):
+    return (total_len + AM_WU_IMAGEHDR_SIZE + split - 1) // (AM_WU_IMAGEHDR_SIZE + split)
+
+# Number of blocks the image data in a wired image would need at another split
+def rebuilt_block_count(total_len, split, other_split):
+
+    data_len = total_len - wired_block_count(total_len, split) * AM_WU_IMAGEHDR_SIZE
+    return (data_len + other_split - 1) // other_split
+
+#******************************************************************************
+#
+# Wired update session
+#
+# Owns one serial port and the state of one bootloader upload, so any number
+# of sessions can run side by side - in threads, for multi-board programming.
+#
+# The message sequence of a connection is written once, without I/O:
+# connect_core() is a generator that yields I/O requests and is sent the
+# replies.
+#
+#    (ASB_IO_EXCHANGE, parts, length)   send the message parts, read the
+#                                       response - its bytes, None if short
+#    (ASB_IO_WRITE, data)               send data, no response - None
+#
+# connect_device() carries them out on a pySerial port, asb_async on the
+# asyncio transport.
+#
+#******************************************************************************
+ASB_IO_EXCHANGE = 0
+ASB_IO_WRITE = 1
+
+class AsbSession(object):
 
-    # Open a serial port, and communicate with Device
-    #
     # Max flashing time depends on the amount of SRAM available.
     # For very large images, the flashing happens page by page.
     # However if the image can fit in the free SRAM, it could take a long time
@@ -374,330 +594,418 @@ def upload(args, verboseprint):
     # The largest image which can be stored depends on the max SRAM.
     # Assuming worst case ~100 ms/page of flashing time, and allowing for the
     # image to be close to occupying full SRAM (256K) which is 128 pages.
-
-    connection_timeout = 5
-
-    print('Connecting over serial port {}...'.format(args.port), flush=True)
-
-    #Check to see if the com port is available
-    try: 
-        with serial.Serial(args.port, args.baud, timeout=connection_timeout) as ser:
-            pass
-    except:
-
-        #Show a list of com ports and recommend one
-        print("Detected Serial Ports:")
-        devices = list_ports.comports()
-        port = None
-        for dev in devices:
-            print(dev.description)
-            # The SparkFun BlackBoard has CH340 in the description
-            if 'CH340' in dev.description:
-                print("The port you selected was not found. But we did detect a CH340 on " + dev.device + " so you might try again on that port.")
-                break
-            elif 'FTDI' in dev.description:
-                print("The port you selected was not found. But we did detect an FTDI on " + dev.device + " so you might try again on that port.")
-                break
-            elif 'USB Serial Device' in dev.description:
-                print("The port you selected was not found. But we did detect a USB Serial Device on " + dev.device + " so you might try again on that port.")
-                break
-        else: 
-            print("Com Port not found - Did you select the right one?")
-
-        exit()
-
-    #Begin talking over com port
+    CONNECTION_TIMEOUT = 5
 
     #The auto-bootload sequence is good but not fullproof. The bootloader
     #fails to correctly catch the BOOT signal about 1 out of ten times.
     #Auto-retry this number of times before we give up.
+    MAX_TRIES = 3
+
+    def __init__(self, port:str, baud:int=115200, abort:int=-1, otadesc:int=0xFE000,
+                 split:int=MAX_DOWNLOAD_SIZE, reset:int=1, raw:str='', max_tries:int=MAX_TRIES,
+                 board:str='artemis', reset_profile=None, cancel=None, events=None):
+
+        self.port = port
+        self.baud = baud
+        self.abort = abort          # -1 = no abort, 0 = abort, 1 = abort and quit
+        self.otadesc = otadesc      # 0xFFFFFFFF to skip OTA
+        self.split = split
+        self.reset = reset          # 0 = no reset, 1 = POI, 2 = POR
+        self.raw = raw              # file with a raw message to send
+        self.max_tries = max_tries
+        self.board = board
+        self.reset_profile = reset_profile  # ResetProfile, built in profile name, or None to select
+        self.cancel = cancel        # CancelToken checked between messages - see au_cancel.py
+        self.events = events if events is not None else EventBus()    # see au_events.py
+
+        self.tries = 0              # failed attempts in the last upload
+        self.success = False
+        self.status = None          # STATUS record from the last HELLO
+        self.blocks = 0             # blocks sent in the last connection
+        self.bytes_sent = 0         # image bytes sent in the last connection
+        self.frames_sent = 0        # DATA messages sent in the last connection
+        self.block_overhead = None  # measured seconds per block beyond its data
+
+        self._codec = WireCodec()
+
+    @classmethod
+    def from_args(cls, args, cancel=None, events=None):
+
+        # with --split auto the default is kept for devices that report no storage
+        split = MAX_DOWNLOAD_SIZE if args.split == SPLIT_AUTO else args.split
+
+        return cls(args.port, args.baud, abort=args.abort, otadesc=args.otadesc, split=split,
+                   reset=args.reset, raw=args.raw, board=getattr(args, 'board', 'artemis'),
+                   reset_profile=getattr(args, 'reset_profile', None), cancel=cancel, events=events)
+
+    #--------------------------------------------------------------------------
+    # The DTR/RTS timing for this board and the port's adapter
+    def profile(self):
+
+        if self.reset_profile is None:
+            return select_reset_profile(self.port, self.board)
+        if isinstance(self.reset_profile, str):
+            return RESET_PROFILES[self.reset_profile]
+        return self.reset_profile
+
+    #--------------------------------------------------------------------------
+    # Upload image - the wired update image, or b'' to only send the commands.
+    # image can also be a function of the split returning the wired image -
+    # see wired_image_builder() - to size the blocks to the device's storage.
+    # Returns True on success, raises JobCancelled once the cancel token is.
+
+    def upload(self, image) -> bool:
+
+        self.tries = 0
+        self.success = False
+        start = time.monotonic()
+
+        print('Connecting over serial port {}...'.format(self.port), flush=True)
+        self.events.publish(PhaseEvent(self.port, PHASE_CONNECT))
+
+        try:
+            #DTR is driven low when serial port open. DTR has now pulled RST low.
+            ser = serial.Serial(self.port, self.baud, timeout=self.CONNECTION_TIMEOUT)
+        except (serial.SerialException, ValueError):
+            suggest_ports()
+            return False
 
-    while loadTries < 3: 
-        loadSuccess = False
+        # the port stays open - each attempt resets the board again
+        with ser:
+            sequencer = ResetSequencer(ser, self.profile())
 
-        with serial.Serial(args.port, args.baud, timeout=connection_timeout) as ser:
-            #DTR is driven low when serial port open. DTR has now pulled RST low.
+            while self.tries < self.max_tries:
 
-            time.sleep(0.005) #3ms and 10ms work well. Not 50, and not 0.
+                check_cancel(self.cancel)
+                sequencer.reset()
 
-            #Setting RTS/DTR high causes the bootload pin to go high, then fall across 100ms
-            ser.setDTR(0) #Set DTR high
-            ser.setRTS(0) #Set RTS high - support the CH340E
+                self.success = self.connect_device(ser, image)
+                if self.success:
+                    break
 
-            #Give bootloader a chance to run and check bootload pin before communication begins. But must initiate com before bootloader timeout of 250ms.
-            time.sleep(0.100) #100ms works well
+                print("Fail")
+                self._count_try()
 
-            ser.reset_input_buffer()    # reset the input bufer to discard any UART traffic that the device may have generated
+        self._publish_result(start)
 
-            connect_device(ser, args, verboseprint)
+        return self.success
 
-            if(loadSuccess == True):
-                print("Tries =", loadTries)
-                print('Upload complete!')
-                exit()
-            else:
-                print("Fail")
-            
-            loadTries = loadTries + 1
-            
-    print("Tries =", loadTries)
-    print("Upload failed")
-    exit()
+    # The attempt failed - the board is reset for the next one
+    def _count_try(self):
 
+        self.tries = self.tries + 1
+        self.events.publish(RetryEvent(self.port, self.frames_sent, self.tries))
 
-#******************************************************************************
-#
-# Communicate with Device
-#
-# Given a serial port, connects to the target device using the
-# UART.
-#
-#******************************************************************************
-def connect_device(ser, args, verboseprint):
+    def _publish_result(self, start):
 
-    global loadSuccess
+        seconds = time.monotonic() - start
+        self.events.publish(ResultEvent(self.port, self.success, self.bytes_sent, seconds,
+                                        self.bytes_sent / seconds if seconds > 0 else 0.0, self.tries))
 
-    # Send Hello
-    #generate mutable byte array for the header
-    hello = bytearray([0x00]*4)
-    fill_word(hello, 0, ((8 << 16) | AM_SECBOOT_WIRED_MSGTYPE_HELLO))
-    verboseprint('Sending Hello.')
-    response = send_command(hello, 88, ser, verboseprint)
-
-    #Check if response failed
-    if response == False:
-        verboseprint("Failed to respond")
-        return
+    #--------------------------------------------------------------------------
+    # Read a response - None, logged, if it is short
 
-    verboseprint("Received response for Hello")
-    word = word_from_bytes(response, 4)
-    if ((word & 0xFFFF) == AM_SECBOOT_WIRED_MSGTYPE_STATUS):
-        # Received Status
-        print("Bootloader connected")
+    def _read_response(self, ser, msg, response_len):
 
-        verboseprint("Received Status")
-        verboseprint("length = ", hex((word >> 16)))
-        verboseprint("version = ", hex(word_from_bytes(response, 8)))
-        verboseprint("Max Storage = ", hex(word_from_bytes(response, 12)))
-        verboseprint("Status = ", hex(word_from_bytes(response, 16)))
-        verboseprint("State = ", hex(word_from_bytes(response, 20)))
-        verboseprint("AMInfo = ")
-        for x in range(24, 88, 4):
-            verboseprint(hex(word_from_bytes(response, x)))
-
-        abort = args.abort
-        if (abort != -1):
-            # Send OTA Desc
-            verboseprint('Sending Abort command.')
-            abortMsg = bytearray([0x00]*8);
-            fill_word(abortMsg, 0, ((12 << 16) | AM_SECBOOT_WIRED_MSGTYPE_ABORT))
-            fill_word(abortMsg, 4, abort)
-            if send_ackd_command(abortMsg, ser, verboseprint) == False:
-                verboseprint("Failed to ack command")
-                return
+        response = ser.read(response_len)
 
+        # Make sure we got the number of bytes we asked for.
+        if len(response) != response_len:
+            verboselog('No response for command 0x%08X', message_type(msg))
+            if response:
+                verboselog("received bytes %d", len(response))
+                verboselog("%s", am_hex(response))
+            return None
 
-        otadescaddr = args.otadesc
-        if (otadescaddr != 0xFFFFFFFF):
-            # Send OTA Desc
-            verboseprint('Sending OTA Descriptor = ', hex(otadescaddr))
-            otaDesc = bytearray([0x00]*8);
-            fill_word(otaDesc, 0, ((12 << 16) | AM_SECBOOT_WIRED_MSGTYPE_OTADESC))
-            fill_word(otaDesc, 4, otadescaddr)
-            if send_ackd_command(otaDesc, ser, verboseprint) == False:
-                verboseprint("Failed to ack command")
-                return
+        return response
 
+    # A command - yields the message, returns the ACK record, or None on a
+    # missing response or a NACK
+    def _command(self, parts):
 
-        imageType = args.imagetype
-        if (uploadbinfile != ''):
+        response = yield (ASB_IO_EXCHANGE, parts, ACK_SIZE)
+        return self._ack(response)
 
-            # Read the binary file from the command line.
-            with open(uploadbinfile, mode='rb') as binfile:
-                application = binfile.read()
+    # A DATA message - header and chunk in one vectored write
+    def _data(self, seqno, chunk):
+
+        header = self._codec.data_header(seqno, chunk)
+        return (yield from self._command((header, chunk)))
+
+    def _ack(self, response):
+
+        if response is None:
+            verboselog("Response not valid")
+            return None
+
+        try:
+            ack = decode_ack(response)
+        except WireError as err:
+            verboselog("%s", err)
+            return None
+
+        if not ack.ok:
+            verboselog("Received NACK")
+            verboselog("msgType = %#x", ack.acked_type)
+            verboselog("error = %#x", ack.status)
+            verboselog("seqNo = %#x", ack.seqno)
+            verboselog("Upload failed: No ack to command")
+            return None
+
+        return ack
+
+    #--------------------------------------------------------------------------
+    # Automatic split - build the image for the device's Max Storage
+
+    def _build_for_device(self, build, status):
+
+        split = auto_split(status.max_storage)
+        if split is None:
+            print("Device reports no usable storage (Max Storage = {}), using split {}".format(
+                  hex(status.max_storage), hex(self.split)))
+            split = self.split
+
+        image = build(split)
+        if image is None:
+            print("Unable to create the wired update image")
+            return None
+
+        self.split = split
+        return image
+
+    # A block costs its UPDATE round trip, and the flash stall that shows up as
+    # the extra time to ACK its last data packet
+    @staticmethod
+    def _block_overhead(update_times, last_data_times, data_times):
+
+        if not update_times:
+            return None
+
+        typical = sorted(data_times)[len(data_times) // 2] if data_times else 0.0
+        stall = sum(max(0.0, t - typical) for t in last_data_times)
+
+        return (sum(update_times) + stall) / len(update_times)
+
+    def _report_split(self, total_len):
+
+        if auto_split(self.status.max_storage) is None:
+            return
+
+        default_blocks = rebuilt_block_count(total_len, self.split, MAX_DOWNLOAD_SIZE)
+
+        print("Split {} from device Max Storage {}: {} block{} ({} at the default split {})".format(
+              hex(self.split), hex(self.status.max_storage), self.blocks, "s" if self.blocks != 1 else "",
+              default_blocks, hex(MAX_DOWNLOAD_SIZE)))
+
+        if self.block_overhead is not None:
+            saved = (default_blocks - self.blocks) * self.block_overhead
+            print("Estimated time {}: {:.2f} s ({:.1f} ms per block)".format(
+                  "saved" if saved >= 0 else "lost - the device has less storage than the default split",
+                  abs(saved), self.block_overhead * 1000))
+
+    #--------------------------------------------------------------------------
+    # Communicate with Device
+    #
+    # Given a serial port, connects to the target device using the
+    # UART, and sends it image.
+
+    def connect_device(self, ser, image) -> bool:
+
+        core = self.connect_core(image)
+        reply = None
+
+        while True:
+            try:
+                request = core.send(reply)
+            except StopIteration as result:
+                return result.value
+
+            if request[0] == ASB_IO_EXCHANGE:
+                parts = request[1]
+                if len(parts) == 1:
+                    ser.write(parts[0])
+                else:
+                    write_parts(ser, parts)
+                reply = self._read_response(ser, parts[0], request[2])
+            else:
+                ser.write(request[1])
+                reply = None
+
+    # The connection's messages - see ASB_IO_EXCHANGE
+    def connect_core(self, image):
+
+        codec = self._codec
+
+        self.bytes_sent = 0
+        self.frames_sent = 0
+
+        # Send Hello
+        self.events.publish(PhaseEvent(self.port, PHASE_SETUP))
+        verboselog('Sending Hello.')
+        response = yield (ASB_IO_EXCHANGE, (codec.hello(),), STATUS_SIZE)
+
+        #Check if response failed
+        if response is None:
+            verboselog("Failed to respond")
+            return False
+
+        verboselog("Received response for Hello")
+        try:
+            status = decode_status(response)
+        except WireError:
+            # Received Wrong message
+            word = word_from_bytes(response, 4)
+            verboselog("Received Unknown Message")
+            verboselog("msgType = %#x", word & 0xFFFF)
+            verboselog("Length = %#x", word >> 16)
+            verboselog("%s", am_hex(response))
+            return False
+
+        # Received Status
+        print("Bootloader connected")
+        self.status = status
+
+        verboselog("Received Status")
+        verboselog("length = %#x", status.length)
+        verboselog("version = %#x", status.version)
+        verboselog("Max Storage = %#x", status.max_storage)
+        verboselog("Status = %#x", status.status)
+        verboselog("State = %#x", status.state)
+        verboselog("AMInfo = ")
+        if upload_logger.isEnabledFor(AM_LOG_VERBOSE):
+            for word in status.aminfo:
+                verboselog("%#x", word)
+
+        auto = callable(image)
+        if auto:
+            image = self._build_for_device(image, status)
+            if image is None:
+                return False
+
+        if (self.abort != -1):
+            verboselog('Sending Abort command.')
+            if (yield from self._command((codec.abort(self.abort),))) is None:
+                verboselog("Failed to ack command")
+                return False
+
+        if (self.otadesc != 0xFFFFFFFF):
+            verboselog('Sending OTA Descriptor = %#x', self.otadesc)
+            if (yield from self._command((codec.otadesc(self.otadesc),))) is None:
+                verboselog("Failed to ack command")
+                return False
+
+        if image:
+
+            # slices of the image are views - the chunks are never copied
+            application = memoryview(image)
             # Gather the important binary metadata.
             totalLen = len(application)
             # Send Update command
-            verboseprint('Sending Update Command.')
+            verboselog('Sending Update Command.')
 
             # It is assumed that maxSize is 256b multiple
-            maxImageSize = args.split
+            maxImageSize = self.split
             if ((maxImageSize & (FLASH_PAGE_SIZE - 1)) != 0):
-                verboseprint ("split needs to be multiple of flash page size")
-                return
+                verboselog("split needs to be multiple of flash page size")
+                return False
 
             # Each Block of image consists of AM_WU_IMAGEHDR_SIZE Bytes Image header and the Image blob
             maxUpdateSize = AM_WU_IMAGEHDR_SIZE + maxImageSize
             numUpdates = (totalLen + maxUpdateSize - 1) // maxUpdateSize # Integer division
-            verboseprint("number of updates needed = ", numUpdates)
+            verboselog("number of updates needed = %d", numUpdates)
+
+            # DATA messages in all the blocks - for the progress events
+            frames = (totalLen // maxUpdateSize) * (-(-maxUpdateSize // MAX_DATA_CHUNK)) + \
+                     -(-(totalLen % maxUpdateSize) // MAX_DATA_CHUNK)
+            self.events.publish(PhaseEvent(self.port, PHASE_BOOTLOAD))
+
+            # per block round trip times - see _report_split()
+            self.blocks = numUpdates
+            update_times = []
+            last_data_times = []
+            data_times = []
 
             end = totalLen
             for numUpdates in range(numUpdates, 0 , -1):
                 start = (numUpdates-1)*maxUpdateSize
                 crc = crc32(application[start:end])
                 applen = end - start
-                verboseprint("Sending block of size ", str(hex(applen)), " from ", str(hex(start)), " to ", str(hex(end)))
+                verboselog("Sending block of size %#x from %#x to %#x", applen, start, end)
                 end = end - applen
 
-                update = bytearray([0x00]*16);
-                fill_word(update, 0, ((20 << 16) | AM_SECBOOT_WIRED_MSGTYPE_UPDATE))
-                fill_word(update, 4, applen)
-                fill_word(update, 8, crc)
-                # Size = 0 => We're not piggybacking any data to IMAGE command
-                fill_word(update, 12, 0)
-
-                if send_ackd_command(update, ser, verboseprint) == False:
-                    verboseprint("Failed to ack command")
-                    return
+                check_cancel(self.cancel)
+                t0 = time.monotonic()
+                if (yield from self._command((codec.update(applen, crc),))) is None:
+                    verboselog("Failed to ack command")
+                    return False
+                update_times.append(time.monotonic() - t0)
 
                 # Loop over the bytes in the image, and send them to the target.
-                resp = 0
-                # Max chunk size is AM_MAX_UART_MSG_SIZE adjusted for the header for Data message
-                maxChunkSize = AM_MAX_UART_MSG_SIZE - 12
-                for x in range(0, applen, maxChunkSize):
-                    # Split the application into chunks of maxChunkSize bytes.
-                    # This is the max chunk size supported by the UART bootloader
-                    if ((x + maxChunkSize) > applen):
-                        chunk = application[start+x:start+applen]
-#                        print(str(hex(start+x)), " to ", str(hex(applen)))
-                    else:
-                        chunk = application[start+x:start+x+maxChunkSize]
-#                        print(str(hex(start+x)), " to ", str(hex(start + x + maxChunkSize)))
-
-                    chunklen = len(chunk)
-
-                    # Build a data packet with a "data command" a "length" and the actual
-                    # payload bytes, and send it to the target.
-                    dataMsg = bytearray([0x00]*8);
-                    fill_word(dataMsg, 0, (((chunklen + 12) << 16) | AM_SECBOOT_WIRED_MSGTYPE_DATA))
-                    # seqNo
-                    fill_word(dataMsg, 4, x)
-
-                    verboseprint("Sending Data Packet of length ", chunklen)
-                    if send_ackd_command(dataMsg + chunk, ser, verboseprint) == False:
-                        verboseprint("Failed to ack command")
-                        return
-
-        if (args.raw != ''):
+                # The chunk size is the max supported by the UART bootloader,
+                # less the header of the Data message
+                for x in range(0, applen, MAX_DATA_CHUNK):
+                    chunk = application[start + x:start + min(x + MAX_DATA_CHUNK, applen)]
 
-            # Read the binary file from the command line.
-            with open(args.raw, mode='rb') as rawfile:
-                blob = rawfile.read()
-            # Send Raw command
-            verboseprint('Sending Raw Command.')
-            ser.write(blob)
-
-        if (args.reset != 0):
-            # Send reset
-            verboseprint('Sending Reset Command.')
-            resetmsg = bytearray([0x00]*8);
-            fill_word(resetmsg, 0, ((12 << 16) | AM_SECBOOT_WIRED_MSGTYPE_RESET))
-            # options
-            fill_word(resetmsg, 4, args.reset)
-            if send_ackd_command(resetmsg, ser, verboseprint) == False:
-                verboseprint("Failed to ack command")
-                return
-
-        
-        #Success! We're all done
-        loadSuccess = True
-    else:
-        # Received Wrong message
-        verboseprint("Received Unknown Message")
-        word = word_from_bytes(response, 4)
-        verboseprint("msgType = ", hex(word & 0xFFFF))
-        verboseprint("Length = ", hex(word >> 16))
-        verboseprint([hex(n) for n in response])
-        #print("!!!Wired Upgrade Unsuccessful!!!....Terminating the script")
+                    # between frames - a cancelled job stops here
+                    check_cancel(self.cancel)
 
-        #exit()
-
-#******************************************************************************
-#
-# Send ACK'd command
-#
-# Sends a command, and waits for an ACK.
-#
-#******************************************************************************
-def send_ackd_command(command, ser, verboseprint):
+                    verboselog("Sending Data Packet of length %d", len(chunk))
+                    t0 = time.monotonic()
+                    if (yield from self._data(x, chunk)) is None:
+                        verboselog("Failed to ack command")
+                        return False
+                    data_times.append(time.monotonic() - t0)
 
-    response = send_command(command, 20, ser, verboseprint)
+                    self.frames_sent += 1
+                    self.bytes_sent += len(chunk)
+                    self.events.publish(ProgressEvent(self.port, self.frames_sent, frames, self.bytes_sent, totalLen))
 
-    #Check if response failed
-    if response == False:
-        verboseprint("Response not valid")
-        return False #Return error
+                last_data_times.append(data_times.pop())
 
-    word = word_from_bytes(response, 4)
-    if ((word & 0xFFFF) == AM_SECBOOT_WIRED_MSGTYPE_ACK):
-        # Received ACK
-        if (word_from_bytes(response, 12) != AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS):
-            verboseprint("Received NACK")
-            verboseprint("msgType = ", hex(word_from_bytes(response, 8)))
-            verboseprint("error = ", hex(word_from_bytes(response, 12)))
-            verboseprint("seqNo = ", hex(word_from_bytes(response, 16)))
-            #print("!!!Wired Upgrade Unsuccessful!!!....Terminating the script")
-            verboseprint("Upload failed: No ack to command")
+            self.block_overhead = self._block_overhead(update_times, last_data_times, data_times)
+            if auto:
+                self._report_split(totalLen)
 
-            return False #Return error
+        if (self.raw != ''):
 
-    return response
-
-#******************************************************************************
-#
-# Send command
-#
-# Sends a command, and waits for the response.
-#
-#******************************************************************************
-def send_command(params, response_len, ser, verboseprint):
-
-    # Compute crc
-    crc = crc32(params)
-#    print([hex(n) for n in int_to_bytes(crc)])
-#    print([hex(n) for n in params])
-    # send crc first
-    ser.write(int_to_bytes(crc))
-
-    # Next, send the parameters.
-    ser.write(params)
+            # Read the binary file from the command line.
+            with open(self.raw, mode='rb') as rawfile:
+                blob = rawfile.read()
+            # Send Raw command
+            verboselog('Sending Raw Command.')
+            yield (ASB_IO_WRITE, blob)
 
-    response = ''
-    response = ser.read(response_len)
+        if (self.reset != 0):
+            verboselog('Sending Reset Command.')
+            if (yield from self._command((codec.reset(self.reset),))) is None:
+                verboselog("Failed to ack command")
+                return False
 
-    # Make sure we got the number of bytes we asked for.
-    if len(response) != response_len:
-        verboseprint('No response for command 0x{:08X}'.format(word_from_bytes(params, 0) & 0xFFFF))
-        n = len(response)
-        if (n != 0):
-            verboseprint("received bytes ", len(response))
-            verboseprint([hex(n) for n in response])
-        return False
+        #Success! We're all done
+        return True
 
-    return response
 
 #******************************************************************************
 #
-# Send a command that uses an array of bytes as its parameters.
+# Command line upload - runs a session for the parsed arguments, then exits
 #
 #******************************************************************************
-def send_bytewise_command(command, params, response_len, ser):
-    # Send the command first.
-    ser.write(int_to_bytes(command))
-
-    # Next, send the parameters.
-    ser.write(params)
+def upload(args, image):
 
-    response = ''
-    response = ser.read(response_len)
+    metrics = UploadMetrics()
+    session = AsbSession.from_args(args, events=EventBus(metrics))
 
-    # Make sure we got the number of bytes we asked for.
-    if len(response) != response_len:
-        print("Upload failed: No reponse to command")
-        verboseprint('No response for command 0x{:08X}'.format(command))
+    if session.upload(image):
+        print("Tries =", session.tries)
+        print('Upload complete!')
+        print(metrics.describe(session.port))
         exit()
-        
-    return response
+
+    if session.tries:
+        print("Tries =", session.tries)
+        print("Upload failed")
+    exit()
+
 
 #******************************************************************************
 #
@@ -711,7 +1019,7 @@ class NoAckError(BootError):
     pass
 
 
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description =
                                      'Combination script to upload application binaries to Artemis module. Includes:\n\t\'- bin2blob: create OTA blob from binary image\'\n\t\'- blob2wired: create wired update image from OTA blob\'\n\t\'- upload: send wired update image to Apollo3 Artemis module via serial port\'\n\nThere are many command-line arguments. They have been labeled by which steps they apply to\n')
 
@@ -736,6 +1044,15 @@ def parse_arguments():
     parser.add_argument('--bin', dest='appFile', type=argparse.FileType('rb'),
                         help='bin2blob: binary file (blah.bin)')
 
+    parser.add_argument('--board', dest='board', choices=RESET_BOARDS, default='artemis',
+                        help='upload: Board type, for the reset timing (default is artemis)')
+
+    parser.add_argument('--no-cache', dest='no_cache', default=False, action='store_true',
+                        help='bin2blob, blob2wired: Always build the images - don\'t use the wired image cache')
+
+    parser.add_argument('--cache-encrypted', dest='cache_encrypted', default=False, action='store_true',
+                        help='bin2blob, blob2wired: Also cache encrypted images (they reuse one random key and IV)')
+
     parser.add_argument('-clean', dest='clean', default=0, type=int,
                         help = 'All: whether or not to remove intermediate files')
 
@@ -818,8 +1135,8 @@ def parse_arguments():
                                 '- default[Main]'
                                 )
 
-    parser.add_argument('-o', dest = 'output', default='wuimage',
-                    help = 'all: Output filename (without the extension) [also used for intermediate filenames]')
+    parser.add_argument('-o', dest = 'output', default=None,
+                    help = 'all: Also write the OTA blob and wired image to files with this name (without the extension) - by default nothing is written to disk')
 
     parser.add_argument('-ota', dest = 'otadesc', type=auto_int, default=0xFE000,
                         help = 'upload: OTA Descriptor Page address (hex) - (Default is 0xFE000 - at the end of main flash) - enter 0xFFFFFFFF to instruct SBL to skip OTA')
@@ -838,8 +1155,14 @@ def parse_arguments():
     parser.add_argument('--raw', dest='raw', default='',
                         help = 'upload: Binary file for raw message')
 
-    parser.add_argument('--split', dest='split', type=auto_int, default=hex(MAX_DOWNLOAD_SIZE),
-                        help='blob2wired, upload: Specify the max block size if the image will be downloaded in pieces')
+    parser.add_argument('--reset-profile', dest='reset_profile', choices=sorted(RESET_PROFILES), default=None,
+                        help='upload: DTR/RTS reset timing profile - by default the profile tuned for the port\'s '
+                        'adapter (python -m artemis_uploader.asb.autotune autotune), or the built in one. '
+                        'Name the built in one to ignore a tuned profile')
+
+    parser.add_argument('--split', dest='split', type=split_arg, default=hex(MAX_DOWNLOAD_SIZE),
+                        help='blob2wired, upload: Specify the max block size if the image will be downloaded in pieces - '
+                        '"auto" sizes the blocks to the Max Storage the device reports')
 
     parser.add_argument('--version', dest = 'version', type=auto_int, default=0,
                         help = 'bin2blob: version (15 bit)')
@@ -848,7 +1171,8 @@ def parse_arguments():
                         action="store_true")
 
 
-    args = parser.parse_args()
+    # argv None parses the command line
+    args = parser.parse_args(argv)
     args.magic_num = int(args.magic_num, 16)
 
 
@@ -856,6 +1180,71 @@ def parse_arguments():
 
 
 
+#******************************************************************************
+#
+# Make the wired update image for the parsed arguments - bin2blob then
+# blob2wired, in memory.
+#
+# Unencrypted images are taken from the image cache when the same binary was
+# built with the same parameters before. Encrypted images use a random key and
+# IV, so they are only cached with --cache-encrypted. Writing the stages to
+# files (-o) always runs both stages.
+#
+#******************************************************************************
+def make_wired_image(args):
+
+    if args.split == SPLIT_AUTO:
+        am_print("split auto needs the device - use wired_image_builder()", level=AM_PRINT_LEVEL_ERROR)
+        return None
+
+    app = read_input(args.appFile)
+
+    cache = None
+    if not args.no_cache and not args.output and (args.encalgo == 0 or args.cache_encrypted):
+        cache = get_wired_image_cache()
+        key = wired_image_key(app, wired_image_params(args))
+        image = cache.get(key)
+        if image is not None:
+            am_print("Using cached wired update image")
+            return image
+
+    # the stages pass their output along in memory
+    blob = bin2blob_process(args.loadaddress_blob, app, args.magic_num, args.crcI, args.crcB, args.authI, args.authB, args.protection, args.authkey, args.output, args.kek, args.version, args.erasePrev, args.child0, args.child1, args.authalgo, args.encalgo)
+    if blob is None:
+        return None
+
+    image = blob2wired_process(blob, args.imagetype, args.loadaddress_image, args.authalgo, args.encalgo, args.authkey, args.kek, args.options, args.split, args.output)
+
+    if image is not None and cache is not None:
+        cache.put(key, image)
+
+    return image
+
+
+#******************************************************************************
+#
+# For --split auto - a function of the split that makes the wired image. The
+# session calls it once it knows the device's Max Storage. Images are kept per
+# split, so retries don't rebuild them. The application is read once, here -
+# reading the --bin file closes it.
+#
+#******************************************************************************
+def wired_image_builder(args):
+
+    app = bytes(read_input(args.appFile))
+    images = {}
+
+    def build(split):
+        if split not in images:
+            split_args = argparse.Namespace(**vars(args))
+            split_args.appFile = app
+            split_args.split = split
+            images[split] = make_wired_image(split_args)
+        return images[split]
+
+    return build
+
+
 #******************************************************************************
 #
 # Main function.
@@ -870,26 +1259,20 @@ def main():
     args = parse_arguments()
     am_set_print_level(args.loglevel)
 
-    global blob2wiredfile
-
-    bin2blob_process(args.loadaddress_blob, args.appFile, args.magic_num, args.crcI, args.crcB, args.authI, args.authB, args.protection, args.authkey, args.output, args.kek, args.version, args.erasePrev, args.child0, args.child1, args.authalgo, args.encalgo)
-    blob2wired_process( blob2wiredfile, args.imagetype, args.loadaddress_image, args.authalgo, args.encalgo, args.authkey, args.kek, args.options, args.split, args.output)
-
-    # todo: link the bin2blob step with the blob2wired step by input/output files
-
+    if args.split == SPLIT_AUTO:
+        # built once the device reports its storage
+        image = wired_image_builder(args)
+    else:
+        image = make_wired_image(args)
+        if image is None:
+            print("Unable to create the wired update image")
+            exit()
 
-    #Create print function for verbose output if caller deems it: https://stackoverflow.com/questions/5980042/how-to-implement-the-verbose-or-v-option-into-a-script
+    # the session's messages - quiet without -v
     if args.verbose:
-        def verboseprint(*args):
-            # Print each argument separately so caller doesn't need to
-            # stuff everything to be printed into a single string
-            for arg in args:
-                print(arg, end=''),
-            print()
-    else:   
-        verboseprint = lambda *a: None      # do-nothing function
-
-    upload(args, verboseprint)
+        upload_logger.setLevel(AM_LOG_VERBOSE)
+
+    upload(args, image)
 
     if(args.clean == 1):
         print('Cleaning up intermediate files') # todo: why isnt this showing w/ -clean option?
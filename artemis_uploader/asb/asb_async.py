@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# asyncio version of the wired update session in asb.upload()
+
+# Information:
+#   Sends an already built wired update image (the output of blob2wired_process)
+#   to the Apollo3 secure bootloader, on the asyncio serial transport. The
+#   messages are AsbSession.connect_core()'s - HELLO, optional ABORT and OTA
+#   descriptor, UPDATE and DATA per block, then RESET - carried out here by
+#   run_session(), so the blocking and async sessions share one protocol, its
+#   events, cancel token and automatic split.
+#
+#   Each command has its own timeout, a session is cancelled by cancelling its
+#   task (or its CancelToken), and progress(sent, total) is called after each
+#   data packet.
+#
+#   ok = await upload_wired_async("/dev/ttyUSB0", 115200, wired_image)
+
+import asyncio
+import time
+
+import serial
+
+from .am_defines import *
+from .asb import AsbSession, ASB_IO_EXCHANGE
+from ..au_aserial import AsyncSerial
+from ..au_cancel import check_cancel
+from ..au_events import EventBus, PhaseEvent, ProgressEvent, PHASE_CONNECT
+
+#******************************************************************************
+#
+# Session settings
+#
+#******************************************************************************
+ASB_ASYNC_TRIES = 3
+ASB_CONNECTION_TIMEOUT = AsbSession.CONNECTION_TIMEOUT     # seconds - flashing a block can take a while
+
+#******************************************************************************
+#
+# Carry out a session core's I/O requests - see AsbSession.connect_core()
+#
+#******************************************************************************
+async def run_session(ser, core, timeout=ASB_CONNECTION_TIMEOUT):
+
+    reply = None
+    while True:
+        try:
+            request = core.send(reply)
+        except StopIteration as result:
+            return result.value
+
+        if request[0] == ASB_IO_EXCHANGE:
+            parts, response_len = request[1], request[2]
+            if len(parts) == 1:
+                await ser.write(parts[0])
+            else:
+                await ser.write_parts(parts)
+
+            response = await ser.read(response_len, timeout)
+            reply = response if len(response) == response_len else None
+        else:
+            await ser.write(request[1])
+            reply = None
+
+#******************************************************************************
+#
+# Reset the board into the bootloader with the session's reset profile - see
+# reset_sequencer.py. DTR pulls RST low when the port opens.
+#
+#******************************************************************************
+def _set_lines(ser, profile, state):
+
+    if profile.dtr:
+        ser.set_dtr(state)
+    if profile.rts:
+        ser.set_rts(state)
+
+async def _reset_to_bootloader(ser, profile):
+
+    _set_lines(ser, profile, True)
+    await asyncio.sleep(profile.pre_delay)
+
+    # released, the bootload pin goes high then falls across 100ms
+    _set_lines(ser, profile, False)
+
+    # let the bootloader check the bootload pin - but talk within its 250ms timeout
+    await asyncio.sleep(profile.boot_delay)
+
+    ser.reset_input_buffer()
+
+#******************************************************************************
+#
+# The progress callback, as an event subscriber
+#
+#******************************************************************************
+def _progress_events(events, progress):
+
+    if events is None:
+        events = EventBus()
+
+    if progress is not None:
+        def report(event):
+            if isinstance(event, ProgressEvent):
+                progress(event.bytes_sent, event.total_bytes)
+        events.subscribe(report)
+
+    return events
+
+#******************************************************************************
+#
+# One connection - returns True once the image is sent and the board reset
+#
+#******************************************************************************
+async def connect_device_async(ser, image, abort=-1, otadesc=0xFE000, split=MAX_DOWNLOAD_SIZE,
+                               reset=1, progress=None, timeout=ASB_CONNECTION_TIMEOUT):
+
+    session = AsbSession(ser.port, ser.baudrate, abort=abort, otadesc=otadesc, split=split, reset=reset,
+                         events=_progress_events(None, progress))
+
+    return await run_session(ser, session.connect_core(image), timeout)
+
+#******************************************************************************
+#
+# A session's upload - AsbSession.upload() on the asyncio transport. The port
+# stays open, and each attempt resets the board again.
+#
+#******************************************************************************
+async def upload_session_async(session, image, timeout=ASB_CONNECTION_TIMEOUT):
+
+    session.tries = 0
+    session.success = False
+    start = time.monotonic()
+
+    session.events.publish(PhaseEvent(session.port, PHASE_CONNECT))
+
+    async with AsyncSerial(session.port, session.baud) as ser:
+
+        profile = session.profile()
+
+        while session.tries < session.max_tries:
+
+            check_cancel(session.cancel)
+            await _reset_to_bootloader(ser, profile)
+
+            session.success = await run_session(ser, session.connect_core(image), timeout)
+            if session.success:
+                break
+
+            session._count_try()
+
+        await ser.drain()
+
+    session._publish_result(start)
+
+    return session.success
+
+#******************************************************************************
+#
+# Upload a wired image - image is the bytes of a wired update image or its file
+#
+#******************************************************************************
+async def upload_wired_async(port, baud, image, abort=-1, otadesc=0xFE000, split=MAX_DOWNLOAD_SIZE,
+                             reset=1, progress=None, tries=ASB_ASYNC_TRIES,
+                             timeout=ASB_CONNECTION_TIMEOUT, events=None, cancel=None):
+
+    if isinstance(image, str):
+        with open(image, mode='rb') as binfile:
+            image = binfile.read()
+
+    session = AsbSession(port, baud, abort=abort, otadesc=otadesc, split=split, reset=reset,
+                         max_tries=tries, cancel=cancel, events=_progress_events(events, progress))
+
+    return await upload_session_async(session, image, timeout)
+
+#******************************************************************************
+#
+# Many boards on one loop - returns {port: success}
+#
+#******************************************************************************
+async def upload_wired_many(ports, baud, image, progress=None, limit=None, **kwargs):
+
+    if isinstance(image, str):
+        with open(image, mode='rb') as binfile:
+            image = binfile.read()
+
+    gate = asyncio.Semaphore(limit or len(ports))
+
+    async def session(port):
+
+        report = None
+        if progress is not None:
+            report = lambda sent, total: progress(port, sent, total)
+
+        async with gate:
+            try:
+                return await upload_wired_async(port, baud, image, progress=report, **kwargs)
+            except serial.SerialException:
+                return False
+
+    results = await asyncio.gather(*(session(port) for port in ports))
+
+    return dict(zip(ports, results))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Autotune of the reset into the secure bootloader
+
+# Information:
+#   Sweeps the reset sequencer's delays against a real or emulated target,
+#   shortest sequence first. Each candidate must reach the bootloader - HELLO
+#   answered by STATUS - in every trial; the first that does is remembered for
+#   the board and the port's adapter, and used by later uploads.
+#
+#       python -m artemis_uploader.asb.autotune autotune -port /dev/ttyUSB0
+#       python -m artemis_uploader.asb.autotune show -port /dev/ttyUSB0
+#       python -m artemis_uploader.asb.autotune forget -port /dev/ttyUSB0
+
+import argparse
+
+import serial
+
+from .wire_codec import WireCodec, WireError, decode_status, STATUS_SIZE
+from .reset_sequencer import ResetProfile, ResetSequencer, RESET_BOARDS, RESET_PROFILES, RESET_DEFAULT, \
+    get_reset_memory, memory_key, select_reset_profile
+
+#******************************************************************************
+#
+# Autotune - the fastest profile that reaches the bootloader in every trial
+#
+#******************************************************************************
+AUTOTUNE_PRE_DELAYS = (0.001, 0.003, 0.005, 0.010)
+AUTOTUNE_BOOT_DELAYS = (0.010, 0.020, 0.040, 0.060, 0.080, 0.100, 0.150)
+AUTOTUNE_TRIALS = 5
+AUTOTUNE_TIMEOUT = 0.5
+
+# One reset and HELLO - True if the bootloader answered with its STATUS
+def probe_bootloader(ser, sequencer, codec):
+
+    sequencer.reset()
+    ser.write(codec.hello())
+
+    response = ser.read(STATUS_SIZE)
+    if len(response) != STATUS_SIZE:
+        return False
+
+    try:
+        decode_status(response)
+    except WireError:
+        return False
+
+    return True
+
+def autotune(port, baud=115200, board='artemis', trials=AUTOTUNE_TRIALS, pre_delays=AUTOTUNE_PRE_DELAYS,
+             boot_delays=AUTOTUNE_BOOT_DELAYS, memory=None, report=None):
+
+    memory = memory or get_reset_memory()
+    base = RESET_PROFILES[RESET_DEFAULT]
+    codec = WireCodec()
+
+    candidates = [ResetProfile(board + "-tuned", pre, boot, base.dtr, base.rts)
+                  for pre in pre_delays for boot in boot_delays]
+    candidates.sort(key=lambda profile: (profile.total, profile.boot_delay))
+
+    with serial.Serial(port, baud, timeout=AUTOTUNE_TIMEOUT) as ser:
+
+        for profile in candidates:
+
+            sequencer = ResetSequencer(ser, profile)
+            passed = 0
+            for _ in range(trials):
+                if not probe_bootloader(ser, sequencer, codec):
+                    break
+                passed += 1
+
+            if report is not None:
+                report(profile, passed, trials)
+
+            if passed == trials:
+                memory.set(memory_key(port, board), profile)
+                return profile
+
+    return None
+
+#******************************************************************************
+#
+# Command line
+#
+#******************************************************************************
+def main():
+
+    parser = argparse.ArgumentParser(description='Tune the reset into the Apollo3 secure bootloader')
+
+    parser.add_argument('command', choices=['autotune', 'show', 'forget'],
+                        help='autotune: sweep the delays and remember the fastest reliable profile - '
+                        'show: the profile a port would use - forget: drop the tuned profile')
+    parser.add_argument('-port', dest='port', help='Serial port')
+    parser.add_argument('-b', dest='baud', type=int, default=115200, help='Baud rate (default is 115200)')
+    parser.add_argument('--board', dest='board', choices=RESET_BOARDS, default='artemis',
+                        help='Board type (default is artemis)')
+    parser.add_argument('--trials', dest='trials', type=int, default=AUTOTUNE_TRIALS,
+                        help='Resets that must all reach the bootloader (default {})'.format(AUTOTUNE_TRIALS))
+
+    args = parser.parse_args()
+
+    if args.command == 'show' and not args.port:
+        for key, data in get_reset_memory().items():
+            print(key, data)
+        return
+
+    if not args.port:
+        parser.error("-port is required")
+
+    if args.command == 'show':
+        print(select_reset_profile(args.port, args.board))
+
+    elif args.command == 'forget':
+        get_reset_memory().forget(memory_key(args.port, args.board))
+
+    else:
+        def report(profile, passed, trials):
+            print("pre {:5.1f} ms  boot {:5.1f} ms  {}/{}".format(
+                  profile.pre_delay * 1000, profile.boot_delay * 1000, passed, trials), flush=True)
+
+        profile = autotune(args.port, args.baud, args.board, args.trials, report=report)
+        if profile is None:
+            print("No profile reached the bootloader reliably")
+            raise SystemExit(1)
+
+        print("Fastest reliable profile: {:.1f} ms (pre {:.1f} ms, boot {:.1f} ms) - saved".format(
+              profile.total * 1000, profile.pre_delay * 1000, profile.boot_delay * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# Cache of generated wired update images
+
+# Information:
+#   Building the wired update image (bin2blob + blob2wired) gives the same
+#   result every time for the same input binary and parameters - unless the
+#   image is encrypted, which uses a random key and IV. Unencrypted images are
+#   kept in the user cache directory, named by the SHA-256 of the input binary
+#   and every image generation parameter, so a repeat burn skips both stages.
+#
+#   The cache is limited in total size. The least recently used images are
+#   removed first - each hit refreshes the file's modification time.
+
+import hashlib
+import json
+import os
+import os.path
+import threading
+
+from ..au_userdirs import user_cache_dir
+
+#******************************************************************************
+#
+# Settings
+#
+#******************************************************************************
+WIRED_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Bump when the image format produced by bin2blob/blob2wired changes
+_CACHE_FORMAT = 1
+
+_CACHE_SUBDIR = "wired_images"
+_SUFFIX = ".bin"
+
+# The parsed arguments that change the generated image
+WIRED_IMAGE_PARAMS = ('loadaddress_blob', 'magic_num', 'crcI', 'crcB', 'authI', 'authB',
+                      'protection', 'authkey', 'kek', 'version', 'erasePrev', 'child0',
+                      'child1', 'authalgo', 'encalgo', 'imagetype', 'loadaddress_image',
+                      'options', 'split')
+
+#******************************************************************************
+#
+# Cache key - SHA-256 over the input binary's hash and the parameters
+#
+#******************************************************************************
+def wired_image_key(app, params):
+
+    desc = {name: params[name] for name in sorted(params)}
+    desc['format'] = _CACHE_FORMAT
+    desc['app'] = hashlib.sha256(app).hexdigest()
+
+    return hashlib.sha256(json.dumps(desc, sort_keys=True).encode('utf-8')).hexdigest()
+
+def wired_image_params(args):
+
+    return {name: getattr(args, name) for name in WIRED_IMAGE_PARAMS}
+
+#******************************************************************************
+#
+# The cache
+#
+#******************************************************************************
+class WiredImageCache(object):
+
+    def __init__(self, path=None, max_bytes=WIRED_CACHE_MAX_BYTES):
+
+        self._path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = user_cache_dir(_CACHE_SUBDIR)
+        return self._path
+
+    def _file(self, key):
+        return os.path.join(self.path, key + _SUFFIX)
+
+    def get(self, key):
+
+        try:
+            name = self._file(key)
+            with open(name, 'rb') as f:
+                image = f.read()
+            os.utime(name)      # most recently used
+        except OSError:
+            return None
+
+        return image
+
+    def put(self, key, image):
+
+        tmp_name = None
+        try:
+            # finding the cache directory creates it
+            name = self._file(key)
+            tmp_name = name + ".tmp." + str(os.getpid()) + "." + str(threading.get_ident())
+
+            with open(tmp_name, 'wb') as f:
+                f.write(image)
+            os.replace(tmp_name, name)
+        except OSError:
+            # a cache that can't be written is not a burn failure
+            if tmp_name is not None:
+                try:
+                    os.remove(tmp_name)
+                except OSError:
+                    pass
+            return
+
+        self.evict()
+
+    # Remove the least recently used images until the cache fits
+    def evict(self):
+
+        with self._lock:
+            entries = []
+            total = 0
+            try:
+                with os.scandir(self.path) as it:
+                    for entry in it:
+                        if entry.name.endswith(_SUFFIX):
+                            info = entry.stat()
+                            entries.append((info.st_mtime_ns, info.st_size, entry.path))
+                            total += info.st_size
+            except OSError:
+                return
+
+            entries.sort()
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(name)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+
+        with self._lock:
+            try:
+                with os.scandir(self.path) as it:
+                    for entry in it:
+                        if entry.name.endswith(_SUFFIX):
+                            os.remove(entry.path)
+            except OSError:
+                pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_wired_image_cache():
+
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = WiredImageCache()
+
+    return _cache
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# Reset sequencer - puts the board into the secure bootloader over DTR/RTS
+
+# Information:
+#   Opening the port asserts DTR, which holds the board in reset. Releasing
+#   DTR/RTS lets the board run, with the bootload pin high and falling across
+#   ~100ms, and the bootloader checks the pin and waits for HELLO for 250ms.
+#
+#   A ResetProfile is that sequence's timing: how long the lines are asserted
+#   (pre_delay), which lines are driven, and how long to wait before talking to
+#   the bootloader (boot_delay). The built in profile is the sequence that has
+#   always worked, with every board and USB serial adapter - CH340E boards wire
+#   RTS as well as DTR. Profiles tuned against the actual target (autotune.py)
+#   are remembered per board and adapter, and preferred over the built in one.
+#
+#   The sequencer works on an open port, so a session opens the port once and
+#   resets the board again for each attempt.
+
+import errno
+import os.path
+import threading
+import time
+
+from ..au_userdirs import user_config_dir, load_json, save_json
+from ..svl_baud import adapter_key
+
+#******************************************************************************
+#
+# Profiles
+#
+#******************************************************************************
+class ResetProfile(object):
+
+    __slots__ = ('name', 'pre_delay', 'boot_delay', 'dtr', 'rts')
+
+    def __init__(self, name, pre_delay, boot_delay, dtr=True, rts=True):
+
+        self.name = name
+        self.pre_delay = pre_delay      # seconds the lines hold the board in reset
+        self.boot_delay = boot_delay    # seconds from release until HELLO
+        self.dtr = dtr
+        self.rts = rts
+
+    @property
+    def total(self):
+        return self.pre_delay + self.boot_delay
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], float(data['pre_delay']), float(data['boot_delay']),
+                   bool(data.get('dtr', True)), bool(data.get('rts', True)))
+
+    def __repr__(self):
+        return "ResetProfile({!r}, pre_delay={}, boot_delay={}, dtr={}, rts={})".format(
+            self.name, self.pre_delay, self.boot_delay, self.dtr, self.rts)
+
+RESET_BOARDS = ('artemis', 'apollo3')
+
+# 3ms and 10ms work well as pre delay, 50ms doesn't. The bootloader must be
+# talked to within 250ms of release - 100ms works well. Add a profile here
+# when a board or adapter needs different timing.
+RESET_DEFAULT = 'default'
+
+RESET_PROFILES = {
+    RESET_DEFAULT:      ResetProfile(RESET_DEFAULT, 0.005, 0.100),
+}
+
+#******************************************************************************
+#
+# Tuned profiles - remembered per board and adapter, shared by all threads
+#
+#******************************************************************************
+_MEMORY_FILE = "asb_reset.json"
+
+class ResetProfileMemory(object):
+
+    def __init__(self, path=None):
+
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = os.path.join(user_config_dir(), _MEMORY_FILE)
+        return self._path
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                self._entries = load_json(self.path)
+            except OSError:
+                self._entries = {}
+        return self._entries
+
+    def get(self, key):
+
+        with self._lock:
+            data = self._load().get(key)
+
+        try:
+            return ResetProfile.from_dict(data) if data else None
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def set(self, key, profile):
+
+        with self._lock:
+            entries = self._load()
+            entries[key] = profile.to_dict()
+            try:
+                save_json(self.path, entries)
+            except OSError:
+                pass
+
+    def forget(self, key):
+
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                try:
+                    save_json(self.path, self._entries)
+                except OSError:
+                    pass
+
+    def items(self):
+
+        with self._lock:
+            return sorted(self._load().items())
+
+_memory = None
+_memory_lock = threading.Lock()
+
+def get_reset_memory():
+
+    global _memory
+
+    with _memory_lock:
+        if _memory is None:
+            _memory = ResetProfileMemory()
+
+    return _memory
+
+def memory_key(port, board):
+    return board + "|" + adapter_key(port)
+
+# The tuned profile for the port's adapter, else the built in one
+def select_reset_profile(port, board='artemis', memory=None):
+
+    memory = memory or get_reset_memory()
+
+    profile = memory.get(memory_key(port, board))
+    if profile is not None:
+        return profile
+
+    return RESET_PROFILES[RESET_DEFAULT]
+
+#******************************************************************************
+#
+# The sequencer
+#
+#******************************************************************************
+class ResetSequencer(object):
+
+    def __init__(self, ser, profile):
+
+        self.ser = ser
+        self.profile = profile
+
+    # Ports without modem lines (ptys, some USB CDC devices) are let through,
+    # as pySerial's open() does
+    def _set_lines(self, state):
+
+        for name in ('dtr', 'rts'):
+            if getattr(self.profile, name):
+                try:
+                    setattr(self.ser, name, state)
+                except OSError as err:
+                    if err.errno not in (errno.EINVAL, errno.ENOTTY):
+                        raise
+
+    def reset(self):
+
+        # asserted lines hold RST low - opening the port already asserted DTR
+        self._set_lines(True)
+        time.sleep(self.profile.pre_delay)
+
+        # released, the bootload pin goes high then falls across 100ms
+        self._set_lines(False)
+
+        # let the bootloader check the bootload pin - but talk within its 250ms timeout
+        time.sleep(self.profile.boot_delay)
+
+        # discard any UART traffic the device generated
+        self.ser.reset_input_buffer()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# Apollo3 secure bootloader (SBL) emulator on a pty
+
+# Information:
+#   Emulates the wired update side of the Apollo3 ROM bootloader on a pseudo
+#   terminal, so the bootloader burn path (AsbSession, the async session, split
+#   images) can be tested and benchmarked without a board:
+#
+#       with emulated_sbl_device(max_storage=0x80000) as device:
+#           AsbSession(device.port).upload(image)
+#           blob = device.wait_for_image()
+#
+#   Messages are checked the way the bootloader checks them - CRC32, length,
+#   DATA sequence numbers, block size and block CRC - and answered with STATUS
+#   (HELLO) or an ACK carrying the bootloader's status code. The blocks of an
+#   update are put back together in load address order, and the image is
+#   complete when the host sends RESET.
+#
+#   The host opening the port stands in for the reset into the bootloader -
+#   a pty has no modem lines. Flash page writes take flash_latency, and faults
+#   can be injected: NACKed data (crc_error_rate), lost responses (drop_rate),
+#   ignored HELLOs (missed_boots) and a status code forced for a message type
+#   (fail_on).
+#
+#   Linux only - the host opening and closing the port is seen on the master
+#   side of the pty.
+
+import argparse
+import binascii
+import contextlib
+import os
+import random
+import select
+import struct
+import threading
+import time
+
+# pty support is POSIX only - the import fails cleanly elsewhere
+import termios
+import tty
+
+from .am_defines import *
+from .wire_codec import HEADER, WORD_MSG, UPDATE, DATA_HEADER, STATUS, ACK
+
+#******************************************************************************
+#
+# Settings
+#
+#******************************************************************************
+SBL_VERSION = 3
+SBL_MAX_STORAGE = AM_WU_IMAGEHDR_SIZE + MAX_DOWNLOAD_SIZE
+
+# termios speed constant -> baud rate
+_TERMIOS_BAUD = {}
+for _rate in (9600, 19200, 38400, 57600, 115200, 230400, 460800, 500000, 576000,
+              921600, 1000000, 1152000, 1500000, 2000000, 3000000):
+    _const = getattr(termios, 'B' + str(_rate), None)
+    if _const is not None:
+        _TERMIOS_BAUD[_const] = _rate
+
+#******************************************************************************
+#
+# The emulator
+#
+#******************************************************************************
+class SblEmulator(object):
+
+    def __init__(self, version=SBL_VERSION, max_storage=SBL_MAX_STORAGE, flash_latency=0.0,
+                 flash_page_size=FLASH_PAGE_SIZE, crc_error_rate=0.0, drop_rate=0.0, missed_boots=0,
+                 fail_on=None, simulate_wire=True, seed=None):
+
+        self.version = version
+        self.max_storage = max_storage          # largest block the bootloader holds
+        self.flash_latency = flash_latency      # time to write one flash page
+        self.flash_page_size = flash_page_size
+        self.crc_error_rate = crc_error_rate    # fraction of good DATA messages NACKed as corrupt
+        self.drop_rate = drop_rate              # fraction of messages left unanswered
+        self.missed_boots = missed_boots        # first HELLOs ignored - the board missed the boot pin
+        self.fail_on = dict(fail_on or {})      # message type -> ACK status to answer it with
+        self.simulate_wire = simulate_wire      # add the serial transfer time at the host's baud rate
+
+        self._random = random.Random(seed)
+
+        self._master = None
+        self._port = None
+        self._host_open = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._image_done = threading.Condition(self._lock)
+
+        # results - read these from the test
+        self.images = []            # every completed update - blocks' data in load address order
+        self.wired_images = []      # the same updates as wired images - header and data per block
+        self.messages = {}          # message type -> count
+        self.nacks_sent = {}        # ACK status -> count
+        self.dropped = 0
+        self.aborts = []
+        self.otadesc = None
+        self.resets = 0             # host port opens
+        self.hellos_ignored = 0
+
+        self._reset_session()
+
+    #------------------------------------------------------
+    @property
+    def port(self) -> str:
+        return self._port
+
+    @property
+    def last_image(self):
+        with self._lock:
+            return self.images[-1] if self.images else None
+
+    # Wait until update number count (1 based) is complete. Returns its image or None.
+    def wait_for_image(self, count=1, timeout=2.0):
+
+        with self._image_done:
+            if not self._image_done.wait_for(lambda: len(self.images) >= count, timeout):
+                return None
+            return self.images[count - 1]
+
+    #------------------------------------------------------
+    def start(self):
+
+        self._master, slave = os.openpty()
+        self._port = os.ttyname(slave)
+
+        # raw, like a real serial port - then let go of it, so the host opening
+        # and closing the port can be seen from the master side
+        tty.setraw(slave)
+        os.close(slave)
+        self._host_open = False
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sbl-emulator", daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._master is not None:
+            os.close(self._master)
+        self._master = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    #------------------------------------------------------
+    def _host_baud(self):
+
+        # on the master side the settings of the slave are reported
+        try:
+            return _TERMIOS_BAUD.get(termios.tcgetattr(self._master)[4])
+        except termios.error:
+            return None
+
+    def _wire_delay(self, num_bytes):
+
+        # 10 bits per byte on the line - 8N1
+        if self.simulate_wire:
+            baud = self._host_baud()
+            if baud:
+                time.sleep(num_bytes * 10.0 / baud)
+
+    def _send(self, data):
+
+        self._wire_delay(len(data))
+        try:
+            os.write(self._master, data)
+        except OSError:
+            pass        # host went away
+
+    def _seal(self, msg):
+
+        with memoryview(msg) as view:
+            struct.pack_into('<I', msg, 0, binascii.crc32(view[4:]))
+        return msg
+
+    def _send_status(self):
+
+        msg = bytearray(STATUS.size)
+        STATUS.pack_into(msg, 0, 0, (STATUS.size << 16) | AM_SECBOOT_WIRED_MSGTYPE_STATUS, self.version,
+                         self.max_storage, AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS, self._state, *([0] * 16))
+        self._send(self._seal(msg))
+
+    def _send_ack(self, msg_type, status, seqno=0):
+
+        if status != AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS:
+            self.nacks_sent[status] = self.nacks_sent.get(status, 0) + 1
+
+        msg = bytearray(ACK.size)
+        ACK.pack_into(msg, 0, 0, (ACK.size << 16) | AM_SECBOOT_WIRED_MSGTYPE_ACK, msg_type, status, seqno)
+        self._send(self._seal(msg))
+
+    #------------------------------------------------------
+    # Session state - from reset until the next reset
+
+    def _reset_session(self):
+
+        self._state = 0
+        self._buffer = bytearray()
+        self._blocks = {}           # load address -> block
+        self._block = None          # block being received
+        self._block_size = 0
+        self._block_crc = 0
+
+    def _power_on(self):
+
+        self.resets += 1
+        self._reset_session()
+
+    def _finish_update(self):
+
+        # RESET - the bootloader installs the update and the board restarts
+        if self._blocks:
+            blocks = [self._blocks[addr] for addr in sorted(self._blocks)]
+            with self._image_done:
+                self.wired_images.append(b''.join(blocks))
+                self.images.append(b''.join(block[AM_WU_IMAGEHDR_SIZE:] for block in blocks))
+                self._image_done.notify_all()
+
+        self._reset_session()
+
+    #------------------------------------------------------
+    def _run(self):
+
+        while not self._stop.is_set():
+
+            ready, _, _ = select.select([self._master], [], [], 0.02)
+            if not ready:
+                continue
+
+            try:
+                data = os.read(self._master, 65536)
+            except OSError:
+                # EIO - the host doesn't have the port open
+                self._host_open = False
+                time.sleep(0.005)
+                continue
+
+            if not self._host_open:
+                self._host_open = True
+                self._power_on()
+
+            self._receive(data)
+
+    def _receive(self, data):
+
+        self._buffer += data
+
+        while len(self._buffer) >= HEADER.size:
+
+            _, word = HEADER.unpack_from(self._buffer)
+            length = word >> 16
+            msg_type = word & 0xFFFF
+
+            if length > AM_MAX_UART_MSG_SIZE or length < HEADER.size:
+                # can't frame this - drop what arrived and tell the host
+                self._buffer.clear()
+                self._send_ack(msg_type, AM_SECBOOT_WIRED_ACK_STATUS_MSG_TOO_BIG)
+                return
+
+            if len(self._buffer) < length:
+                return
+
+            msg = bytes(self._buffer[:length])
+            del self._buffer[:length]
+
+            self._wire_delay(length)
+            self._handle_message(msg_type, msg)
+
+    def _handle_message(self, msg_type, msg):
+
+        self.messages[msg_type] = self.messages.get(msg_type, 0) + 1
+
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            self.dropped += 1
+            return
+
+        crc = HEADER.unpack_from(msg)[0]
+        if binascii.crc32(memoryview(msg)[4:]) != crc:
+            self._send_ack(msg_type, AM_SECBOOT_WIRED_ACK_STATUS_CRC)
+            return
+
+        if msg_type == AM_SECBOOT_WIRED_MSGTYPE_HELLO:
+            if self.hellos_ignored < self.missed_boots:
+                self.hellos_ignored += 1
+                return
+            self._send_status()
+            return
+
+        if msg_type in self.fail_on:
+            self._send_ack(msg_type, self.fail_on[msg_type])
+            return
+
+        if msg_type == AM_SECBOOT_WIRED_MSGTYPE_DATA:
+            self._handle_data(msg)
+
+        elif msg_type == AM_SECBOOT_WIRED_MSGTYPE_UPDATE:
+            self._handle_update(msg)
+
+        elif msg_type in (AM_SECBOOT_WIRED_MSGTYPE_ABORT, AM_SECBOOT_WIRED_MSGTYPE_OTADESC,
+                          AM_SECBOOT_WIRED_MSGTYPE_RESET):
+
+            if len(msg) != WORD_MSG.size:
+                self._send_ack(msg_type, AM_SECBOOT_WIRED_ACK_STATUS_INVALID_PARAM)
+                return
+
+            value = WORD_MSG.unpack_from(msg)[2]
+            self._send_ack(msg_type, AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS)
+
+            if msg_type == AM_SECBOOT_WIRED_MSGTYPE_ABORT:
+                self.aborts.append(value)
+                self._block = None
+            elif msg_type == AM_SECBOOT_WIRED_MSGTYPE_OTADESC:
+                self.otadesc = value
+            else:
+                self._finish_update()
+
+        else:
+            self._send_ack(msg_type, AM_SECBOOT_WIRED_ACK_STATUS_UNKNOWN_MSGTYPE)
+
+    def _handle_update(self, msg):
+
+        if len(msg) != UPDATE.size:
+            self._send_ack(AM_SECBOOT_WIRED_MSGTYPE_UPDATE, AM_SECBOOT_WIRED_ACK_STATUS_INVALID_PARAM)
+            return
+
+        _, _, size, image_crc, _ = UPDATE.unpack_from(msg)
+
+        if size > self.max_storage or size <= AM_WU_IMAGEHDR_SIZE:
+            self._send_ack(AM_SECBOOT_WIRED_MSGTYPE_UPDATE, AM_SECBOOT_WIRED_ACK_STATUS_TOO_MUCH_DATA)
+            return
+
+        self._block = bytearray()
+        self._block_size = size
+        self._block_crc = image_crc
+        self._send_ack(AM_SECBOOT_WIRED_MSGTYPE_UPDATE, AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS)
+
+    def _handle_data(self, msg):
+
+        seqno = DATA_HEADER.unpack_from(msg)[2]
+        data = msg[DATA_HEADER.size:]
+
+        if self._block is None:
+            status = AM_SECBOOT_WIRED_ACK_STATUS_INVALID_OPERATION
+        elif seqno != len(self._block):
+            status = AM_SECBOOT_WIRED_ACK_STATUS_SEQ
+        elif len(self._block) + len(data) > self._block_size:
+            status = AM_SECBOOT_WIRED_ACK_STATUS_TOO_MUCH_DATA
+        elif self.crc_error_rate and self._random.random() < self.crc_error_rate:
+            status = AM_SECBOOT_WIRED_ACK_STATUS_CRC
+        else:
+            status = AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS
+
+        if status != AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS:
+            self._send_ack(AM_SECBOOT_WIRED_MSGTYPE_DATA, status, seqno)
+            return
+
+        self._block += data
+
+        if len(self._block) == self._block_size:
+            status = self._store_block()
+
+        self._send_ack(AM_SECBOOT_WIRED_MSGTYPE_DATA, status, seqno)
+
+    # A complete block - check it and write it to flash
+    def _store_block(self):
+
+        block = bytes(self._block)
+        self._block = None
+
+        if binascii.crc32(block) != self._block_crc:
+            return AM_SECBOOT_WIRED_ACK_STATUS_CRC
+
+        if self.flash_latency:
+            pages = (len(block) + self.flash_page_size - 1) // self.flash_page_size
+            time.sleep(pages * self.flash_latency)
+
+        address = struct.unpack_from('<I', block, AM_WU_IMAGEHDR_OFFSET_ADDR)[0]
+        self._blocks[address] = block
+
+        return AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS
+
+#******************************************************************************
+#
+# Run an emulator for the duration of a with block - the body of a pytest fixture
+#
+#******************************************************************************
+@contextlib.contextmanager
+def emulated_sbl_device(**kwargs):
+
+    emulator = SblEmulator(**kwargs)
+    emulator.start()
+    try:
+        yield emulator
+    finally:
+        emulator.stop()
+
+#******************************************************************************
+#
+# Command line
+#
+#******************************************************************************
+def main():
+
+    parser = argparse.ArgumentParser(description='Apollo3 secure bootloader (SBL) wired update emulator')
+
+    parser.add_argument('--bl-version', dest='version', type=auto_int, default=SBL_VERSION,
+                        help='Bootloader version to report (default {})'.format(SBL_VERSION))
+    parser.add_argument('--max-storage', dest='max_storage', type=auto_int, default=hex(SBL_MAX_STORAGE),
+                        help='Max Storage to report - the largest block accepted (default {})'.format(
+                        hex(SBL_MAX_STORAGE)))
+    parser.add_argument('--flash-latency', dest='flash_latency', type=float, default=0.0,
+                        help='Time to write one flash page in seconds')
+    parser.add_argument('--crc-error-rate', dest='crc_error_rate', type=float, default=0.0,
+                        help='Fraction of data messages NACKed as corrupt (0.0 - 1.0)')
+    parser.add_argument('--drop-rate', dest='drop_rate', type=float, default=0.0,
+                        help='Fraction of messages left unanswered (0.0 - 1.0)')
+    parser.add_argument('--missed-boots', dest='missed_boots', type=int, default=0,
+                        help='Number of HELLOs to ignore')
+    parser.add_argument('--no-wire', dest='simulate_wire', action='store_false',
+                        help='Don\'t add serial transfer time')
+    parser.add_argument('-o', dest='output', default=None,
+                        help='Write each received wired image to this file')
+
+    args = parser.parse_args()
+
+    emulator = SblEmulator(version=args.version, max_storage=args.max_storage,
+                           flash_latency=args.flash_latency, crc_error_rate=args.crc_error_rate,
+                           drop_rate=args.drop_rate, missed_boots=args.missed_boots,
+                           simulate_wire=args.simulate_wire)
+
+    with emulator:
+        print("SBL emulator listening on " + emulator.port, flush=True)
+        count = 0
+        try:
+            while True:
+                time.sleep(0.2)
+                if len(emulator.images) != count:
+                    count = len(emulator.images)
+                    wired = emulator.wired_images[-1]
+                    print("Received update #{} - {} bytes, {} NACKs so far".format(
+                        count, len(wired), sum(emulator.nacks_sent.values())), flush=True)
+                    if args.output:
+                        with open(args.output, 'wb') as f:
+                            f.write(wired)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
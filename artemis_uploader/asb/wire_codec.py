@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Codec for the Apollo3 secure bootloader (SBL) wired update messages
+
+# Information:
+#   Every message on the wire is little endian:
+#
+#       crc32   - over everything that follows
+#       word    - (length << 16) | message type, length counting the crc
+#       params  - depending on the message type
+#
+#   The layouts are precompiled struct.Struct definitions. A WireCodec encodes
+#   into buffers it owns and reuses - an encoded message is only valid until
+#   the next message of the same type is encoded - and decodes responses into
+#   typed records.
+#
+#   DATA messages are sent scatter-gather: data_header() encodes only the
+#   header, with the crc carried on from the header over the chunk in place,
+#   and write_parts() sends header and chunk with one vectored write. The
+#   chunk - a memoryview slice of the image - is never copied on the host.
+
+import binascii
+import os
+import struct
+from collections import namedtuple
+
+from .am_defines import AM_SECBOOT_WIRED_MSGTYPE_HELLO, AM_SECBOOT_WIRED_MSGTYPE_STATUS, \
+    AM_SECBOOT_WIRED_MSGTYPE_OTADESC, AM_SECBOOT_WIRED_MSGTYPE_UPDATE, AM_SECBOOT_WIRED_MSGTYPE_ABORT, \
+    AM_SECBOOT_WIRED_MSGTYPE_RESET, AM_SECBOOT_WIRED_MSGTYPE_ACK, AM_SECBOOT_WIRED_MSGTYPE_DATA, \
+    AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS, AM_MAX_UART_MSG_SIZE
+
+#******************************************************************************
+#
+# Layouts
+#
+#******************************************************************************
+HEADER = struct.Struct('<II')                   # crc, length/type
+HELLO = struct.Struct('<II')                    # crc, length/type
+WORD_MSG = struct.Struct('<III')                # crc, length/type, value - ABORT, OTADESC, RESET
+UPDATE = struct.Struct('<IIIII')                # crc, length/type, size, image crc, piggyback size
+DATA_HEADER = struct.Struct('<III')             # crc, length/type, seqNo - then the data
+STATUS = struct.Struct('<IIIIII16I')            # crc, length/type, version, max storage, status, state, AMInfo
+ACK = struct.Struct('<IIIII')                   # crc, length/type, acked type, status, seqNo
+
+STATUS_SIZE = STATUS.size                       # 88
+ACK_SIZE = ACK.size                             # 20
+
+# Largest data payload in one DATA message
+MAX_DATA_CHUNK = AM_MAX_UART_MSG_SIZE - DATA_HEADER.size
+
+#******************************************************************************
+#
+# Decoded records
+#
+#******************************************************************************
+StatusRecord = namedtuple('StatusRecord', 'length version max_storage status state aminfo')
+
+class AckRecord(namedtuple('AckRecord', 'length acked_type status seqno')):
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.status == AM_SECBOOT_WIRED_ACK_STATUS_SUCCESS
+
+class WireError(Exception):
+    pass
+
+def message_type(response):
+    return HEADER.unpack_from(response)[1] & 0xFFFF
+
+def decode_status(response):
+
+    fields = STATUS.unpack_from(response)
+    word = fields[1]
+    if (word & 0xFFFF) != AM_SECBOOT_WIRED_MSGTYPE_STATUS:
+        raise WireError("expected STATUS, got message type {}".format(word & 0xFFFF))
+
+    return StatusRecord(word >> 16, fields[2], fields[3], fields[4], fields[5], fields[6:])
+
+def decode_ack(response):
+
+    _, word, acked_type, status, seqno = ACK.unpack_from(response)
+    if (word & 0xFFFF) != AM_SECBOOT_WIRED_MSGTYPE_ACK:
+        raise WireError("expected ACK, got message type {}".format(word & 0xFFFF))
+
+    return AckRecord(word >> 16, acked_type, status, seqno)
+
+#******************************************************************************
+#
+# Encoder
+#
+#******************************************************************************
+def _seal(buf, length):
+
+    # the crc covers everything after itself
+    with memoryview(buf) as view:
+        struct.pack_into('<I', buf, 0, binascii.crc32(view[4:length]))
+
+class WireCodec(object):
+
+    def __init__(self):
+
+        self._hello = bytearray(HELLO.size)
+        self._word_msg = bytearray(WORD_MSG.size)
+        self._update = bytearray(UPDATE.size)
+        self._data = bytearray(AM_MAX_UART_MSG_SIZE)
+        self._data_header = bytearray(DATA_HEADER.size)
+
+        # the HELLO message never changes
+        HELLO.pack_into(self._hello, 0, 0, (HELLO.size << 16) | AM_SECBOOT_WIRED_MSGTYPE_HELLO)
+        _seal(self._hello, HELLO.size)
+
+    def hello(self):
+        return self._hello
+
+    def _word(self, msg_type, value):
+
+        WORD_MSG.pack_into(self._word_msg, 0, 0, (WORD_MSG.size << 16) | msg_type, value)
+        _seal(self._word_msg, WORD_MSG.size)
+        return self._word_msg
+
+    def abort(self, value):
+        return self._word(AM_SECBOOT_WIRED_MSGTYPE_ABORT, value)
+
+    def otadesc(self, address):
+        return self._word(AM_SECBOOT_WIRED_MSGTYPE_OTADESC, address)
+
+    def reset(self, options):
+        return self._word(AM_SECBOOT_WIRED_MSGTYPE_RESET, options)
+
+    def update(self, size, image_crc):
+
+        # piggyback size 0 - no data rides along with the UPDATE command
+        UPDATE.pack_into(self._update, 0, 0, (UPDATE.size << 16) | AM_SECBOOT_WIRED_MSGTYPE_UPDATE,
+                         size, image_crc, 0)
+        _seal(self._update, UPDATE.size)
+        return self._update
+
+    # The header of a DATA message carrying chunk - send it followed by chunk
+    def data_header(self, seqno, chunk):
+
+        length = DATA_HEADER.size + len(chunk)
+        if length > AM_MAX_UART_MSG_SIZE:
+            raise WireError("data chunk of {} bytes is too large".format(len(chunk)))
+
+        header = self._data_header
+        DATA_HEADER.pack_into(header, 0, 0, (length << 16) | AM_SECBOOT_WIRED_MSGTYPE_DATA, seqno)
+
+        with memoryview(header) as view:
+            crc = binascii.crc32(chunk, binascii.crc32(view[4:]))
+        struct.pack_into('<I', header, 0, crc)
+
+        return header
+
+    # The whole DATA message in one buffer - for transports without vectored writes
+    def data(self, seqno, chunk):
+
+        # returns a view of the reusable data buffer, sized to the message
+        length = DATA_HEADER.size + len(chunk)
+        if length > len(self._data):
+            raise WireError("data chunk of {} bytes is too large".format(len(chunk)))
+
+        DATA_HEADER.pack_into(self._data, 0, 0, (length << 16) | AM_SECBOOT_WIRED_MSGTYPE_DATA, seqno)
+        self._data[DATA_HEADER.size:length] = chunk
+        _seal(self._data, length)
+
+        return memoryview(self._data)[:length]
+
+#******************************************************************************
+#
+# Vectored write
+#
+# Sends the parts with one writev() on the port's file descriptor where there
+# is one. Whatever the driver doesn't take at once goes through pySerial, which
+# waits for the port. Without a file descriptor the parts are joined.
+#
+#******************************************************************************
+def write_parts(ser, parts):
+
+    fd = None
+    if hasattr(os, 'writev'):
+        try:
+            fd = ser.fileno()
+        except (AttributeError, OSError, ValueError):
+            fd = None
+
+    if fd is None:
+        ser.write(b''.join(parts))
+        return
+
+    try:
+        written = os.writev(fd, parts)
+    except BlockingIOError:
+        written = 0
+
+    for part in parts:
+        if written >= len(part):
+            written -= len(part)
+            continue
+        with memoryview(part) as view:
+            ser.write(view[written:])
+        written = 0
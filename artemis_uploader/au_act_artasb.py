@@ -45,9 +45,27 @@
 #
 #-----------------------------------------------------------------------------
 from .au_action import AxAction, AxJob
-from .asb import main as asb_main
-import tempfile
-import sys
+from .asb import parse_arguments, make_wired_image, AsbSession
+from .svl_baud import SVL_BAUD_AUTO
+
+#--------------------------------------------------------------------------------------
+# The ASB arguments for an Artemis bootloader image
+
+def bootloader_args(binfile, port, baud):
+
+    # Auto baud is an SVL feature - the ROM bootloader is run at the default rate
+    if baud == SVL_BAUD_AUTO:
+        baud = 115200
+
+    return ["--bin", binfile,
+            "-port", port,
+            "-b", str(baud),
+            "--load-address-blob", "0x20000",
+            "--magic-num", "0xCB",
+            "--version", "0x0",
+            "--load-address-wired", "0xC000",
+            "-i", "6"]
+
 #--------------------------------------------------------------------------------------
 # Artemis Boot loader burn action
 class AUxArtemisBurnBootloader(AxAction):
@@ -60,19 +78,22 @@ class AUxArtemisBurnBootloader(AxAction):
 
     def run_job(self, job:AxJob):
 
-        # fake command line args - since the apollo3 bootloader command will use
-        # argparse 
-        sys.argv = ['./asb/asb.py', \
-                    "--bin", job.file, \
-                    "-port", job.port, \
-                    "-b", str(job.baud), \
-                    "-o", tempfile.gettempdir(), \
-                    "--load-address-blob", "0x20000", \
-                    "--magic-num", "0xCB", \
-                    "--version", "0x0", \
-                    "--load-address-wired", "0xC000", \
-                    "-i", "6", \
-                    "-clean", "1" ]
+        # The images are built in memory, and the upload runs in its own
+        # session - so bootloader burns don't share any state
+        args = parse_arguments(bootloader_args(job.file, job.port, job.baud))
+
+        image = make_wired_image(args)
+        if image is None:
+            print("Unable to create the wired update image")
+            return 1
+
+        session = AsbSession.from_args(args, cancel=job.cancel_token, events=job.events)
+
+        if not session.upload(image):
+            print("Tries =", session.tries)
+            print("Upload failed")
+            return 1
 
-        # Call the ambiq command
-        asb_main()
+        print("Tries =", session.tries)
+        print('Upload complete!')
+        return 0
@@ -44,6 +44,7 @@
 #
 #-----------------------------------------------------------------------------
 from .au_action import AxAction, AxJob
+from .au_cancel import JobCancelled
 from .artemis_svl import upload_firmware
 
 #--------------------------------------------------------------------------------------
@@ -59,7 +60,11 @@ class AUxArtemisUploadFirmware(AxAction):
     def run_job(self, job:AxJob):
 
         try:
-            upload_firmware(job.file, job.port, job.baud)
+            if not upload_firmware(job.file, job.port, job.baud, cancel=job.cancel_token, events=job.events):
+                return 1
+
+        except JobCancelled:
+            raise   # the worker reports it
 
         except Exception:
             return 1
@@ -49,6 +49,10 @@
 #-----------------------------------------------------------------------------
 # "actions" - commands that execute a command for the application
 # 
+#--------------------------------------------------------------------------
+from .au_cancel import CancelToken
+from .au_events import EventBus
+
 #--------------------------------------------------------------------------
 # simple job class - list of parameters and an ID string. 
 #
@@ -75,6 +79,10 @@
 #  print(myJob.sensor)
 #  print(myJob.flight)
 #
+# Each job carries a cancel token (au_cancel.py) - the worker cancels it, and
+# actions pass it on to the upload code, which checks it between frames. And
+# an event bus (au_events.py) the upload code publishes its progress on.
+#
 
 class AxJob(dict):
 
@@ -91,6 +99,9 @@ class AxJob(dict):
 		self.job_id = AxJob._next_job_id;
 		AxJob._next_job_id = AxJob._next_job_id+1;
 
+		self.cancel_token = CancelToken()
+		self.events = EventBus()
+
 		# super
 		dict.__init__(self, indict)
 
@@ -0,0 +1,295 @@
+#-----------------------------------------------------------------------------
+# au_aserial.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file implements an asyncio serial transport, used by the async SVL and
+# ASB sessions. One event loop can drive many ports this way, instead of one
+# thread per port blocked in ser.read().
+#
+# The port is opened and configured with pySerial. On POSIX systems the port's
+# file descriptor is then watched by the event loop (loop.add_reader), so a
+# waiting read costs nothing until data arrives. Elsewhere - pySerial on
+# Windows has no file descriptor to watch - the port is polled on a short
+# interval instead.
+#
+# Reads follow pySerial's semantics: read(size, timeout) returns up to size
+# bytes, fewer if the timeout expires first.
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import asyncio
+import errno
+import os
+
+import serial
+
+# polling interval when the port can't be watched by the event loop
+_POLL_INTERVAL = 0.002
+
+_READ_CHUNK = 4096
+
+#--------------------------------------------------------------------------------------
+class AsyncSerial(object):
+
+    def __init__(self, port, baudrate):
+
+        self.port = port
+        self.baudrate = baudrate
+
+        self._ser = None
+        self._fd = None
+        self._loop = None
+        self._buf = bytearray()
+        self._waiter = None
+        self._error = None
+
+    #------------------------------------------------------
+    # open / close
+
+    async def open(self):
+
+        self._loop = asyncio.get_running_loop()
+
+        # timeout 0 - pySerial never blocks, the loop does the waiting
+        self._ser = serial.Serial(self.port, self.baudrate, timeout=0, write_timeout=None)
+
+        fileno = getattr(self._ser, 'fileno', None)
+        if fileno is not None:
+            try:
+                self._fd = fileno()
+                self._loop.add_reader(self._fd, self._on_readable)
+            except (NotImplementedError, OSError, ValueError):
+                self._fd = None
+
+        return self
+
+    def close(self):
+
+        if self._ser is None:
+            return
+
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+
+        self._ser.close()
+        self._ser = None
+        self._wake()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    @property
+    def is_open(self) -> bool:
+        return self._ser is not None
+
+    #------------------------------------------------------
+    # modem lines - pySerial's ioctls don't block. Ports without modem lines
+    # (ptys, some USB CDC devices) are let through, as pySerial's open() does.
+
+    def _set_line(self, name, state):
+        try:
+            setattr(self._ser, name, state)
+        except OSError as err:
+            if err.errno not in (errno.EINVAL, errno.ENOTTY):
+                raise
+
+    def set_dtr(self, state):
+        self._set_line('dtr', state)
+
+    def set_rts(self, state):
+        self._set_line('rts', state)
+
+    #------------------------------------------------------
+    # read side
+
+    def _wake(self):
+
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _on_readable(self):
+
+        try:
+            data = os.read(self._fd, _READ_CHUNK)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            # the device went away - stop watching and fail the reader
+            self._error = err
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+            data = b''
+
+        if data:
+            self._buf += data
+        self._wake()
+
+    def _poll(self):
+
+        waiting = self._ser.in_waiting
+        if waiting:
+            self._buf += self._ser.read(waiting)
+
+    @property
+    def in_waiting(self) -> int:
+
+        if self._fd is None and self._ser is not None:
+            self._poll()
+        return len(self._buf)
+
+    # Put bytes back at the front of the buffer - for parsers that resync
+    def unread(self, data):
+        self._buf[:0] = data
+
+    def reset_input_buffer(self):
+
+        self._buf.clear()
+        self._ser.reset_input_buffer()
+
+    async def _wait_data(self, deadline):
+
+        # Returns False once the deadline has passed
+        remaining = deadline - self._loop.time()
+        if remaining <= 0:
+            return False
+
+        if self._fd is None:
+            await asyncio.sleep(min(_POLL_INTERVAL, remaining))
+            self._poll()
+            return True
+
+        self._waiter = self._loop.create_future()
+        try:
+            await asyncio.wait_for(self._waiter, remaining)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiter = None
+
+        return True
+
+    async def read(self, size, timeout):
+
+        deadline = self._loop.time() + timeout
+
+        while len(self._buf) < size:
+
+            if self._error is not None:
+                raise serial.SerialException(str(self._error))
+            if self._ser is None:
+                break
+
+            if self._fd is None:
+                self._poll()
+                if len(self._buf) >= size:
+                    break
+
+            if not await self._wait_data(deadline):
+                break
+
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+    #------------------------------------------------------
+    # write side
+
+    async def write(self, data):
+
+        if self._fd is None:
+            # pySerial's write blocks - keep it off the loop
+            await self._loop.run_in_executor(None, self._ser.write, data)
+            return
+
+        # every view of the caller's buffer is released on the way out, so it
+        # can be resized again
+        with memoryview(data) as view:
+            sent = 0
+            while sent < len(view):
+                try:
+                    with view[sent:] as rest:
+                        sent += os.write(self._fd, rest)
+                except BlockingIOError:
+                    await self._writable()
+
+    # Several buffers as one write - a single writev() where the port has a
+    # file descriptor, the rest of the parts after a partial write as usual
+    async def write_parts(self, parts):
+
+        written = 0
+        if self._fd is not None and hasattr(os, 'writev'):
+            try:
+                written = os.writev(self._fd, parts)
+            except BlockingIOError:
+                written = 0
+        elif self._fd is None:
+            await self.write(b''.join(parts))
+            return
+
+        for part in parts:
+            if written >= len(part):
+                written -= len(part)
+                continue
+            with memoryview(part) as view, view[written:] as rest:
+                await self.write(rest)
+            written = 0
+
+    async def _writable(self):
+
+        future = self._loop.create_future()
+
+        def on_writable():
+            if not future.done():
+                future.set_result(None)
+
+        self._loop.add_writer(self._fd, on_writable)
+        try:
+            await future
+        finally:
+            self._loop.remove_writer(self._fd)
+
+    # Wait until the driver has sent everything written
+    async def drain(self):
+        await self._loop.run_in_executor(None, self._ser.flush)
+
+#--------------------------------------------------------------------------------------
+async def open_serial(port, baudrate) -> AsyncSerial:
+
+    return await AsyncSerial(port, baudrate).open()
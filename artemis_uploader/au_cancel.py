@@ -0,0 +1,111 @@
+#-----------------------------------------------------------------------------
+# au_cancel.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file is part of the job dispatch system. It implements the cancel
+# token a job carries into the upload code.
+#
+# The upload loops call check() between frames - once the job is cancelled
+# or its deadline has passed, check() raises JobCancelled, which unwinds the
+# upload, closing its port on the way out. The upload modules don't depend on
+# the job system: the token is an optional parameter, None when not used.
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import threading
+import time
+
+#--------------------------------------------------------------------------------------
+# Raised by CancelToken.check() - reason says why
+
+class JobCancelled(Exception):
+    pass
+
+CANCEL_REQUESTED = "cancelled"
+CANCEL_DEADLINE = "deadline exceeded"
+
+#--------------------------------------------------------------------------------------
+# Cancel token - safe to cancel from any thread
+
+class CancelToken(object):
+
+    def __init__(self, deadline=None):
+
+        self.deadline = deadline    # time.monotonic() value, or None for no deadline
+        self._event = threading.Event()
+        self._reason = None
+
+    def cancel(self, reason=CANCEL_REQUESTED):
+
+        if not self._event.is_set():
+            self._reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+
+        if self._event.is_set():
+            return True
+
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(CANCEL_DEADLINE)
+            return True
+
+        return False
+
+    @property
+    def reason(self):
+        return self._reason if self.cancelled else None
+
+    # Seconds left until the deadline - None without one
+    def remaining(self):
+
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+
+        if self.cancelled:
+            raise JobCancelled(self._reason)
+
+#--------------------------------------------------------------------------------------
+# For the upload code - a no-op without a token
+
+def check_cancel(cancel) -> None:
+
+    if cancel is not None:
+        cancel.check()
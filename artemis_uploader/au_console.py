@@ -0,0 +1,104 @@
+#-----------------------------------------------------------------------------
+# au_console.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file implements the console behind the GUI's messages window.
+#
+# The worker sends its output as many small fragments - in verbose mode a few
+# per frame. Writing each one into the text widget (and repainting) made the
+# GUI thread the bottleneck. The console buffers the fragments instead, and
+# appends them in one insert at most CONSOLE_FLUSH_HZ times a second; Qt
+# repaints when it gets to it. The widget keeps the last CONSOLE_MAX_LINES
+# lines - older ones are dropped.
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+from PyQt5.QtCore import QObject, QTimer, pyqtSlot
+from PyQt5.QtGui import QTextCursor
+
+CONSOLE_FLUSH_HZ = 30
+CONSOLE_MAX_LINES = 5000
+
+#--------------------------------------------------------------------------------------
+class AUxConsole(QObject):
+
+    def __init__(self, text_edit, rate=CONSOLE_FLUSH_HZ, max_lines=CONSOLE_MAX_LINES):
+
+        super().__init__(text_edit)
+
+        self._text_edit = text_edit
+        self._text_edit.setMaximumBlockCount(max_lines)
+
+        self._pending = []
+
+        # one shot - started by the first write after a flush, so an idle
+        # console doesn't tick
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(int(1000 / rate))
+        self._timer.timeout.connect(self.flush)
+
+    # Queue text for the console - call on the GUI thread
+    def write(self, text: str) -> None:
+
+        self._pending.append(text)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    # Append the queued text, and keep the end of it in view
+    @pyqtSlot()
+    def flush(self) -> None:
+
+        if not self._pending:
+            return
+
+        text = ''.join(self._pending)
+        self._pending.clear()
+
+        self._text_edit.moveCursor(QTextCursor.End)
+        self._text_edit.insertPlainText(text)
+        self._text_edit.moveCursor(QTextCursor.End)
+        self._text_edit.ensureCursorVisible()
+
+    def clear(self) -> None:
+
+        self._pending.clear()
+        self._timer.stop()
+        self._text_edit.clear()
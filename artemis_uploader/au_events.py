@@ -0,0 +1,167 @@
+#-----------------------------------------------------------------------------
+# au_events.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file implements the upload events. The uploaders publish what they are
+# doing - phase changes, frame N of M sent, retries, the final result - as
+# typed events on an EventBus, and don't render progress themselves. Whoever
+# is interested subscribes:
+#
+#    ConsoleProgress  - the command line progress bar
+#    UploadMetrics    - counts and rates, per port
+#    the GUI          - through the worker, see au_worker.py
+#
+# Subscribers are called on the uploading thread, between frames - they should
+# be quick, and leave anything slow (like widgets) to their own thread.
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import math
+import threading
+from collections import namedtuple
+
+#--------------------------------------------------------------------------------------
+# Phases of an upload
+
+PHASE_CONNECT = "connect"       # opening the port, resetting the board
+PHASE_SETUP = "setup"           # talking to the bootloader
+PHASE_BOOTLOAD = "bootload"     # sending the image
+
+#--------------------------------------------------------------------------------------
+# Events
+
+PhaseEvent = namedtuple('PhaseEvent', 'port phase')
+
+class ProgressEvent(namedtuple('ProgressEvent', 'port frame frames bytes_sent total_bytes')):
+
+    __slots__ = ()
+
+    @property
+    def percent(self):
+        return self.frame * 100 // self.frames if self.frames else 100
+
+RetryEvent = namedtuple('RetryEvent', 'port frame retries')
+
+# bps is bytes per second of the image sent
+ResultEvent = namedtuple('ResultEvent', 'port success bytes_sent seconds bps retries')
+
+#--------------------------------------------------------------------------------------
+# Event bus - subscribe and publish from any thread
+
+class EventBus(object):
+
+    def __init__(self, *subscribers):
+
+        self._lock = threading.Lock()
+
+        # replaced, never changed - publish() reads it without the lock
+        self._subscribers = tuple(subscribers)
+
+    def subscribe(self, callback):
+
+        with self._lock:
+            self._subscribers = self._subscribers + (callback,)
+        return callback
+
+    def unsubscribe(self, callback):
+
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not callback)
+
+    def publish(self, event):
+
+        for callback in self._subscribers:
+            callback(event)
+
+#--------------------------------------------------------------------------------------
+# Command line progress bar - [Uploading] ██████ 42%
+
+class ConsoleProgress(object):
+
+    def __init__(self, width=40):
+
+        self.width = width      # characters in the full bar
+        self._chars = 0
+
+    def __call__(self, event):
+
+        if isinstance(event, PhaseEvent) and event.phase == PHASE_BOOTLOAD:
+            self._chars = 0
+            print("[Uploading]   0%", end='')
+
+        elif isinstance(event, ProgressEvent):
+            percent = event.frame * 100 / event.frames
+            chars = math.floor(percent / 100 * self.width)
+            while self._chars <= chars:
+                self._chars += 1
+                print(u'\b\b\b\b\u2588 {:2d}%'.format(int(percent)), end='', flush=True) # bright block
+
+#--------------------------------------------------------------------------------------
+# Metrics - the latest progress and result of each port
+
+class UploadMetrics(object):
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self.progress = {}      # port -> last ProgressEvent
+        self.results = {}       # port -> last ResultEvent
+        self.retries = {}       # port -> retries so far
+        self.phases = {}        # port -> current phase
+
+    def __call__(self, event):
+
+        with self._lock:
+            if isinstance(event, ProgressEvent):
+                self.progress[event.port] = event
+            elif isinstance(event, RetryEvent):
+                self.retries[event.port] = event.retries
+            elif isinstance(event, PhaseEvent):
+                self.phases[event.port] = event.phase
+            elif isinstance(event, ResultEvent):
+                self.results[event.port] = event
+
+    # The port's last result as one line - None until it has one
+    def describe(self, port):
+
+        with self._lock:
+            result = self.results.get(port)
+
+        if result is None:
+            return None
+
+        return "{} bytes in {:.2f} s ({:.1f} kB/s), {} retries".format(
+            result.bytes_sent, result.seconds, result.bps / 1000, result.retries)
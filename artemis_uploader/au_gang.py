@@ -0,0 +1,321 @@
+#-----------------------------------------------------------------------------
+# au_gang.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file implements gang programming - uploading the same image to many
+# Artemis boards, each on its own serial port, at the same time.
+#
+#    - Firmware (SVL) uploads run on a bounded thread pool. The image is encoded
+#      into a frame plan once and every session sends the same frames.
+#
+#    - Bootloader (ASB) uploads run the same way, one AsbSession per port. The
+#      wired image is built once, in memory, and each session only uploads it.
+#
+# Progress is reported per port through a status callback, and the results
+# are returned as a list of GangResult - print_summary() formats them.
+#
+# Command line:
+#
+#    python -m artemis_uploader.au_gang -f Blink.bin -b 921600 COM3 COM4 COM5
+#    python -m artemis_uploader.au_gang --bootloader -f artemis_svl.bin /dev/ttyUSB*
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import argparse
+import concurrent.futures
+import contextvars
+import os
+import os.path
+import sys
+import threading
+import time
+
+from .artemis_svl import upload_firmware, get_frame_plan, SvlIoStats
+from .svl_baud import SVL_BAUD_AUTO
+from .asb import parse_arguments, make_wired_image, AsbSession
+from .au_act_artasb import bootloader_args
+from .au_output import capture_output
+from .au_events import EventBus, UploadMetrics, ProgressEvent
+
+# Default pool size. Sessions are threads waiting on serial I/O, so a rack of
+# boards fits in one pool.
+GANG_MAX_THREADS = 16
+
+# Status values passed to the status callback
+GANG_QUEUED = "queued"
+GANG_RUNNING = "running"
+GANG_SUCCESS = "success"
+GANG_FAILED = "failed"
+
+# Progress is reported to the status callback in steps of this many percent
+GANG_PROGRESS_STEP = 10
+
+#--------------------------------------------------------------------------------------
+# Result of one port's session
+
+class GangResult(object):
+
+    __slots__ = ('port', 'success', 'duration', 'retries', 'error', 'bytes_sent', 'bps')
+
+    def __init__(self, port, success=False, duration=0.0, retries=0, error=None, bytes_sent=0, bps=0.0):
+
+        self.port = port
+        self.success = success
+        self.duration = duration    # seconds
+        self.retries = retries
+        self.error = error          # text of the exception that ended the session, if any
+        self.bytes_sent = bytes_sent    # image bytes sent in the last attempt
+        self.bps = bps              # bytes per second of the image sent
+
+    def __repr__(self):
+        return "GangResult({}, success={}, duration={:.2f}, retries={})".format(
+            self.port, self.success, self.duration, self.retries)
+
+#--------------------------------------------------------------------------------------
+# Default status callback - one line per change, safe to call from any thread
+
+_print_lock = threading.Lock()
+
+def print_status(port, status, detail=None):
+
+    with _print_lock:
+        line = "[{}] {}".format(port, status)
+        if detail:
+            line += " - " + detail
+        print(line, flush=True)
+
+#--------------------------------------------------------------------------------------
+# The session's result, with the transfer the metrics saw
+
+def _gang_result(metrics, port, success, duration, retries, error):
+
+    result = GangResult(port, success, duration, retries, error)
+
+    last = metrics.results.get(port)
+    if last is not None:
+        result.bytes_sent = last.bytes_sent
+        result.bps = last.bps
+
+    return result
+
+#--------------------------------------------------------------------------------------
+# A session's events - the shared metrics, and its progress as status lines.
+# The sessions don't draw progress bars - N of them on one stdout is garbage.
+# status() runs in the caller's context, outside the session's captured output.
+
+def _session_events(port, status, metrics):
+
+    step = [-1]
+    context = contextvars.copy_context()
+
+    def report(event):
+        if isinstance(event, ProgressEvent):
+            percent = event.percent // GANG_PROGRESS_STEP * GANG_PROGRESS_STEP
+            if percent != step[0]:
+                step[0] = percent
+                context.run(status, port, GANG_RUNNING, "{}%".format(percent))
+
+    return EventBus(metrics, report)
+
+#--------------------------------------------------------------------------------------
+# What ended a session. The upload code calls exit() when a port is in use.
+
+def _error_text(err):
+
+    if isinstance(err, SystemExit):
+        return err.code if isinstance(err.code, str) else "the session exited - is the port in use?"
+    return str(err)
+
+#--------------------------------------------------------------------------------------
+# Firmware - SVL sessions on a thread pool
+
+def _svl_session(binfile, port, baud, timeout, status, metrics):
+
+    status(port, GANG_RUNNING)
+
+    stats = SvlIoStats()
+    events = _session_events(port, status, metrics)
+    start = time.monotonic()
+    error = None
+
+    try:
+        with capture_output(None):     # the session's own text - the status lines replace it
+            success = upload_firmware(binfile, port, baud, timeout, stats, events=events)
+    except (Exception, SystemExit) as err:    # one bad port must not stop the gang
+        success = False
+        error = _error_text(err)
+
+    result = _gang_result(metrics, port, bool(success), time.monotonic() - start, stats.retries, error)
+    status(port, GANG_SUCCESS if result.success else GANG_FAILED, error)
+
+    return result
+
+def gang_upload_firmware(binfile, ports, baud, timeout=0.5, max_workers=None, status=print_status,
+                         metrics=None):
+
+    if not os.path.exists(binfile):
+        raise FileNotFoundError("Bin file {} does not exist.".format(binfile))
+
+    # encode the frames once - every session gets the cached plan
+    get_frame_plan(binfile)
+
+    # shared by the sessions - results are kept per port
+    metrics = metrics if metrics is not None else UploadMetrics()
+
+    workers = max_workers or min(len(ports), GANG_MAX_THREADS)
+
+    for port in ports:
+        status(port, GANG_QUEUED)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                               thread_name_prefix="svl-gang") as pool:
+        futures = [pool.submit(_svl_session, binfile, port, baud, timeout, status, metrics)
+                   for port in ports]
+
+    return [future.result() for future in futures]
+
+#--------------------------------------------------------------------------------------
+# Bootloader - ASB sessions on a thread pool
+
+def _asb_session(image, args, port, status, metrics):
+
+    status(port, GANG_RUNNING)
+
+    session = AsbSession(port, args.baud, abort=args.abort, otadesc=args.otadesc,
+                         split=args.split, reset=args.reset, events=_session_events(port, status, metrics))
+    start = time.monotonic()
+    error = None
+
+    try:
+        with capture_output(None):     # the session's own text - the status lines replace it
+            success = session.upload(image)
+    except (Exception, SystemExit) as err:    # one bad port must not stop the gang
+        success = False
+        error = _error_text(err)
+
+    result = _gang_result(metrics, port, success, time.monotonic() - start, session.tries, error)
+    status(port, GANG_SUCCESS if result.success else GANG_FAILED, error)
+
+    return result
+
+def gang_burn_bootloader(binfile, ports, baud, max_workers=None, status=print_status, metrics=None):
+
+    if not os.path.exists(binfile):
+        raise FileNotFoundError("Bin file {} does not exist.".format(binfile))
+
+    # one wired image for all sessions, built in memory
+    args = parse_arguments(bootloader_args(binfile, "", baud))
+    with capture_output(None):     # the build's output - this thread's only
+        image = make_wired_image(args)
+
+    if image is None:
+        raise ValueError("Unable to create the wired update image from {}".format(binfile))
+
+    metrics = metrics if metrics is not None else UploadMetrics()
+
+    workers = max_workers or min(len(ports), GANG_MAX_THREADS)
+
+    for port in ports:
+        status(port, GANG_QUEUED)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                               thread_name_prefix="asb-gang") as pool:
+        futures = [pool.submit(_asb_session, image, args, port, status, metrics) for port in ports]
+
+    return [future.result() for future in futures]
+
+#--------------------------------------------------------------------------------------
+def print_summary(results, file=None):
+
+    file = file or sys.stdout
+
+    print("\n{:24s} {:8s} {:>9s} {:>8s} {:>8s}".format("Port", "Result", "Time (s)", "Retries", "kB/s"),
+          file=file)
+    print("-"*61, file=file)
+
+    for result in results:
+        print("{:24s} {:8s} {:9.2f} {:8d} {:8.1f}".format(result.port, "OK" if result.success else "FAILED",
+                                                         result.duration, result.retries,
+                                                         result.bps / 1000), file=file)
+        if result.error:
+            print("    " + result.error, file=file)
+
+    passed = sum(1 for result in results if result.success)
+    print("-"*61, file=file)
+    print("{} of {} ports succeeded".format(passed, len(results)), file=file)
+
+#--------------------------------------------------------------------------------------
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Upload the same image to many Artemis boards at once')
+
+    parser.add_argument('ports', nargs='+', help='Serial ports, one per board')
+
+    def baud_arg(x):
+        return SVL_BAUD_AUTO if x.lower() == SVL_BAUD_AUTO else int(x)
+
+    parser.add_argument('-b', dest='baud', default=115200, type=baud_arg,
+                        help='Baud Rate, or \'auto\' for firmware uploads (default is 115200)')
+
+    parser.add_argument('-f', dest='binfile', required=True,
+                        help='Binary file to program into the boards')
+
+    parser.add_argument('--bootloader', action='store_true',
+                        help='Upload a bootloader (ASB) instead of firmware (SVL)')
+
+    parser.add_argument('-j', dest='workers', type=int, default=None,
+                        help='Number of boards to program at the same time')
+
+    parser.add_argument("-t", "--timeout", default=0.50, type=float,
+                        help="Firmware communication timeout in seconds (default 0.5)")
+
+    args = parser.parse_args()
+
+    start = time.monotonic()
+
+    if args.bootloader:
+        results = gang_burn_bootloader(args.binfile, args.ports, args.baud, args.workers)
+    else:
+        results = gang_upload_firmware(args.binfile, args.ports, args.baud, args.timeout, args.workers)
+
+    print_summary(results)
+    print("Total time {:.2f} s".format(time.monotonic() - start))
+
+    sys.exit(0 if all(result.success for result in results) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#-----------------------------------------------------------------------------
+# au_output.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file routes print() output per job. The upload code is command line
+# code that prints its progress; a job running it in the background wants
+# that output for itself.
+#
+# sys.stdout and sys.stderr are replaced - once - with routers. A router
+# writes to the sink the current context has set with capture_output(), and
+# to the original stream otherwise. Each thread has its own context, so jobs
+# on different threads capture their own output at the same time, and threads
+# that capture nothing print as usual.
+#
+# Threads a job starts itself don't inherit its context - their output goes
+# to the original streams, unless they capture it too.
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import contextvars
+import sys
+import threading
+from contextlib import contextmanager
+
+# The current (stdout sink, stderr sink) - None to use the original stream
+_sinks = contextvars.ContextVar('au_output_sinks', default=None)
+
+_STDOUT = 0
+_STDERR = 1
+
+#--------------------------------------------------------------------------------------
+# Stands in for sys.stdout or sys.stderr
+
+class AUxOutputRouter(object):
+
+    def __init__(self, stream, which):
+
+        self._stream = stream   # the original stream
+        self._which = which
+
+    def write(self, text):
+
+        sinks = _sinks.get()
+        if sinks is None:
+            return self._stream.write(text)
+
+        sink = sinks[self._which]
+        if sink is not None:
+            sink(text)
+        return len(text)
+
+    def flush(self):
+
+        if _sinks.get() is None:
+            self._stream.flush()
+
+    # everything else - encoding, fileno(), isatty() ... - is the original stream's
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+_install_lock = threading.Lock()
+
+def install_output_router():
+
+    with _install_lock:
+        if not isinstance(sys.stdout, AUxOutputRouter):
+            sys.stdout = AUxOutputRouter(sys.stdout, _STDOUT)
+        if not isinstance(sys.stderr, AUxOutputRouter):
+            sys.stderr = AUxOutputRouter(sys.stderr, _STDERR)
+
+#--------------------------------------------------------------------------------------
+# Send this context's stdout to out(text), and stderr to err(text) - either
+# goes nowhere when None. Nests, and leaves other threads alone.
+
+@contextmanager
+def capture_output(out, err=None):
+
+    install_output_router()
+
+    token = _sinks.set((out, err))
+    try:
+        yield
+    finally:
+        _sinks.reset(token)
@@ -0,0 +1,123 @@
+#-----------------------------------------------------------------------------
+# au_userdirs.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file locates the per user directories the uploader keeps state in.
+# The GUI settings live in QSettings - these directories are used by the
+# upload modules, which don't depend on Qt.
+#
+#    user_config_dir() - small state that should survive, like the best
+#                        working baud rate of each serial adapter
+#
+#    user_cache_dir()  - data that can be rebuilt at any time
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import json
+import os
+import os.path
+import platform
+
+_APP_DIR_NAME = "ArtemisUploader"
+
+# Override the location of both directories - handy for tests and fixtures
+_ENV_HOME = "ARTEMIS_UPLOADER_HOME"
+
+#--------------------------------------------------------------------------------------
+def _base_dir(kind):
+
+    override = os.environ.get(_ENV_HOME)
+    if override:
+        return os.path.join(override, kind)
+
+    home = os.path.expanduser("~")
+    osName = platform.system()
+
+    if osName == "Windows":
+        root = os.environ.get("LOCALAPPDATA", os.path.join(home, "AppData", "Local"))
+        return os.path.join(root, "SparkFun", _APP_DIR_NAME, kind.capitalize())
+
+    elif osName == "Darwin":
+        if kind == "cache":
+            return os.path.join(home, "Library", "Caches", _APP_DIR_NAME)
+        return os.path.join(home, "Library", "Application Support", _APP_DIR_NAME)
+
+    # Linux and friends - follow XDG
+    if kind == "cache":
+        root = os.environ.get("XDG_CACHE_HOME", os.path.join(home, ".cache"))
+    else:
+        root = os.environ.get("XDG_CONFIG_HOME", os.path.join(home, ".config"))
+
+    return os.path.join(root, _APP_DIR_NAME.lower())
+
+def _make_dir(path):
+
+    os.makedirs(path, exist_ok=True)
+    return path
+
+#--------------------------------------------------------------------------------------
+def user_config_dir() -> str:
+    return _make_dir(_base_dir("config"))
+
+def user_cache_dir(subdir=None) -> str:
+
+    path = _base_dir("cache")
+    if subdir:
+        path = os.path.join(path, subdir)
+    return _make_dir(path)
+
+#--------------------------------------------------------------------------------------
+# Small JSON state files. A missing or damaged file reads as empty - the
+# contents are only ever hints.
+
+def load_json(path) -> dict:
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return data if isinstance(data, dict) else {}
+
+def save_json(path, data) -> None:
+
+    # write to the side and swap in, so a reader never sees a partial file
+    tmp_path = path + ".tmp." + str(os.getpid())
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+    os.replace(tmp_path, path)
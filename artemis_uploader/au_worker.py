@@ -14,17 +14,32 @@
 #
 # This file implements the main logic of the background worker system.
 #
-# In general, the worker implements a background thread which waits for
-# "jobs" to be passed in for execution via a queue object. Once a job is
+# In general, the worker implements a pool of background threads which wait
+# for "jobs" to be passed in for execution via a queue object. Once a job is
 # detected, it is sent to the target "action" object for execution.
 #
+# Jobs are queued per serial port - the job's "port" value. Jobs for different
+# ports run at the same time, on up to max_threads threads, and the jobs for
+# one port run one after the other, in the order they were added. A port with
+# more jobs waiting goes back to the end of the line after each job, so one
+# busy port doesn't hold up the others.
+#
+# The threads block on the queue, so a job starts as soon as it is added, and
+# shutdown() wakes the threads with a sentinel. Every job has a cancel token:
+# cancel() cancels a queued job before it starts, or a running one at its next
+# frame. A job added with a timeout is cancelled once the timeout has passed,
+# counted from when it was added. The time each job waited in the queue is
+# reported when it starts.
+#
 # During job execution, messages are relayed to the main application
-# via a passed in callback function.
+# via a passed in callback function - the job's output as text, and its
+# upload events (au_events.py) as they are.
 #
 # When a job is executed, it is assumed that "command line" python
 # scripts are used for the underlying logic. As such stdout and stderr are
-# captured for output. Also, "exit()" calls are trapped, so  the thread
-# will continue to execute.
+# captured for output - per job (au_output.py), so jobs running at the same
+# time each keep their own output, passed on with the job id. Also, "exit()"
+# calls are trapped, so  the thread will continue to execute.
 #
 # More information on qwiic is at https://www.sparkfun.com/artemis
 #
@@ -57,54 +72,43 @@
 #-----------------------------------------------------------------------------
 import time
 import queue
-from threading import Thread
+from collections import deque
+from threading import Thread, Lock
 from .au_action import AxAction, AxJob
-from contextlib import redirect_stdout, redirect_stderr
+from .au_cancel import JobCancelled
+from .au_output import capture_output
 
 #--------------------------------------------------------------------------------------
-# AUxIOWedge
-#
-# Used to redirect/capture output chars from the print() function and redirect to our
-# console. Allows the use of command line routines in this GUI app
-
-
-from io import TextIOWrapper, BytesIO
+# Worker threads to manage background jobs passed in via a queue
 
+# Default pool size - sessions are threads waiting on serial I/O
+AUX_WORKER_THREADS = 4
 
-class AUxIOWedge(TextIOWrapper):
-    def __init__(self, output_funct, suppress=False, newline="\n"):
-        super(AUxIOWedge, self).__init__(BytesIO(),
-                                        encoding="utf-8",
-                                        errors="surrogatepass",
-                                        newline=newline)
-
-        self._output_func = output_funct
-        self._suppress = suppress
-
-    def write(self, buffer):
-
-        # Just send buffer to our output console
-        if not self._suppress:
-            self._output_func(buffer)
-
-        return len(buffer)
-#--------------------------------------------------------------------------------------
-# Worker thread to manage background jobs passed in via a queue
+# queue entry that stops a thread
+_SHUTDOWN = None
 
-# define a worker class/thread
+# define a worker class/thread pool
 
 class AUxWorker(object):
 
     TYPE_MESSAGE    = 1
     TYPE_FINISHED   = 2
+    TYPE_STARTED    = 3
+    TYPE_EVENT      = 4
 
-    def __init__(self, cb_function):
+    # job status passed with TYPE_FINISHED
+    STATUS_OK           = 0
+    STATUS_ERROR        = 1
+    STATUS_CANCELLED    = 2
+
+    def __init__(self, cb_function, max_threads=AUX_WORKER_THREADS):
 
         object.__init__(self)
 
         # create a standard python queue = the queue is used to communicate
-        # work to the background thread in a safe manner.  "Jobs" to do
-        # are passed to the background thread via this queue
+        # work to the background threads in a safe manner. It holds the
+        # ports that have a job to run next - each port is in the queue, or
+        # running a job, at most once
         self._queue = queue.Queue()
 
         self._cb_function = cb_function
@@ -114,19 +118,48 @@ class AUxWorker(object):
         # stash of registered actions
         self._actions = {}
 
-        # throw the work/job into a thread
-        self._thread = Thread(target = self.process_loop, args=(self._queue,))
-        self._thread.start()
+        # per port FIFO of (time added, job) - a port is listed while it has
+        # jobs queued or running
+        self._ports = {}
+
+        # queued and running jobs, by job id - for cancel()
+        self._jobs = {}
+        self._jobs_lock = Lock()
+
+        # throw the work/jobs into the threads
+        self._threads = [Thread(target = self.process_loop, args=(self._queue,),
+                                name="aux-worker-{}".format(n)) for n in range(max_threads)]
+        for thread in self._threads:
+            thread.start()
 
-    # Make sure the thread stops running in Destructor. And add shutdown user method
+    # Make sure the threads stop running in Destructor. And add shutdown user method
     def __del__(self):
 
-        self._shutdown = True
+        self.shutdown()
 
+    # Stops the threads - queued and running jobs are cancelled
     def shutdown(self):
 
+        if self._shutdown:
+            return
+
         self._shutdown = True
 
+        with self._jobs_lock:
+            for job in self._jobs.values():
+                job.cancel_token.cancel()
+
+        # wake the threads
+        for _ in self._threads:
+            self._queue.put(_SHUTDOWN)
+
+    # The FIFO a job is queued on - jobs without a port don't wait on each other
+    @staticmethod
+    def port_key(job):
+
+        port = job.get('port')
+        return port if port else ('job', job.job_id)
+
     #------------------------------------------------------
     # Add a execution type/object (an AxAction) to our available
     # job type list
@@ -143,85 +176,155 @@ class AUxWorker(object):
     #------------------------------------------------------
     # Add a job for execution by the background thread.
     #
-    def add_job(self, theJob:AxJob)->None:
+    # timeout - seconds from now the job must be done in, or it's cancelled
+    #
+    def add_job(self, theJob:AxJob, timeout:float=None)->None:
 
 
         # get job ID
         job_id = theJob.job_id
 
-        self._queue.put(theJob)
+        now = time.monotonic()
+        if timeout is not None:
+            theJob.cancel_token.deadline = now + timeout
+
+        key = self.port_key(theJob)
+
+        with self._jobs_lock:
+            self._jobs[job_id] = theJob
+
+            fifo = self._ports.get(key)
+            idle = fifo is None
+            if idle:
+                fifo = self._ports[key] = deque()
+            fifo.append((now, theJob))
+
+        # an idle port is ready - a busy one is picked up when its job is done
+        if idle:
+            self._queue.put(key)
 
         return job_id
 
+    #------------------------------------------------------
+    # Cancel a queued or running job. Returns False if the job is unknown
+    # or already finished
+    #
+    def cancel(self, job_id:int) -> bool:
+
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+
+        if job is None:
+            return False
+
+        job.cancel_token.cancel()
+        return True
+
     #------------------------------------------------------    
-    # call back function for output from the bootloader - called from our IO wedge class.
+    # call back function for output from the bootloader - called with the
+    # output captured from the job, and the job's id
     #
-    def message(self, message):
+    def message(self, message, job_id=None):
 
         # relay/post message to the GUI's console
 
-        self._cb_function(self.TYPE_MESSAGE, message)
+        self._cb_function(self.TYPE_MESSAGE, message, job_id)
     #------------------------------------------------------
     # Job dispatcher. Job should be an AxJob object instance.
     # 
-    # retval  0 = OKAY
+    # retval  STATUS_OK, STATUS_ERROR or STATUS_CANCELLED
 
-    def dispatch_job(self, job):
+    def dispatch_job(self, job, queue_wait=0.0):
 
         # make sure we have a job
         if not isinstance(job, AxJob):
             self.message("ERROR - invalid job dispatched\n")
-            return 1
+            return self.STATUS_ERROR
 
         # is the target action in our available actions dictionary?
         if job.action_id not in self._actions:
             self.message("Unknown job type. Aborting\n")
-            return 1
+            return self.STATUS_ERROR
+
+        # the job's output and events, tagged with its id
+        def output(message):
+            self.message(message, job.job_id)
+
+        def event(event):
+            self._cb_function(self.TYPE_EVENT, event, job.job_id)
+
+        job.events.subscribe(event)
 
         # write out the job
         # send a line break across the console - start of a new activity
-        self.message('\n' + ('_'*70) + "\n")
+        output('\n' + ('_'*70) + "\n")
 
         # Job details
-        self.message(self._actions[job.action_id].name + "\n\n")
+        output(self._actions[job.action_id].name + "\n\n")
         for key in sorted(job.keys()):
-            self.message(key.capitalize() + ":\t" + str(job[key]) + '\n')
-
-        self.message('\n')
-
-        # capture stdio and stderr outputs
-        with redirect_stdout(AUxIOWedge(self.message)):
-            with redirect_stderr(AUxIOWedge(self.message, suppress=True)):
-
-                # catch any exit() calls the underlying system might make
-                try:
-                    # run the action
-                    return self._actions[job.action_id].run_job(job)
-                except SystemExit as  error:
-                    # some scripts call exit(), even if not an error
-                    self.message("Complete.")
-
-        return 1
+            output(key.capitalize() + ":\t" + str(job[key]) + '\n')
+
+        output("Queued:\t{:.0f} ms\n".format(queue_wait * 1000))
+        output('\n')
+
+        # cancelled or out of time while queued
+        if job.cancel_token.cancelled:
+            output("Cancelled before it started - " + job.cancel_token.reason + "\n")
+            return self.STATUS_CANCELLED
+
+        # capture stdio outputs for this job - stderr is dropped
+        with capture_output(output):
+
+            # catch any exit() calls the underlying system might make
+            try:
+                # run the action
+                return self._actions[job.action_id].run_job(job)
+            except JobCancelled as error:
+                output("\nCancelled - " + str(error) + "\n")
+                return self.STATUS_CANCELLED
+            except SystemExit as exited:
+                # some scripts call exit(), even if not an error
+                if exited.code in (None, 0):
+                    output("Complete.")
+                    return self.STATUS_OK
+
+                output("\nExited - " + str(exited.code) + "\n")
+                return self.STATUS_ERROR
 
     #------------------------------------------------------
-    # The thread processing loop
+    # The thread processing loop - one per thread
 
     def process_loop(self, inputQueue):
 
-        # Wait on jobs .. forever... Exit when shutdown is true
+        # Wait on jobs .. forever... Exit on the shutdown sentinel
+        while True:
+
+            key = inputQueue.get()
+            if key is _SHUTDOWN:
+                break
+
+            # the port's next job - no other thread runs this port meanwhile
+            with self._jobs_lock:
+                queued_at, job = self._ports[key].popleft()
 
-        self._shutdown = False
+            queue_wait = time.monotonic() - queued_at
 
-        # run
-        while not self._shutdown:
+            # job is starting - let UX know how long it waited
+            self._cb_function(self.TYPE_STARTED, job.action_id, job.job_id, queue_wait)
 
-            if inputQueue.empty():
-                time.sleep(1)  # no job, sleep a bit
-            else:
-                job = inputQueue.get()
+            try:
+                status = self.dispatch_job(job, queue_wait)
+            finally:
+                with self._jobs_lock:
+                    self._jobs.pop(job.job_id, None)
 
-                status = self.dispatch_job(job)
+                    more = bool(self._ports[key])
+                    if not more:
+                        del self._ports[key]
 
-                # job is finished - let UX know -pass status, action type and job id
-                self._cb_function(self.TYPE_FINISHED, status, job.action_id, job.job_id)
+                # the port's next job goes to the back of the line
+                if more:
+                    inputQueue.put(key)
 
+            # job is finished - let UX know -pass status, action type and job id
+            self._cb_function(self.TYPE_FINISHED, status, job.action_id, job.job_id)
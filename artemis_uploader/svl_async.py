@@ -0,0 +1,244 @@
+#-----------------------------------------------------------------------------
+# svl_async.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file implements an asyncio version of the SparkFun Variable Loader
+# (SVL) upload session, on the transport in au_aserial.
+#
+# The protocol isn't written again here. The bootloader entry and the frame
+# loop are artemis_svl's session cores, carried out on the asyncio transport by
+# run_session() below. The same frame plans, events, cancel tokens and I/O
+# statistics are used as by upload_firmware(), so many ports can be driven from
+# one event loop:
+#
+#    ok = await upload_firmware_async("Blink.bin", "/dev/ttyUSB0", 921600)
+#
+#    results = await upload_firmware_many("Blink.bin", ports, 921600,
+#                                         progress=lambda port, frame, total: ...)
+#
+# Timeouts are per packet, a session is cancelled by cancelling its task (or
+# its CancelToken), and the progress callback is called for every frame sent.
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import asyncio
+import time
+
+import serial
+
+from .au_aserial import AsyncSerial
+from .au_cancel import check_cancel
+from .au_events import EventBus, PhaseEvent, ProgressEvent, PHASE_CONNECT, PHASE_SETUP
+from .artemis_svl import SvlIoStats, SvlPacket, SvlFramePlan, get_frame_plan, encode_packet, \
+    entry_core, bootload_core, _TIMEOUT_PACKET, SVL_MAX_PAYLOAD, SVL_CMD_BL, SVL_ENTRY_CADENCE, \
+    SVL_IO_WRITE, SVL_IO_READ, SVL_IO_WAIT
+from .svl_crc import crc16
+
+SVL_ASYNC_TRIES = 3
+
+#--------------------------------------------------------------------------------------
+# Packet reading - the transport buffers everything that arrives, so a packet
+# is read as its header and then its payload.
+#
+# With resync enabled, bytes that can't start a valid packet are dropped one at
+# a time, as SvlPacketReader does.
+
+async def read_packet(port, timeout, stats, resync=False) -> SvlPacket:
+
+    while True:
+
+        header = await port.read(2, timeout)
+        stats.reads += 1
+        stats.bytes_read += len(header)
+        if len(header) < 2:
+            return _TIMEOUT_PACKET
+
+        length = (header[0] << 8) | header[1]
+
+        if length < 3 or length > SVL_MAX_PAYLOAD:
+            if resync:
+                # keep the second byte - it may start the packet
+                port.unread(header[1:])
+                continue
+            return SvlPacket(length, 0, b'', 1, False)
+
+        payload = await port.read(length, timeout)
+        stats.reads += 1
+        stats.bytes_read += len(payload)
+
+        if len(payload) < length:
+            if resync and payload:
+                port.unread(header[1:] + payload)
+                continue
+            return SvlPacket(length)
+
+        crc = crc16(payload)
+        if crc != 0 and resync:
+            port.unread(header[1:] + payload)
+            continue
+
+        return SvlPacket(length, payload[0], payload[1:-2], crc, False)
+
+async def _write(port, data, stats):
+
+    stats.writes += 1
+    stats.bytes_written += len(data)
+    await port.write(data)
+
+#--------------------------------------------------------------------------------------
+# Carry out a session core's I/O requests - see artemis_svl.run_session()
+
+async def run_session(port, core, stats):
+
+    reply = None
+    while True:
+        try:
+            request = core.send(reply)
+        except StopIteration as result:
+            return result.value
+
+        io = request[0]
+        if io == SVL_IO_WRITE:
+            await _write(port, request[1], stats)
+            reply = None
+        elif io == SVL_IO_READ:
+            reply = await read_packet(port, request[1], stats, request[2])
+        elif io == SVL_IO_WAIT:
+            first = await port.read(1, request[1])
+            port.unread(first)
+            reply = bool(first)
+        else:
+            port.reset_input_buffer()
+            reply = None
+
+#--------------------------------------------------------------------------------------
+# Bootloader entry - returns the version packet, or None. By default the window
+# is the packet timeout.
+
+async def enter_bootloader(port, stats, timeout, cadence=SVL_ENTRY_CADENCE, window=None, cancel=None):
+
+    core = entry_core(port.port, timeout, time.monotonic(), cadence, window, cancel)
+    return await run_session(port, core, stats)
+
+#--------------------------------------------------------------------------------------
+# Frames - answer NEXT and RETRY until the image is sent
+
+async def bootload(port, plan, timeout, stats, events=None, cancel=None):
+
+    if events is None:
+        events = EventBus()
+
+    succeeded = await run_session(port, bootload_core(port.port, plan, timeout, stats, events, cancel), stats)
+
+    # DONE is out before the port closes
+    await port.drain()
+    return succeeded
+
+#--------------------------------------------------------------------------------------
+# The progress callback, as an event subscriber
+
+def _progress_events(events, progress):
+
+    if events is None:
+        events = EventBus()
+
+    if progress is not None:
+        def report(event):
+            if isinstance(event, ProgressEvent):
+                progress(event.frame, event.frames)
+        events.subscribe(report)
+
+    return events
+
+#--------------------------------------------------------------------------------------
+# One session - open the port (resetting the board), enter the bootloader and
+# send the image. Tries again on failure, like the blocking version.
+
+async def upload_firmware_async(binfile, port, baud, timeout=0.5, stats=None, progress=None,
+                                num_tries=SVL_ASYNC_TRIES, events=None, cancel=None) -> bool:
+
+    if stats is None:
+        stats = SvlIoStats()
+
+    events = _progress_events(events, progress)
+
+    # a plan can be passed in directly, to share it between sessions
+    plan = binfile if isinstance(binfile, SvlFramePlan) else get_frame_plan(binfile, stats=stats)
+
+    for _ in range(num_tries):
+
+        check_cancel(cancel)
+        events.publish(PhaseEvent(port, PHASE_CONNECT))
+
+        async with AsyncSerial(port, baud) as ser:
+
+            ser.reset_input_buffer()
+            events.publish(PhaseEvent(port, PHASE_SETUP))
+
+            if await enter_bootloader(ser, stats, timeout, cancel=cancel) is None:
+                continue
+
+            await _write(ser, encode_packet(SVL_CMD_BL, b''), stats)
+
+            if await bootload(ser, plan, timeout, stats, events, cancel):
+                return True
+
+    return False
+
+#--------------------------------------------------------------------------------------
+# Many sessions on one loop. Returns {port: success}. A port that can't be
+# opened fails on its own without stopping the others.
+
+async def upload_firmware_many(binfile, ports, baud, timeout=0.5, progress=None, limit=None):
+
+    plan = binfile if isinstance(binfile, SvlFramePlan) else get_frame_plan(binfile)
+    gate = asyncio.Semaphore(limit or len(ports))
+
+    async def session(port):
+
+        report = None
+        if progress is not None:
+            report = lambda frame, total: progress(port, frame, total)
+
+        async with gate:
+            try:
+                return await upload_firmware_async(plan, port, baud, timeout, progress=report)
+            except serial.SerialException:
+                return False
+
+    results = await asyncio.gather(*(session(port) for port in ports))
+
+    return dict(zip(ports, results))
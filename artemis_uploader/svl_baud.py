@@ -0,0 +1,168 @@
+#-----------------------------------------------------------------------------
+# svl_baud.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file supports the automatic baud rate mode of the SVL uploader.
+#
+# The SVL bootloader detects the baud rate from the timing character, so any
+# of the supported rates can be used - but not every USB serial adapter and
+# cable sustains the highest rate. In auto mode the uploader starts at the
+# highest rate and falls back to a lower one when setup fails or the Artemis
+# keeps asking for frames to be re-sent.
+#
+# The best working rate is remembered per USB adapter (VID, PID and serial
+# number) so the next session starts there.
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import os.path
+import threading
+
+import serial.tools.list_ports as list_ports
+
+from .au_userdirs import user_config_dir, load_json, save_json
+
+# Pass this as the baud rate to select auto mode
+SVL_BAUD_AUTO = 'auto'
+
+# Rates the SVL bootloader supports - highest first
+SVL_BAUD_RATES = (921600, 460800, 115200)
+
+_MEMORY_FILE = "svl_baud.json"
+
+#--------------------------------------------------------------------------------------
+# adapter_key()
+#
+# Identify the adapter behind a serial port. USB adapters are identified by
+# VID/PID/serial number, so the entry follows the adapter if it is plugged into
+# a different USB socket. Anything else is identified by its port name.
+
+def adapter_key(port) -> str:
+
+    for dev in list_ports.comports():
+        if dev.device == port and dev.vid is not None:
+            return "usb:{:04x}:{:04x}:{}".format(dev.vid, dev.pid, dev.serial_number or "")
+
+    return "port:" + str(port)
+
+#--------------------------------------------------------------------------------------
+# candidate_bauds()
+#
+# The rates to try, in order. Starts at the remembered rate if there is one,
+# otherwise at the highest rate.
+
+def candidate_bauds(remembered=None):
+
+    if remembered in SVL_BAUD_RATES:
+        return SVL_BAUD_RATES[SVL_BAUD_RATES.index(remembered):]
+
+    return SVL_BAUD_RATES
+
+def next_lower_baud(baud):
+
+    if baud in SVL_BAUD_RATES:
+        index = SVL_BAUD_RATES.index(baud)
+        if index + 1 < len(SVL_BAUD_RATES):
+            return SVL_BAUD_RATES[index + 1]
+
+    return None
+
+#--------------------------------------------------------------------------------------
+# Persistent best-baud memory, shared by all upload threads
+
+class SvlBaudMemory(object):
+
+    def __init__(self, path=None):
+
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def path(self) -> str:
+        if self._path is None:
+            self._path = os.path.join(user_config_dir(), _MEMORY_FILE)
+        return self._path
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                self._entries = load_json(self.path)
+            except OSError:
+                self._entries = {}
+        return self._entries
+
+    def get(self, key):
+
+        with self._lock:
+            baud = self._load().get(key)
+
+        return baud if baud in SVL_BAUD_RATES else None
+
+    def set(self, key, baud) -> None:
+
+        with self._lock:
+            entries = self._load()
+            if entries.get(key) == baud:
+                return
+            entries[key] = baud
+            try:
+                save_json(self.path, entries)
+            except OSError:
+                # not being able to remember is not an upload failure
+                pass
+
+    def forget(self, key) -> None:
+
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                try:
+                    save_json(self.path, self._entries)
+                except OSError:
+                    pass
+
+_baud_memory = None
+_baud_memory_lock = threading.Lock()
+
+def get_baud_memory() -> SvlBaudMemory:
+
+    global _baud_memory
+
+    with _baud_memory_lock:
+        if _baud_memory is None:
+            _baud_memory = SvlBaudMemory()
+
+    return _baud_memory
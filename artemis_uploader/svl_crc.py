@@ -0,0 +1,241 @@
+#-----------------------------------------------------------------------------
+# svl_crc.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file implements the CRC16 used by the SparkFun Variable Loader (SVL)
+# protocol - polynomial 0x8005, initial value 0, no reflection, no final
+# xor (a.k.a. CRC-16/UMTS).
+#
+# The CRC is computed for every frame sent and every packet received, so it
+# sits on the critical path of an upload. Two backends are provided:
+#
+#    crcmod  - If the optional crcmod package with its C extension is
+#              installed, it is used.
+#
+#    python  - Pure python, using a 16 bit wide table that consumes two bytes
+#              of input per lookup. The wide table is derived from the byte
+#              table ported from the SVL bootloader and is built on first use.
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import sys
+
+# Byte table - ported from the Artemis SVL bootloader
+crcTable = (
+    0x0000, 0x8005, 0x800F, 0x000A, 0x801B, 0x001E, 0x0014, 0x8011,
+    0x8033, 0x0036, 0x003C, 0x8039, 0x0028, 0x802D, 0x8027, 0x0022,
+    0x8063, 0x0066, 0x006C, 0x8069, 0x0078, 0x807D, 0x8077, 0x0072,
+    0x0050, 0x8055, 0x805F, 0x005A, 0x804B, 0x004E, 0x0044, 0x8041,
+    0x80C3, 0x00C6, 0x00CC, 0x80C9, 0x00D8, 0x80DD, 0x80D7, 0x00D2,
+    0x00F0, 0x80F5, 0x80FF, 0x00FA, 0x80EB, 0x00EE, 0x00E4, 0x80E1,
+    0x00A0, 0x80A5, 0x80AF, 0x00AA, 0x80BB, 0x00BE, 0x00B4, 0x80B1,
+    0x8093, 0x0096, 0x009C, 0x8099, 0x0088, 0x808D, 0x8087, 0x0082,
+    0x8183, 0x0186, 0x018C, 0x8189, 0x0198, 0x819D, 0x8197, 0x0192,
+    0x01B0, 0x81B5, 0x81BF, 0x01BA, 0x81AB, 0x01AE, 0x01A4, 0x81A1,
+    0x01E0, 0x81E5, 0x81EF, 0x01EA, 0x81FB, 0x01FE, 0x01F4, 0x81F1,
+    0x81D3, 0x01D6, 0x01DC, 0x81D9, 0x01C8, 0x81CD, 0x81C7, 0x01C2,
+    0x0140, 0x8145, 0x814F, 0x014A, 0x815B, 0x015E, 0x0154, 0x8151,
+    0x8173, 0x0176, 0x017C, 0x8179, 0x0168, 0x816D, 0x8167, 0x0162,
+    0x8123, 0x0126, 0x012C, 0x8129, 0x0138, 0x813D, 0x8137, 0x0132,
+    0x0110, 0x8115, 0x811F, 0x011A, 0x810B, 0x010E, 0x0104, 0x8101,
+    0x8303, 0x0306, 0x030C, 0x8309, 0x0318, 0x831D, 0x8317, 0x0312,
+    0x0330, 0x8335, 0x833F, 0x033A, 0x832B, 0x032E, 0x0324, 0x8321,
+    0x0360, 0x8365, 0x836F, 0x036A, 0x837B, 0x037E, 0x0374, 0x8371,
+    0x8353, 0x0356, 0x035C, 0x8359, 0x0348, 0x834D, 0x8347, 0x0342,
+    0x03C0, 0x83C5, 0x83CF, 0x03CA, 0x83DB, 0x03DE, 0x03D4, 0x83D1,
+    0x83F3, 0x03F6, 0x03FC, 0x83F9, 0x03E8, 0x83ED, 0x83E7, 0x03E2,
+    0x83A3, 0x03A6, 0x03AC, 0x83A9, 0x03B8, 0x83BD, 0x83B7, 0x03B2,
+    0x0390, 0x8395, 0x839F, 0x039A, 0x838B, 0x038E, 0x0384, 0x8381,
+    0x0280, 0x8285, 0x828F, 0x028A, 0x829B, 0x029E, 0x0294, 0x8291,
+    0x82B3, 0x02B6, 0x02BC, 0x82B9, 0x02A8, 0x82AD, 0x82A7, 0x02A2,
+    0x82E3, 0x02E6, 0x02EC, 0x82E9, 0x02F8, 0x82FD, 0x82F7, 0x02F2,
+    0x02D0, 0x82D5, 0x82DF, 0x02DA, 0x82CB, 0x02CE, 0x02C4, 0x82C1,
+    0x8243, 0x0246, 0x024C, 0x8249, 0x0258, 0x825D, 0x8257, 0x0252,
+    0x0270, 0x8275, 0x827F, 0x027A, 0x826B, 0x026E, 0x0264, 0x8261,
+    0x0220, 0x8225, 0x822F, 0x022A, 0x823B, 0x023E, 0x0234, 0x8231,
+    0x8213, 0x0216, 0x021C, 0x8219, 0x0208, 0x820D, 0x8207, 0x0202)
+
+#--------------------------------------------------------------------------------------
+# Pure python backend
+#
+# Feeding two bytes (b0, b1) into the CRC register c is the same as feeding two
+# zero bytes into the register (c ^ (b0 << 8 | b1)) - so one lookup in a 64K
+# entry table replaces two passes of the byte algorithm.
+#
+# The input is read as native 16 bit words via memoryview.cast(), which avoids
+# any copy of the input. On little endian hosts the words arrive byte swapped,
+# so the register is kept byte swapped as well and the table is built to match.
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+_wideTable = None
+
+def _swap16(v):
+    return ((v & 0xFF) << 8) | (v >> 8)
+
+def _build_wide_table():
+
+    global _wideTable
+
+    if _wideTable is not None:
+        return _wideTable
+
+    table = [0] * 0x10000
+    for v in range(0x10000):
+        # shift two zero bytes through the register
+        crc = ((v << 8) & 0xFFFF) ^ crcTable[v >> 8]
+        crc = ((crc << 8) & 0xFFFF) ^ crcTable[crc >> 8]
+        table[v] = crc
+
+    if _LITTLE_ENDIAN:
+        table = [_swap16(table[_swap16(v)]) for v in range(0x10000)]
+
+    _wideTable = table
+    return _wideTable
+
+def _update_bytewise(crc, data):
+
+    for ch in data:
+        crc = ((crc << 8) & 0xFFFF) ^ crcTable[(crc >> 8) ^ ch]
+    return crc
+
+def _crc16_update_python(crc, data):
+
+    mv = memoryview(data)
+    if mv.ndim != 1 or mv.itemsize != 1:
+        mv = mv.cast('B')
+
+    n = len(mv)
+    if n < 16:
+        # the wide table doesn't pay for itself on short payloads
+        return _update_bytewise(crc, mv)
+
+    table = _wideTable if _wideTable is not None else _build_wide_table()
+
+    nEven = n & ~1
+    words = mv[:nEven].cast('H')
+
+    reg = _swap16(crc) if _LITTLE_ENDIAN else crc
+    for w in words:
+        reg = table[reg ^ w]
+    crc = _swap16(reg) if _LITTLE_ENDIAN else reg
+
+    if nEven != n:
+        crc = ((crc << 8) & 0xFFFF) ^ crcTable[(crc >> 8) ^ mv[nEven]]
+
+    return crc
+
+BACKENDS = {'python': _crc16_update_python}
+
+#--------------------------------------------------------------------------------------
+# Optional accelerated backend. Only used if the crcmod C extension is present,
+# the pure python version of crcmod is slower than the wide table above.
+
+try:
+    import crcmod
+    import crcmod._crcfunext
+except ImportError:
+    pass
+else:
+    _crcmodFunc = crcmod.mkCrcFun(0x18005, initCrc=0, rev=False, xorOut=0)
+
+    def _crc16_update_crcmod(crc, data):
+        return _crcmodFunc(data, crc)
+
+    BACKENDS['crcmod'] = _crc16_update_crcmod
+
+_backend = 'crcmod' if 'crcmod' in BACKENDS else 'python'
+_crc16_update = BACKENDS[_backend]
+
+def get_backend():
+    return _backend
+
+def set_backend(name):
+
+    global _backend, _crc16_update
+
+    if name not in BACKENDS:
+        raise ValueError("Unknown CRC16 backend: " + str(name))
+
+    _backend = name
+    _crc16_update = BACKENDS[name]
+
+#--------------------------------------------------------------------------------------
+# crc16()
+#
+# One shot CRC of a bytes like object. Pass the CRC of earlier data in crc
+# to continue a computation.
+
+def crc16(data, crc=0):
+    return _crc16_update(crc, data)
+
+#--------------------------------------------------------------------------------------
+# Incremental CRC, modeled on the hashlib interface
+#
+#   crc = Crc16()
+#   crc.update(header)
+#   crc.update(payload)
+#   packet_tail = crc.digest()     # 2 bytes, big endian - as sent on the wire
+#
+
+class Crc16(object):
+
+    digest_size = 2
+
+    __slots__ = ('_crc',)
+
+    def __init__(self, data=None):
+        self._crc = 0
+        if data:
+            self._crc = _crc16_update(0, data)
+
+    def update(self, data):
+        self._crc = _crc16_update(self._crc, data)
+
+    @property
+    def value(self) -> int:
+        return self._crc
+
+    def digest(self) -> bytes:
+        return self._crc.to_bytes(2, 'big')
+
+    def hexdigest(self) -> str:
+        return '{:04x}'.format(self._crc)
+
+    def copy(self):
+        other = Crc16()
+        other._crc = self._crc
+        return other
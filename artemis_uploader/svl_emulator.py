@@ -0,0 +1,439 @@
+#-----------------------------------------------------------------------------
+# svl_emulator.py
+#
+#------------------------------------------------------------------------
+#
+# Written/Update by  SparkFun Electronics, Fall 2022
+#
+# This python package implements a GUI Qt application that supports
+# firmware and bootloader uploading to the SparkFun Artemis module
+#
+# This file implements a software emulator of the device side of the SparkFun
+# Variable Loader (SVL) protocol, on a Linux/macOS pseudo terminal (pty). The
+# uploader opens the pty like any other serial port, so upload_firmware() runs
+# unmodified against it - no Artemis board required.
+#
+# Emulated:
+#
+#    - reset to bootloader latency and optional startup noise
+#    - baud rate detection from the 'U' timing character, with an optional
+#      highest rate the "cable" sustains
+#    - the version packet, BL entry and the NEXT/RETRY/DONE frame loop
+#    - per frame processing delay, flash page write latency and wire time
+#      at the baud rate the host configured
+#    - CRC error injection - frames are answered with RETRY at a set rate
+#
+# A pty carries no DTR/RTS. Opening the port resets a real board, so the
+# emulator watches for the host opening the pty instead - on Linux the master
+# side reads EIO while no one has the slave open.
+#
+# Use in a test:
+#
+#    @pytest.fixture
+#    def svl_device():
+#        with emulated_svl_device(crc_error_rate=0.01) as device:
+#            yield device
+#
+#    def test_upload(svl_device):
+#        assert upload_firmware("Blink.bin", svl_device.port, 921600)
+#        assert svl_device.wait_for_image() == open("Blink.bin", "rb").read()
+#
+# Or standalone, then point the uploader at the printed port:
+#
+#    python -m artemis_uploader.svl_emulator --frame-delay 0.002
+#
+# More information on qwiic is at https://www.sparkfun.com/artemis
+#
+# Do you like this library? Help support SparkFun. Buy a board!
+#
+#==================================================================================
+# Copyright (c) 2022 SparkFun Electronics
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#==================================================================================
+#
+# pylint: disable=old-style-class, missing-docstring, wrong-import-position
+#
+#-----------------------------------------------------------------------------
+import argparse
+import contextlib
+import os
+import random
+import select
+import threading
+import time
+
+# pty support is POSIX only - the import fails cleanly elsewhere
+import termios
+import tty
+
+from .artemis_svl import encode_packet, SVL_CMD_VER, SVL_CMD_BL, SVL_CMD_NEXT, \
+    SVL_CMD_FRAME, SVL_CMD_RETRY, SVL_CMD_DONE, SVL_MAX_PAYLOAD
+from .svl_crc import crc16
+
+#--------------------------------------------------------------------------------------
+# Emulator states
+
+_STATE_DETECT = 0       # out of reset, waiting for the baud detection character
+_STATE_WAIT_BL = 1      # version sent, waiting for the enter bootloader command
+_STATE_BOOTLOAD = 2     # receiving frames
+
+# termios speed constant -> baud rate
+_TERMIOS_BAUD = {}
+for _rate in (9600, 19200, 38400, 57600, 115200, 230400, 460800, 500000, 576000,
+              921600, 1000000, 1152000, 1500000, 2000000, 3000000):
+    _const = getattr(termios, 'B' + str(_rate), None)
+    if _const is not None:
+        _TERMIOS_BAUD[_const] = _rate
+
+#--------------------------------------------------------------------------------------
+class SvlEmulator(object):
+
+    def __init__(self, version=5, boot_latency=0.095, frame_delay=0.0, flash_latency=0.0,
+                 flash_page_size=8192, crc_error_rate=0.0, max_baud=None, startup_noise=b'',
+                 simulate_wire=True, idle_timeout=0.5, seed=None):
+
+        self.version = version
+        self.boot_latency = boot_latency        # reset until the bootloader listens
+        self.frame_delay = frame_delay          # processing time per frame
+        self.flash_latency = flash_latency      # time to write one flash page
+        self.flash_page_size = flash_page_size
+        self.crc_error_rate = crc_error_rate    # fraction of good frames answered with RETRY
+        self.max_baud = max_baud                # baud detection fails above this rate
+        self.startup_noise = startup_noise      # bytes sent as the board comes out of reset
+        self.simulate_wire = simulate_wire      # add the serial transfer time at the host's baud rate
+        self.idle_timeout = idle_timeout        # bootloader gives up on a silent host
+
+        self._random = random.Random(seed)
+
+        self._master = None
+        self._port = None
+        self._host_open = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._image_done = threading.Condition(self._lock)
+
+        # results - read these from the test
+        self.images = []            # every completed upload, in order
+        self.frames_received = 0
+        self.retries_sent = 0
+        self.resets = 0             # host port opens
+        self.detected_bauds = []
+        self.host_turnaround = []   # seconds from NEXT/RETRY sent to the first byte of the reply
+
+        self._reset_session(0)
+
+    #------------------------------------------------------
+    @property
+    def port(self) -> str:
+        return self._port
+
+    @property
+    def last_image(self):
+        with self._lock:
+            return self.images[-1] if self.images else None
+
+    # The host doesn't wait for the device to handle DONE - wait here until
+    # image number count (1 based) has arrived. Returns the image or None.
+    def wait_for_image(self, count=1, timeout=2.0):
+
+        with self._image_done:
+            if not self._image_done.wait_for(lambda: len(self.images) >= count, timeout):
+                return None
+            return self.images[count - 1]
+
+    #------------------------------------------------------
+    def start(self):
+
+        self._master, slave = os.openpty()
+        self._port = os.ttyname(slave)
+
+        # raw, like a real serial port - then let go of it, so the host opening
+        # and closing the port can be seen from the master side
+        tty.setraw(slave)
+        os.close(slave)
+        self._host_open = False
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="svl-emulator", daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._master is not None:
+            os.close(self._master)
+        self._master = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    #------------------------------------------------------
+    def _host_baud(self):
+
+        # on the master side the settings of the slave are reported
+        try:
+            return _TERMIOS_BAUD.get(termios.tcgetattr(self._master)[4])
+        except termios.error:
+            return None
+
+    def _wire_delay(self, num_bytes):
+
+        # 10 bits per byte on the line - 8N1
+        if self.simulate_wire:
+            baud = self._host_baud()
+            if baud:
+                time.sleep(num_bytes * 10.0 / baud)
+
+    def _send(self, data):
+
+        self._wire_delay(len(data))
+        try:
+            os.write(self._master, data)
+        except OSError:
+            pass        # host went away
+        self._last_activity = time.monotonic()
+
+    def _send_packet(self, cmd, data=b''):
+        self._send(encode_packet(cmd, data))
+
+    #------------------------------------------------------
+    def _reset_session(self, now):
+
+        self._state = _STATE_DETECT
+        self._requested_at = None
+        self._buffer = bytearray()
+        self._image = bytearray()
+        self._unflashed = 0
+        self._listen_at = now + self.boot_latency
+        self._last_activity = now
+
+    def _power_on(self, now):
+
+        self.resets += 1
+        self._reset_session(now)
+        if self.startup_noise:
+            self._send(self.startup_noise)
+
+    #------------------------------------------------------
+    def _run(self):
+
+        while not self._stop.is_set():
+
+            ready, _, _ = select.select([self._master], [], [], 0.02)
+            now = time.monotonic()
+
+            if not ready:
+                # the real bootloader gives up on a silent host
+                if self._state != _STATE_DETECT and now - self._last_activity > self.idle_timeout:
+                    self._reset_session(now)
+                    self._listen_at = float('inf')
+                continue
+
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                # EIO - the host doesn't have the port open
+                self._host_open = False
+                time.sleep(0.005)
+                continue
+
+            if not self._host_open:
+                self._host_open = True
+                self._power_on(now)
+            self._last_activity = now
+
+            self._receive(data, now)
+
+    def _receive(self, data, now):
+
+        if self._state == _STATE_DETECT:
+
+            if b'U' not in data or now < self._listen_at:
+                return
+
+            baud = self._host_baud()
+            if self.max_baud is not None and baud is not None and baud > self.max_baud:
+                return      # the timing character is garbled at this rate
+
+            self.detected_bauds.append(baud)
+            self._send_packet(SVL_CMD_VER, bytes((self.version,)))
+
+            # anything that arrived with the timing character is lost while the
+            # UART is set up
+            self._state = _STATE_WAIT_BL
+            return
+
+        if self._requested_at is not None and not self._buffer:
+            self.host_turnaround.append(now - self._requested_at)
+            self._requested_at = None
+
+        self._buffer += data
+
+        while len(self._buffer) >= 2:
+
+            length = (self._buffer[0] << 8) | self._buffer[1]
+            if length < 3 or length > SVL_MAX_PAYLOAD:
+                # can't frame this - ask for the frame again
+                self._buffer.clear()
+                if self._state == _STATE_BOOTLOAD:
+                    self._retry()
+                return
+
+            if len(self._buffer) < 2 + length:
+                return
+
+            payload = bytes(self._buffer[2:2 + length])
+            del self._buffer[:2 + length]
+
+            self._wire_delay(2 + length)
+            self._handle_packet(payload)
+
+    def _retry(self):
+
+        self.retries_sent += 1
+        self._send_packet(SVL_CMD_RETRY)
+        self._requested_at = time.monotonic()
+
+    def _handle_packet(self, payload):
+
+        cmd = payload[0]
+        crc_ok = crc16(payload) == 0
+
+        if self._state == _STATE_WAIT_BL:
+            if crc_ok and cmd == SVL_CMD_BL:
+                self._state = _STATE_BOOTLOAD
+                self._send_packet(SVL_CMD_NEXT)
+                self._requested_at = time.monotonic()
+            return
+
+        # bootload state
+        if not crc_ok:
+            self._retry()
+            return
+
+        if cmd == SVL_CMD_FRAME:
+
+            if self.crc_error_rate and self._random.random() < self.crc_error_rate:
+                self._retry()
+                return
+
+            if self.frame_delay:
+                time.sleep(self.frame_delay)
+
+            frame = payload[1:-2]
+            self._image += frame
+            self.frames_received += 1
+
+            self._unflashed += len(frame)
+            while self._unflashed >= self.flash_page_size:
+                self._unflashed -= self.flash_page_size
+                if self.flash_latency:
+                    time.sleep(self.flash_latency)
+
+            self._send_packet(SVL_CMD_NEXT)
+            self._requested_at = time.monotonic()
+
+        elif cmd == SVL_CMD_DONE:
+
+            if self._unflashed and self.flash_latency:
+                time.sleep(self.flash_latency)
+
+            with self._image_done:
+                self.images.append(bytes(self._image))
+                self._image_done.notify_all()
+
+            # the bootloader jumps to the new application
+            self._reset_session(time.monotonic())
+            self._listen_at = float('inf')
+
+#--------------------------------------------------------------------------------------
+# emulated_svl_device()
+#
+# Context manager that runs an emulator for the duration of a with block - the
+# body of a pytest fixture.
+
+@contextlib.contextmanager
+def emulated_svl_device(**kwargs):
+
+    emulator = SvlEmulator(**kwargs)
+    emulator.start()
+    try:
+        yield emulator
+    finally:
+        emulator.stop()
+
+#--------------------------------------------------------------------------------------
+def main():
+
+    parser = argparse.ArgumentParser(description='SparkFun Variable Loader (SVL) device emulator')
+
+    parser.add_argument('--bl-version', dest='version', type=int, default=5,
+                        help='Bootloader version to report (default 5)')
+    parser.add_argument('--boot-latency', dest='boot_latency', type=float, default=0.095,
+                        help='Seconds from reset until the bootloader listens (default 0.095)')
+    parser.add_argument('--frame-delay', dest='frame_delay', type=float, default=0.0,
+                        help='Processing time per frame in seconds')
+    parser.add_argument('--flash-latency', dest='flash_latency', type=float, default=0.0,
+                        help='Time to write one flash page in seconds')
+    parser.add_argument('--crc-error-rate', dest='crc_error_rate', type=float, default=0.0,
+                        help='Fraction of frames answered with RETRY (0.0 - 1.0)')
+    parser.add_argument('--max-baud', dest='max_baud', type=int, default=None,
+                        help='Highest baud rate the emulated link sustains')
+    parser.add_argument('--no-wire', dest='simulate_wire', action='store_false',
+                        help='Don\'t add serial transfer time')
+    parser.add_argument('-o', dest='output', default=None,
+                        help='Write each received image to this file')
+
+    args = parser.parse_args()
+
+    emulator = SvlEmulator(version=args.version, boot_latency=args.boot_latency,
+                           frame_delay=args.frame_delay, flash_latency=args.flash_latency,
+                           crc_error_rate=args.crc_error_rate, max_baud=args.max_baud,
+                           simulate_wire=args.simulate_wire)
+
+    with emulator:
+        print("SVL emulator listening on " + emulator.port, flush=True)
+        count = 0
+        try:
+            while True:
+                time.sleep(0.2)
+                if len(emulator.images) != count:
+                    count = len(emulator.images)
+                    image = emulator.images[-1]
+                    print("Received image #{} - {} bytes, {} retries so far".format(
+                        count, len(image), emulator.retries_sent), flush=True)
+                    if args.output:
+                        with open(args.output, 'wb') as f:
+                            f.write(image)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# bench_asb_data_path.py
+#
+#------------------------------------------------------------------------
+#
+# Allocation benchmark for the data path of the ASB wired update.
+#
+# Sends a wired update image - UPDATE crc and DATA messages, block by block as
+# AsbSession.connect_device() does - to /dev/null two ways:
+#
+#    - legacy: the original connect_device()/send_command() code (copied
+#      below) - a slice of the image per chunk, a new header, header + chunk,
+#      and the crc and message written separately
+#    - vectored: memoryview slices of the image, WireCodec.data_header() with
+#      the crc carried over header and chunk, and one write_parts() per message
+#
+# and reports, per DATA message:
+#
+#    - new memory blocks alive at the moment the message is written, their
+#      size, and how many of them are copies of image data (1 KB or more)
+#      (tracemalloc)
+#    - peak memory allocated while the whole image is sent (tracemalloc)
+#    - time per message, without tracing
+#
+# Usage (from the repository root):
+#
+#    python benchmarks/bench_asb_data_path.py [-n repeat] [-s size_kb]
+#
+#-----------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from serial.serialutil import to_bytes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from artemis_uploader.asb.am_defines import crc32, fill_word, int_to_bytes, AM_WU_IMAGEHDR_SIZE, \
+    AM_MAX_UART_MSG_SIZE, AM_SECBOOT_WIRED_MSGTYPE_DATA, AM_SECBOOT_WIRED_MSGTYPE_UPDATE, \
+    MAX_DOWNLOAD_SIZE
+from artemis_uploader.asb.wire_codec import WireCodec, write_parts, MAX_DATA_CHUNK
+
+#--------------------------------------------------------------------------------------
+# A port that writes to /dev/null - with a file descriptor, like pySerial on POSIX
+class NullPort(object):
+
+    def __init__(self):
+        self._fd = os.open(os.devnull, os.O_WRONLY)
+
+    def fileno(self):
+        return self._fd
+
+    # converts like pySerial's write does
+    def write(self, data):
+        return os.write(self._fd, to_bytes(data))
+
+    def close(self):
+        os.close(self._fd)
+
+# blocks this large hold image data
+_COPY_SIZE = 1024
+
+# the snapshots' own allocations don't count
+_NOT_TRACEMALLOC = (tracemalloc.Filter(False, tracemalloc.__file__),)
+
+#--------------------------------------------------------------------------------------
+# Called just before each DATA message is written
+class Probe(object):
+
+    def __init__(self, trace):
+
+        self.trace = trace
+        self.messages = 0
+        self.blocks = 0
+        self.bytes = 0
+        self.copies = 0
+        self._baseline = None
+
+    def start(self):
+        if self.trace:
+            self._baseline = tracemalloc.take_snapshot().filter_traces(_NOT_TRACEMALLOC)
+
+    def __call__(self):
+
+        self.messages += 1
+        if not self.trace:
+            return
+
+        # whatever is newly allocated and still alive here is an intermediate
+        snapshot = tracemalloc.take_snapshot().filter_traces(_NOT_TRACEMALLOC)
+        for stat in snapshot.compare_to(self._baseline, 'lineno'):
+            if stat.size_diff > 0 and stat.count_diff > 0:
+                self.blocks += stat.count_diff
+                self.bytes += stat.size_diff
+                if stat.size_diff // stat.count_diff >= _COPY_SIZE:
+                    self.copies += stat.count_diff
+
+#--------------------------------------------------------------------------------------
+# The data path as originally shipped in asb.py - the reference
+def legacy_path(application):
+    return lambda ser, probe: legacy_send(application, ser, probe)
+
+def legacy_send(application, ser, probe):
+
+    totalLen = len(application)
+    maxUpdateSize = AM_WU_IMAGEHDR_SIZE + MAX_DOWNLOAD_SIZE
+    numUpdates = (totalLen + maxUpdateSize - 1) // maxUpdateSize
+
+    end = totalLen
+    for numUpdates in range(numUpdates, 0 , -1):
+        start = (numUpdates-1)*maxUpdateSize
+        crc = crc32(application[start:end])
+        applen = end - start
+        end = end - applen
+
+        update = bytearray([0x00]*16);
+        fill_word(update, 0, ((20 << 16) | AM_SECBOOT_WIRED_MSGTYPE_UPDATE))
+        fill_word(update, 4, applen)
+        fill_word(update, 8, crc)
+        # Size = 0 => We're not piggybacking any data to IMAGE command
+        fill_word(update, 12, 0)
+
+        ser.write(int_to_bytes(crc32(update)))
+        ser.write(update)
+
+        maxChunkSize = AM_MAX_UART_MSG_SIZE - 12
+        for x in range(0, applen, maxChunkSize):
+            if ((x + maxChunkSize) > applen):
+                chunk = application[start+x:start+applen]
+            else:
+                chunk = application[start+x:start+x+maxChunkSize]
+
+            chunklen = len(chunk)
+
+            dataMsg = bytearray([0x00]*8);
+            fill_word(dataMsg, 0, (((chunklen + 12) << 16) | AM_SECBOOT_WIRED_MSGTYPE_DATA))
+            fill_word(dataMsg, 4, x)
+
+            params = dataMsg + chunk
+            crc = crc32(params)
+            probe()
+            ser.write(int_to_bytes(crc))
+            ser.write(params)
+
+# The data path of AsbSession.connect_device() - the codec is set up once per session
+def vectored_path(image):
+
+    codec = WireCodec()
+    application = memoryview(image)
+    return lambda ser, probe: vectored_send(codec, application, ser, probe)
+
+def vectored_send(codec, application, ser, probe):
+
+    totalLen = len(application)
+    maxUpdateSize = AM_WU_IMAGEHDR_SIZE + MAX_DOWNLOAD_SIZE
+    numUpdates = (totalLen + maxUpdateSize - 1) // maxUpdateSize
+
+    end = totalLen
+    for numUpdates in range(numUpdates, 0 , -1):
+        start = (numUpdates-1)*maxUpdateSize
+        crc = crc32(application[start:end])
+        applen = end - start
+        end = end - applen
+
+        ser.write(codec.update(applen, crc))
+
+        for x in range(0, applen, MAX_DATA_CHUNK):
+            chunk = application[start + x:start + min(x + MAX_DATA_CHUNK, applen)]
+
+            header = codec.data_header(x, chunk)
+            probe()
+            write_parts(ser, (header, chunk))
+
+#--------------------------------------------------------------------------------------
+def measure(path, image, repeat):
+
+    port = NullPort()
+    try:
+        # allocations - one traced run
+        probe = Probe(trace=True)
+        tracemalloc.start()
+        send = path(image)
+        probe.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        send(port, probe)
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+
+        # time - untraced
+        best = None
+        for _ in range(repeat):
+            counter = Probe(trace=False)
+            t0 = time.perf_counter()
+            send(port, counter)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        port.close()
+
+    return {
+        'messages': probe.messages,
+        'blocks': probe.blocks / probe.messages,
+        'bytes': probe.bytes / probe.messages,
+        'copies': probe.copies / probe.messages,
+        'peak': peak,
+        'us': best / counter.messages * 1e6,
+    }
+
+#--------------------------------------------------------------------------------------
+def main():
+
+    parser = argparse.ArgumentParser(description='ASB wired update data path allocation benchmark')
+    parser.add_argument('-n', dest='repeat', type=int, default=20, help='timed repetitions (best is kept)')
+    parser.add_argument('-s', dest='size_kb', type=int, default=600, help='image size in KB')
+    args = parser.parse_args()
+
+    # deterministic, non-trivial content
+    image = bytes((i * 131 + (i >> 8)) & 0xFF for i in range(args.size_kb * 1024))
+
+    print("{} KB image, {} byte DATA chunks\n".format(args.size_kb, MAX_DATA_CHUNK))
+    print("{:<10} {:>9} {:>15} {:>15} {:>15} {:>12} {:>11}".format(
+        'path', 'messages', 'blocks/message', 'bytes/message', 'copies/message', 'peak bytes',
+        'us/message'))
+
+    for name, path in (('legacy', legacy_path), ('vectored', vectored_path)):
+        r = measure(path, image, args.repeat)
+        print("{:<10} {:>9} {:>15.1f} {:>15.0f} {:>15.1f} {:>12} {:>11.1f}".format(
+            name, r['messages'], r['blocks'], r['bytes'], r['copies'], r['peak'], r['us']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# bench_console.py
+#
+#------------------------------------------------------------------------
+#
+# GUI console benchmark - runs Qt offscreen, no display needed.
+#
+# Floods the messages window with synthetic worker output - the fragments a
+# verbose upload prints, a few per frame - two ways:
+#
+#    - legacy: the original MainWindow.log_message() (copied below) - move
+#      the cursor, insert, scroll and repaint the window for every fragment
+#    - batched: AUxConsole - fragments are buffered and appended at most
+#      CONSOLE_FLUSH_HZ times a second, the widget keeps CONSOLE_MAX_LINES
+#
+# The fragments arrive in bursts, with the Qt event loop run in between, as
+# the worker's queued signals would - all at once, or spread over -t seconds
+# like a real upload. Reported for each:
+#
+#    - GUI thread CPU time, total and per fragment
+#    - wall time until the last fragment is on screen
+#    - inserts into the text widget
+#    - lines retained by the widget
+#
+# Usage (from the repository root):
+#
+#    python benchmarks/bench_console.py [-f frames] [-b burst] [-t seconds]
+#
+#-----------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt5.QtWidgets import QApplication, QPlainTextEdit, QVBoxLayout, QWidget
+from PyQt5.QtGui import QTextCursor
+
+from artemis_uploader.au_console import AUxConsole, CONSOLE_FLUSH_HZ, CONSOLE_MAX_LINES
+
+#--------------------------------------------------------------------------------------
+# What a verbose firmware upload sends the console - per frame
+def make_fragments(frames):
+
+    fragments = []
+    for frame in range(1, frames + 1):
+        fragments.append('\tSending frame #' + str(frame) + ', length: 2048')
+        fragments.append('\n')
+        if frame % 50 == 0:
+            fragments.append('\t\tRetrying...')
+            fragments.append('\n')
+    return fragments
+
+#--------------------------------------------------------------------------------------
+# The messages window, as in MainWindow
+class Window(QWidget):
+
+    def __init__(self):
+
+        super().__init__()
+        self.messages = QPlainTextEdit()
+        self.messages.setReadOnly(True)
+        layout = QVBoxLayout()
+        layout.addWidget(self.messages)
+        self.setLayout(layout)
+        self.resize(600, 400)
+        self.show()
+
+# MainWindow.log_message() as originally shipped - the reference
+class LegacyConsole(object):
+
+    def __init__(self, window):
+
+        self.window = window
+        self.messages = window.messages
+        self.inserts = 0
+
+    def write(self, msg):
+
+        self.messages.moveCursor(QTextCursor.End)
+
+        # Backspace ("\b")??
+        tmp = msg
+        while len(tmp) > 2 and tmp.startswith('\b'):
+            tmp = tmp[1:]
+            self.messages.textCursor().deletePreviousChar()
+            self.messages.moveCursor(QTextCursor.End)
+
+        self.messages.insertPlainText(tmp)
+        self.inserts += 1
+
+        self.messages.moveCursor(QTextCursor.End)
+        self.messages.ensureCursorVisible()
+
+        self.window.repaint()
+
+    @property
+    def pending(self):
+        return False
+
+# AUxConsole, counting its inserts
+class BatchedConsole(AUxConsole):
+
+    def __init__(self, window):
+
+        super().__init__(window.messages)
+        self.inserts = 0
+
+    def flush(self):
+
+        if self.pending:
+            self.inserts += 1
+        super().flush()
+
+#--------------------------------------------------------------------------------------
+def measure(app, console_class, fragments, burst, seconds):
+
+    window = Window()
+    console = console_class(window)
+    app.processEvents()
+
+    wall0 = time.perf_counter()
+    cpu0 = time.thread_time()
+
+    bursts = range(0, len(fragments), burst)
+    pause = seconds / len(bursts)
+
+    for start in bursts:
+        for fragment in fragments[start:start + burst]:
+            console.write(fragment)
+        app.processEvents()
+        if pause:
+            time.sleep(pause)
+
+    # until the last fragment is in the widget
+    while console.pending:
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+
+    result = {
+        'cpu_ms': (time.thread_time() - cpu0) * 1000,
+        'wall_ms': (time.perf_counter() - wall0) * 1000,
+        'inserts': console.inserts,
+        'lines': window.messages.document().blockCount(),
+    }
+    result['us'] = result['cpu_ms'] * 1000 / len(fragments)
+
+    window.close()
+    return result
+
+#--------------------------------------------------------------------------------------
+def main():
+
+    parser = argparse.ArgumentParser(description='GUI console benchmark (offscreen Qt)')
+    parser.add_argument('-f', dest='frames', type=int, default=6000, help='frames of verbose output')
+    parser.add_argument('-b', dest='burst', type=int, default=20, help='fragments per event loop pass')
+    parser.add_argument('-t', dest='seconds', type=float, default=0.0,
+                        help='spread the fragments over this many seconds (default 0 - a flood)')
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    fragments = make_fragments(args.frames)
+
+    print("{} fragments, bursts of {}, flush at {} Hz, {} lines kept\n".format(
+        len(fragments), args.burst, CONSOLE_FLUSH_HZ, CONSOLE_MAX_LINES))
+    print("{:<10} {:>12} {:>14} {:>12} {:>10} {:>8}".format(
+        'console', 'GUI cpu ms', 'us/fragment', 'wall ms', 'inserts', 'lines'))
+
+    for name, console_class in (('legacy', LegacyConsole), ('batched', BatchedConsole)):
+        r = measure(app, console_class, fragments, args.burst, args.seconds)
+        print("{:<10} {:>12.1f} {:>14.1f} {:>12.1f} {:>10} {:>8}".format(
+            name, r['cpu_ms'], r['us'], r['wall_ms'], r['inserts'], r['lines']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# bench_crc16.py
+#
+#------------------------------------------------------------------------
+#
+# Micro benchmark for the SVL CRC16.
+#
+# Compares the original byte at a time get_crc16() (copied below) with the
+# backends in artemis_uploader.svl_crc on:
+#
+#    - examples/Blink.bin
+#    - a generated 900 KB image
+#
+# Each image is timed both as a single buffer and as the sequence of 2 KB
+# frames that phase_bootload() sends.
+#
+# Usage (from the repository root):
+#
+#    python benchmarks/bench_crc16.py [-n repeat]
+#
+#-----------------------------------------------------------------------------
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from artemis_uploader import svl_crc
+
+_FRAME_SIZE = 512*4
+
+#--------------------------------------------------------------------------------------
+# The CRC routine as originally shipped in artemis_svl.py - the reference
+def legacy_get_crc16(data):
+
+    crcTable = svl_crc.crcTable
+    crc = 0x0000
+    data = bytearray(data)
+    for ch in data:
+        tableAddr = ch ^ (crc >> 8)
+        CRCH = (crcTable[tableAddr] >> 8) ^ (crc & 0xFF)
+        CRCL = crcTable[tableAddr] & 0x00FF
+        crc = CRCH << 8 | CRCL
+    return crc
+
+#--------------------------------------------------------------------------------------
+def load_images():
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, '..', 'examples', 'Blink.bin'), 'rb') as f:
+        blink = f.read()
+
+    # deterministic, non-trivial content
+    big = bytes((i * 131 + (i >> 8)) & 0xFF for i in range(900*1024))
+
+    return [('Blink.bin', blink), ('900KB image', big)]
+
+def time_call(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+def main():
+
+    parser = argparse.ArgumentParser(description='SVL CRC16 micro benchmark')
+    parser.add_argument('-n', dest='repeat', type=int, default=5,
+                        help='Number of repeats, the best time is reported (default 5)')
+    args = parser.parse_args()
+
+    images = load_images()
+
+    # build the wide table outside of the timed region
+    svl_crc._build_wide_table()
+
+    print("CRC16 backends available: " + ", ".join(sorted(svl_crc.BACKENDS.keys())))
+    print("")
+
+    for name, image in images:
+
+        frames = [image[i:i + _FRAME_SIZE] for i in range(0, len(image), _FRAME_SIZE)]
+        expected = legacy_get_crc16(image)
+
+        print("{} - {} bytes, {} frames".format(name, len(image), len(frames)))
+
+        candidates = [('legacy', legacy_get_crc16)]
+        for backend in sorted(svl_crc.BACKENDS.keys()):
+            func = svl_crc.BACKENDS[backend]
+            candidates.append((backend, lambda d, f=func: f(0, d)))
+
+        base_whole = None
+        for label, func in candidates:
+
+            if func(image) != expected:
+                print("  {:8s} CRC MISMATCH".format(label))
+                continue
+
+            whole = time_call(lambda: func(image), args.repeat)
+            framed = time_call(lambda: [func(fr) for fr in frames], args.repeat)
+            if base_whole is None:
+                base_whole, base_framed = whole, framed
+
+            print("  {:8s} image {:9.3f} ms  frames {:9.3f} ms  ({:6.3f} us/frame)  x{:.1f}".format(
+                label, whole*1000, framed*1000, framed*1e6/len(frames), base_framed/framed))
+        print("")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# bench_svl_throughput.py
+#
+#------------------------------------------------------------------------
+#
+# SVL upload throughput benchmark.
+#
+# Runs upload_firmware() against the pty SVL emulator over a matrix of:
+#
+#    - image sizes
+#    - baud rates
+#    - injected CRC error rates
+#
+# and reports, for each case:
+#
+#    - wall time of upload_firmware()
+#    - effective bytes per second (image size / wall time)
+#    - host turnaround per frame - the time from the emulator sending NEXT or
+#      RETRY to the first byte of the host's reply. This is the host side of
+#      phase_bootload() and doesn't depend on the emulated link speed.
+#    - retries
+#
+# The results are written as JSON. With --compare the results are checked
+# against a baseline (benchmarks/baselines/svl_throughput.json by default) and
+# the script exits with status 1 if any case regressed by more than the
+# tolerance. --update-baseline writes the results as the new baseline.
+#
+# Usage (from the repository root, Linux):
+#
+#    python benchmarks/bench_svl_throughput.py --compare
+#    python benchmarks/bench_svl_throughput.py --quick --compare
+#    python benchmarks/bench_svl_throughput.py --update-baseline
+#
+#-----------------------------------------------------------------------------
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from artemis_uploader.artemis_svl import upload_firmware, SvlIoStats
+from artemis_uploader.svl_emulator import emulated_svl_device
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_BASELINE = os.path.join(_HERE, 'baselines', 'svl_throughput.json')
+
+SIZES = (16*1024, 64*1024)
+BAUDS = (115200, 921600)
+ERROR_RATES = (0.0, 0.05)
+
+# a case regresses when it is this much slower than the baseline
+_TOLERANCE = 0.25
+
+# turnaround differences below this are timer noise, not regressions
+_TURNAROUND_FLOOR = 0.0002
+
+#--------------------------------------------------------------------------------------
+def case_key(size, baud, error_rate):
+    return "size={} baud={} err={}".format(size, baud, error_rate)
+
+def make_image(size):
+    # deterministic, non-trivial content
+    return bytes((i * 131 + (i >> 8)) & 0xFF for i in range(size))
+
+def run_case(path, image, baud, error_rate, repeat):
+
+    runs = []
+
+    for n in range(repeat):
+
+        with emulated_svl_device(crc_error_rate=error_rate, seed=n) as device:
+
+            stats = SvlIoStats()
+            output = io.StringIO()
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(output):
+                ok = upload_firmware(path, device.port, baud, stats=stats)
+            wall = time.perf_counter() - start
+
+            if not ok or device.wait_for_image() != image:
+                raise RuntimeError("upload at {} baud failed:\n{}".format(baud, output.getvalue()))
+
+            turnaround = device.host_turnaround[1:]     # the first one waits for the plan
+            runs.append({
+                'wall_s': wall,
+                'bytes_per_s': len(image) / wall,
+                'turnaround_s': statistics.median(turnaround) if turnaround else 0.0,
+                'retries': stats.retries,
+            })
+
+    # best wall time, median turnaround - both are stable against a busy machine
+    best = min(runs, key=lambda r: r['wall_s'])
+    return {
+        'wall_s': round(best['wall_s'], 4),
+        'bytes_per_s': round(best['bytes_per_s'], 1),
+        'turnaround_us': round(statistics.median(r['turnaround_s'] for r in runs) * 1e6, 1),
+        'retries': max(r['retries'] for r in runs),
+    }
+
+#--------------------------------------------------------------------------------------
+def compare(results, baseline, tolerance):
+
+    failures = []
+
+    for key, result in sorted(results.items()):
+
+        base = baseline.get(key)
+        if base is None:
+            print("  {:36s} no baseline".format(key))
+            continue
+
+        wall_limit = base['wall_s'] * (1 + tolerance)
+        turn_limit = max(base['turnaround_us'] * (1 + tolerance),
+                         base['turnaround_us'] + _TURNAROUND_FLOOR * 1e6)
+
+        problems = []
+        if result['wall_s'] > wall_limit:
+            problems.append("wall {:.3f}s > {:.3f}s".format(result['wall_s'], wall_limit))
+        if result['turnaround_us'] > turn_limit:
+            problems.append("turnaround {:.1f}us > {:.1f}us".format(result['turnaround_us'], turn_limit))
+
+        status = "REGRESSION " + ", ".join(problems) if problems else "ok"
+        print("  {:36s} {}".format(key, status))
+        if problems:
+            failures.append(key)
+
+    return failures
+
+def main():
+
+    parser = argparse.ArgumentParser(description='SVL upload throughput benchmark')
+    parser.add_argument('-n', dest='repeat', type=int, default=3,
+                        help='Uploads per case, the best wall time is reported (default 3)')
+    parser.add_argument('--quick', action='store_true',
+                        help='Only the smallest image at the highest baud rate')
+    parser.add_argument('-o', dest='output', default=None,
+                        help='Write the results to this JSON file')
+    parser.add_argument('--compare', action='store_true',
+                        help='Compare with the baseline, exit with status 1 on a regression')
+    parser.add_argument('--baseline', default=_BASELINE,
+                        help='Baseline file (default benchmarks/baselines/svl_throughput.json)')
+    parser.add_argument('--tolerance', type=float, default=_TOLERANCE,
+                        help='Allowed slow down before a case fails (default 0.25)')
+    parser.add_argument('--update-baseline', dest='update', action='store_true',
+                        help='Write the results as the new baseline')
+    args = parser.parse_args()
+
+    sizes, bauds = (SIZES[:1], BAUDS[-1:]) if args.quick else (SIZES, BAUDS)
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        # keep the auto baud memory and any caches out of the user's directories
+        os.environ['ARTEMIS_UPLOADER_HOME'] = tmp
+
+        for size in sizes:
+
+            image = make_image(size)
+            path = os.path.join(tmp, 'image_{}.bin'.format(size))
+            with open(path, 'wb') as f:
+                f.write(image)
+
+            for baud in bauds:
+                for error_rate in ERROR_RATES:
+
+                    key = case_key(size, baud, error_rate)
+                    result = run_case(path, image, baud, error_rate, args.repeat)
+                    results[key] = result
+
+                    print("{:36s} {:8.3f} s {:10.1f} B/s  turnaround {:8.1f} us  {:3d} retries".format(
+                        key, result['wall_s'], result['bytes_per_s'],
+                        result['turnaround_us'], result['retries']))
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.update:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print("\nBaseline written to " + args.baseline)
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+        print("\nCompared with " + args.baseline)
+        failures = compare(results, baseline, args.tolerance)
+        if failures:
+            print("\n{} case(s) regressed".format(len(failures)))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -111,6 +111,11 @@ setuptools.setup(
     # https://packaging.python.org/en/latest/technical.html#install-requires-vs-requirements-files
     install_requires=['pyserial', 'pycryptodome', 'pyqt5', 'darkdetect'],
 
+    # Optional extras. crcmod provides a C accelerated CRC16 for the SVL uploader
+    extras_require={
+        'fast-crc': ['crcmod'],
+    },
+
     # If there are data files included in your packages that need to be
     # installed, specify them here.  If using Python 2.6 or less, then these
     # have to be included in MANIFEST.in as well.
@@ -0,0 +1,110 @@
+#-----------------------------------------------------------------------------
+# test_sbl_emulator.py
+#
+#------------------------------------------------------------------------
+#
+# Bootloader burn round trips - AsbSession.upload() against the Apollo3 secure
+# bootloader emulator (asb/sbl_emulator.py) on a pty. The update the emulated
+# device puts back together must be the OTA blob that was built, byte for byte,
+# whole or split into blocks.
+#
+# Run from the repository root:
+#
+#    python -m pytest tests
+#
+#-----------------------------------------------------------------------------
+import asyncio
+import os
+import random
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'),
+                                reason='the emulator needs a Linux pty')
+
+from artemis_uploader.asb.asb import AsbSession, parse_arguments, bin2blob_process, blob2wired_process
+from artemis_uploader.asb.asb_async import upload_wired_async
+from artemis_uploader.asb.reset_sequencer import RESET_DEFAULT
+
+sbl_emulator = pytest.importorskip('artemis_uploader.asb.sbl_emulator')
+
+BAUD = 921600
+
+#--------------------------------------------------------------------------------------
+@pytest.fixture
+def binfile(tmp_path):
+
+    rng = random.Random(11)
+    image = bytes(rng.getrandbits(8) for _ in range(40000))
+    name = os.path.join(str(tmp_path), 'app.bin')
+    with open(name, 'wb') as f:
+        f.write(image)
+    return name
+
+# The OTA blob and the wired update image, as asb.py builds them for a burn
+def build_images(binfile, split):
+
+    args = parse_arguments(['--bin', binfile, '--load-address-blob', '0x20000', '--magic-num', '0xCB',
+                            '--version', '0x0', '--load-address-wired', '0xc000', '-i', '6',
+                            '--split', hex(split)])
+
+    blob = bin2blob_process(args.loadaddress_blob, binfile, args.magic_num, args.crcI, args.crcB,
+                            args.authI, args.authB, args.protection, args.authkey, args.output, args.kek,
+                            args.version, args.erasePrev, args.child0, args.child1, args.authalgo,
+                            args.encalgo)
+    wired = blob2wired_process(blob, args.imagetype, args.loadaddress_image, args.authalgo, args.encalgo,
+                               args.authkey, args.kek, args.options, args.split, args.output)
+    return bytes(blob), wired
+
+# The session sends the wired image in blocks of the split it was built with
+def upload(device, image, split):
+    session = AsbSession(device.port, BAUD, split=split, reset_profile=RESET_DEFAULT)
+    return session.upload(image), session
+
+#--------------------------------------------------------------------------------------
+def test_upload_round_trip(binfile):
+
+    blob, wired = build_images(binfile, 0x48000)
+
+    with sbl_emulator.emulated_sbl_device(simulate_wire=False) as device:
+        ok, session = upload(device, wired, 0x48000)
+        assert ok
+        assert device.wait_for_image() == blob
+        assert device.wired_images[0] == wired
+        assert session.tries == 0
+
+def test_upload_round_trip_split(binfile):
+
+    # three blocks, each loaded at its own address
+    blob, wired = build_images(binfile, 0x4000)
+
+    with sbl_emulator.emulated_sbl_device(simulate_wire=False) as device:
+        ok, session = upload(device, wired, 0x4000)
+        assert ok
+        assert device.wait_for_image() == blob
+        assert device.wired_images[0] == wired
+        assert session.blocks == 3
+
+def test_upload_round_trip_after_missed_boot(binfile):
+
+    blob, wired = build_images(binfile, 0x4000)
+
+    # the first reset misses the bootloader - the session resets and starts over
+    with sbl_emulator.emulated_sbl_device(simulate_wire=False, missed_boots=1) as device:
+        ok, session = upload(device, wired, 0x4000)
+        assert ok
+        assert device.wait_for_image() == blob
+        assert session.tries == 1
+        assert len(device.images) == 1
+
+def test_async_upload_round_trip(binfile):
+
+    blob, wired = build_images(binfile, 0x4000)
+    sent = []
+
+    with sbl_emulator.emulated_sbl_device(simulate_wire=False) as device:
+        assert asyncio.run(upload_wired_async(device.port, BAUD, wired, split=0x4000,
+                                              progress=lambda count, total: sent.append(count)))
+        assert device.wait_for_image() == blob
+        assert sent[-1] == len(wired)
@@ -0,0 +1,83 @@
+#-----------------------------------------------------------------------------
+# test_svl_emulator.py
+#
+#------------------------------------------------------------------------
+#
+# Firmware upload round trips - upload_firmware() against the SVL emulator
+# (svl_emulator.py) on a pty. The image the emulated device receives must be
+# the binary that was sent, byte for byte.
+#
+# Run from the repository root:
+#
+#    python -m pytest tests
+#
+#-----------------------------------------------------------------------------
+import asyncio
+import os
+import random
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'),
+                                reason='the emulator needs a Linux pty')
+
+from artemis_uploader.artemis_svl import upload_firmware, SvlIoStats
+from artemis_uploader.svl_async import upload_firmware_async
+
+svl_emulator = pytest.importorskip('artemis_uploader.svl_emulator')
+
+BAUD = 921600
+
+#--------------------------------------------------------------------------------------
+@pytest.fixture
+def binfile(tmp_path):
+
+    # not a multiple of the frame size, so the last frame is short
+    rng = random.Random(7)
+    image = bytes(rng.getrandbits(8) for _ in range(20 * 2048 + 123))
+    name = os.path.join(str(tmp_path), 'app.bin')
+    with open(name, 'wb') as f:
+        f.write(image)
+    return name, image
+
+#--------------------------------------------------------------------------------------
+def test_upload_round_trip(binfile):
+
+    name, image = binfile
+
+    with svl_emulator.emulated_svl_device() as device:
+        assert upload_firmware(name, device.port, BAUD)
+        assert device.wait_for_image() == image
+        assert device.resets == 1
+
+def test_upload_round_trip_with_retries(binfile):
+
+    name, image = binfile
+    stats = SvlIoStats()
+
+    with svl_emulator.emulated_svl_device(crc_error_rate=0.1, seed=3) as device:
+        assert upload_firmware(name, device.port, BAUD, stats=stats)
+        assert device.wait_for_image() == image
+        assert device.retries_sent > 0
+        assert stats.retries == device.retries_sent
+
+def test_async_upload_round_trip(binfile):
+
+    name, image = binfile
+    frames = []
+
+    with svl_emulator.emulated_svl_device(crc_error_rate=0.1, seed=3) as device:
+        assert asyncio.run(upload_firmware_async(name, device.port, BAUD,
+                                                 progress=lambda frame, total: frames.append(frame)))
+        assert device.wait_for_image() == image
+        assert frames == list(range(1, 22))
+
+def test_upload_fails_without_device(binfile):
+
+    name, _ = binfile
+
+    # the bootloader never listens - every attempt times out in setup
+    with svl_emulator.emulated_svl_device(boot_latency=10.0) as device:
+        assert not upload_firmware(name, device.port, BAUD, timeout=0.2)
+        assert device.wait_for_image(timeout=0.1) is None